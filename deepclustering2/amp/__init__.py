@@ -0,0 +1 @@
+from ._native import MixedPrecision
@@ -0,0 +1,117 @@
+from contextlib import nullcontext
+from typing import Any, Dict, Optional, Union
+
+import torch
+from torch import Tensor
+
+__all__ = ["MixedPrecision"]
+
+_DTYPES = {
+    "bfloat16": torch.bfloat16,
+    "bf16": torch.bfloat16,
+    "float16": torch.float16,
+    "fp16": torch.float16,
+    "half": torch.float16,
+}
+
+
+def _grad_scaler(device_type: str, **kwargs):
+    if hasattr(torch, "amp") and hasattr(torch.amp, "GradScaler"):
+        return torch.amp.GradScaler(device_type, **kwargs)
+    # torch < 2.3, CUDA only
+    assert device_type == "cuda", device_type
+    return torch.cuda.amp.GradScaler(**kwargs)
+
+
+class MixedPrecision:
+    """
+    Native mixed precision of a `Model`: `torch.autocast` for its forward, and a `GradScaler` for float16,
+    whose small exponent range needs the loss to be scaled.
+    It is configured from the `Amp` section of the yaml config, e.g.
+        Amp:
+          enabled: true
+          dtype: bfloat16   # bfloat16 (CPU and recent GPUs) or float16 (GPU)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        dtype: Union[str, torch.dtype] = "bfloat16",
+        grad_scaler: Optional[bool] = None,
+        **scaler_kwargs,
+    ) -> None:
+        """
+        :param dtype: dtype of the autocast regions
+        :param grad_scaler: scale the loss, by default for float16 only
+        :param scaler_kwargs: `GradScaler` arguments, e.g. `init_scale`, `growth_interval`
+        """
+        if isinstance(dtype, str):
+            assert (
+                dtype in _DTYPES
+            ), f"dtype should be in {', '.join(_DTYPES)}, given {dtype}"
+            dtype = _DTYPES[dtype]
+        assert dtype in (torch.bfloat16, torch.float16), dtype
+        self._enabled = bool(enabled)
+        self._dtype = dtype
+        self._use_scaler = self._enabled and (
+            dtype == torch.float16 if grad_scaler is None else grad_scaler
+        )
+        self._scaler_kwargs = scaler_kwargs
+        # created for the device of the first scaled loss
+        self._scaler = None
+        self._scaler_state: Optional[Dict[str, Any]] = None
+        # whether a loss was scaled since the last optimizer step
+        self._scaled = False
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "MixedPrecision":
+        """
+        :param config: the `Amp` section of the config, disabled if None
+        """
+        if config is None:
+            return cls(enabled=False)
+        return cls(**config)
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return self._dtype
+
+    def autocast(self, device_type: str):
+        if not self._enabled:
+            return nullcontext()
+        return torch.autocast(device_type=device_type, dtype=self._dtype)
+
+    def scale(self, loss: Tensor) -> Tensor:
+        if not self._use_scaler:
+            return loss
+        if self._scaler is None:
+            self._scaler = _grad_scaler(loss.device.type, **self._scaler_kwargs)
+            if self._scaler_state is not None:
+                self._scaler.load_state_dict(self._scaler_state)
+        self._scaled = True
+        return self._scaler.scale(loss)
+
+    def step(self, optimizer: torch.optim.Optimizer):
+        """
+        `optimizer.step()`, through the scaler if the gradients come from a scaled loss.
+        """
+        if not self._scaled:
+            optimizer.step()
+            return
+        self._scaler.step(optimizer)
+        self._scaler.update()
+        self._scaled = False
+
+    def state_dict(self) -> Optional[Dict[str, Any]]:
+        if self._scaler is not None:
+            return self._scaler.state_dict()
+        return self._scaler_state
+
+    def load_state_dict(self, state_dict: Optional[Dict[str, Any]]):
+        self._scaler_state = state_dict
+        if self._scaler is not None and state_dict is not None:
+            self._scaler.load_state_dict(state_dict)
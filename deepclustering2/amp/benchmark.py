@@ -0,0 +1,264 @@
+"""
+CPU benchmark of the native mixed precision of `Model`: training and inference throughput and accuracy of
+bfloat16 (and float16) autocast against float32, for a small CNN trained on a synthetic classification task.
+
+usage:
+    amp_benchmark --dtypes float32 bfloat16 --steps 200 --output amp_bench.json
+"""
+__all__ = ["run_benchmark"]
+
+import argparse
+import copy
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import *
+
+import numpy as np
+import torch
+from torch import nn
+from torch.nn import functional as F
+
+from deepclustering2.models import Model, ZeroGradientBackwardStep
+
+
+def _make_net(num_classes: int, width: int) -> nn.Module:
+    return nn.Sequential(
+        nn.Conv2d(3, width, 3, padding=1),
+        nn.BatchNorm2d(width),
+        nn.ReLU(inplace=True),
+        nn.MaxPool2d(2),
+        nn.Conv2d(width, 2 * width, 3, padding=1),
+        nn.BatchNorm2d(2 * width),
+        nn.ReLU(inplace=True),
+        nn.AdaptiveAvgPool2d(1),
+        nn.Flatten(),
+        nn.Linear(2 * width, num_classes),
+    )
+
+
+def _make_data(
+    num_samples: int, num_classes: int, size: int, seed: int
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    images of class-specific low frequency patterns plus noise.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    prototypes = F.interpolate(
+        torch.randn(num_classes, 3, 4, 4, generator=torch.Generator().manual_seed(0)),
+        size=(size, size),
+        mode="bilinear",
+        align_corners=False,
+    )
+    targets = torch.randint(0, num_classes, (num_samples,), generator=generator)
+    images = prototypes[targets] + 1.5 * torch.randn(
+        num_samples, 3, size, size, generator=generator
+    )
+    return images, targets
+
+
+def _accuracy(
+    model: Model, images: torch.Tensor, targets: torch.Tensor, batch_size: int
+) -> float:
+    model.eval()
+    correct = 0
+    with torch.no_grad():
+        for start in range(0, len(images), batch_size):
+            logits = model(images[start : start + batch_size])
+            correct += (
+                (logits.argmax(1) == targets[start : start + batch_size]).sum().item()
+            )
+    return correct / len(images)
+
+
+def _benchmark_dtype(
+    dtype: str,
+    net: nn.Module,
+    train_data: Tuple[torch.Tensor, torch.Tensor],
+    test_data: Tuple[torch.Tensor, torch.Tensor],
+    reference_logits: torch.Tensor,
+    steps: int,
+    batch_size: int,
+    lr: float,
+    warmup: int,
+) -> Dict[str, float]:
+    net = copy.deepcopy(net)
+    amp = None if dtype == "float32" else {"enabled": True, "dtype": dtype}
+    model = Model(net, torch.optim.SGD(net.parameters(), lr=lr, momentum=0.9), amp=amp)
+    images, targets = test_data
+
+    # logits of the initial weights, against the float32 ones
+    model.eval()
+    with torch.no_grad():
+        logits = model(images[:batch_size])
+    logits_error = (logits - reference_logits).abs().max().item()
+
+    train_images, train_targets = train_data
+    model.train()
+    elapsed = 0.0
+    for step in range(warmup + steps):
+        index = torch.randint(0, len(train_images), (batch_size,))
+        start = time.perf_counter()
+        loss = F.cross_entropy(model(train_images[index]), train_targets[index])
+        with ZeroGradientBackwardStep(loss, model) as scaled_loss:
+            scaled_loss.backward()
+        if step >= warmup:
+            elapsed += time.perf_counter() - start
+
+    model.eval()
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(images[:batch_size])
+        start = time.perf_counter()
+        for begin in range(0, len(images), batch_size):
+            model(images[begin : begin + batch_size])
+        inference_time = time.perf_counter() - start
+
+    return {
+        "train_samples_per_s": steps * batch_size / elapsed,
+        "inference_samples_per_s": len(images) / inference_time,
+        "final_loss": float(loss.item()),
+        "test_accuracy": _accuracy(model, images, targets, batch_size),
+        "init_logits_max_abs_error": logits_error,
+    }
+
+
+def run_benchmark(
+    dtypes: Sequence[str] = ("float32", "bfloat16"),
+    steps: int = 200,
+    batch_size: int = 64,
+    image_size: int = 32,
+    width: int = 32,
+    num_classes: int = 10,
+    lr: float = 0.05,
+    warmup: int = 5,
+    seed: int = 0,
+    verbose: bool = True,
+) -> Dict[str, Any]:
+    """
+    train the same initial network for `steps` steps with each dtype, on CPU.
+    :return: dict with a `meta` and a `results` entry, the latter keyed by dtype, with the speedups against float32
+    """
+    torch.manual_seed(seed)
+    net = _make_net(num_classes, width)
+    train_data = _make_data(20 * batch_size, num_classes, image_size, seed=seed + 1)
+    test_data = _make_data(10 * batch_size, num_classes, image_size, seed=seed + 2)
+    net.eval()
+    with torch.no_grad():
+        reference_logits = net(test_data[0][:batch_size])
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for dtype in dtypes:
+        torch.manual_seed(seed)
+        try:
+            results[dtype] = _benchmark_dtype(
+                dtype,
+                net,
+                train_data,
+                test_data,
+                reference_logits,
+                steps=steps,
+                batch_size=batch_size,
+                lr=lr,
+                warmup=warmup,
+            )
+        except Exception as e:  # e.g. a dtype not supported by the CPU autocast
+            results[dtype] = {"error": f"{e.__class__.__name__}: {e}"}
+    base = results.get("float32", {})
+    for dtype, result in results.items():
+        if "error" in result or "error" in base or not base:
+            continue
+        result["train_speedup"] = (
+            result["train_samples_per_s"] / base["train_samples_per_s"]
+        )
+        result["inference_speedup"] = (
+            result["inference_samples_per_s"] / base["inference_samples_per_s"]
+        )
+    if verbose:
+        for dtype, result in results.items():
+            print(f"{dtype:<10}{_format_result(result)}")
+    return {
+        "meta": {
+            "steps": steps,
+            "batch_size": batch_size,
+            "image_size": image_size,
+            "width": width,
+            "num_classes": num_classes,
+            "num_threads": torch.get_num_threads(),
+            "torch": torch.__version__,
+            "numpy": np.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+
+
+def _format_result(result: Dict[str, Any]) -> str:
+    if "error" in result:
+        return f"error: {result['error']}"
+    return (
+        f"train {result['train_samples_per_s']:>9.1f} samples/s "
+        f"(x{result.get('train_speedup', 1.0):.2f}), "
+        f"inference {result['inference_samples_per_s']:>9.1f} samples/s "
+        f"(x{result.get('inference_speedup', 1.0):.2f}), "
+        f"accuracy {result['test_accuracy']:.3f}, "
+        f"logits error {result['init_logits_max_abs_error']:.2e}"
+    )
+
+
+def arg_parser() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the mixed precision training on CPU against float32.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--dtypes",
+        type=str,
+        nargs="*",
+        default=["float32", "bfloat16"],
+        help="dtypes to compare, among float32, bfloat16 and float16.",
+    )
+    parser.add_argument("--steps", type=int, default=200, help="timed training steps.")
+    parser.add_argument("--batch_size", type=int, default=64, help="batch size.")
+    parser.add_argument("--image_size", type=int, default=32, help="image size.")
+    parser.add_argument("--width", type=int, default=32, help="channels of the CNN.")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed steps.")
+    parser.add_argument(
+        "--num_threads", type=int, default=None, help="torch intra-op threads."
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="json file to save the results."
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> int:
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    result = run_benchmark(
+        dtypes=args.dtypes,
+        steps=args.steps,
+        batch_size=args.batch_size,
+        image_size=args.image_size,
+        width=args.width,
+        warmup=args.warmup,
+    )
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"results saved to {args.output}")
+    return 0
+
+
+def call_from_cmd():
+    args = arg_parser()
+    sys.exit(main(args))
+
+
+if __name__ == "__main__":
+    call_from_cmd()
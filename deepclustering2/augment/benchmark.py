@@ -0,0 +1,413 @@
+"""
+Throughput benchmark for the augmentations of `pil_augment`, `tensor_augment`, `ndim_transforms`
+and a full `SequentialWrapper` pipeline, on synthetic 2D and 3D inputs, CPU only.
+
+usage:
+    augment_benchmark --sizes_2d 64 256 --sizes_3d 32 64 --output bench.json
+    augment_benchmark --output bench.json --baseline baseline.json --tolerance 0.2
+"""
+__all__ = ["benchmark_transform", "run_benchmark", "compare_with_baseline"]
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import *
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.transforms import Compose
+
+from . import TRANSFORM_CALLABLE, SequentialWrapper
+from . import ndim_transforms, pil_augment, tensor_augment
+
+# input factories, given the spatial size `s`
+_INPUTS_2D: Dict[str, Callable[[int], Any]] = {
+    "pil_rgb": lambda s: Image.fromarray(
+        np.random.randint(0, 256, (s, s, 3), dtype=np.uint8)
+    ),
+    "pil_label": lambda s: Image.fromarray(
+        np.random.randint(0, 4, (s, s), dtype=np.uint8)
+    ),
+    "tensor_grey": lambda s: torch.rand(1, 1, s, s),
+}
+_INPUTS_3D: Dict[str, Callable[[int], Any]] = {
+    "volume": lambda s: np.random.rand(s, s, s).astype(np.float32),
+    "label_volume": lambda s: np.random.randint(0, 4, (s, s, s)).astype(np.int64),
+}
+
+# kwargs of the registered transforms in `TRANSFORM_CALLABLE`, given the spatial size `s`.
+# Transforms registered without an entry here are built without arguments and fed with `pil_rgb`.
+_REGISTERED_CASES: Dict[str, Tuple[str, Callable[[int], Dict[str, Any]]]] = {
+    "img2tensor": ("pil_rgb", lambda s: {"include_rgb": True, "include_grey": True}),
+    "pilcutout": ("pil_rgb", lambda s: {"min_box": s // 8, "max_box": s // 4}),
+    "randomcrop": ("pil_rgb", lambda s: {"size": (s // 2, s // 2)}),
+    "resize": ("pil_rgb", lambda s: {"size": (s // 2, s // 2)}),
+    "centercrop": ("pil_rgb", lambda s: {"size": (s // 2, s // 2)}),
+    "sobelprocess": ("tensor_grey", lambda s: {}),
+    "tolabel": ("pil_label", lambda s: {"mapping": {i: i for i in range(4)}}),
+    "totensor": ("pil_rgb", lambda s: {}),
+}
+
+_TENSOR_CASES: Dict[str, Tuple[str, Callable[[int], Callable]]] = {
+    "tensor_randomflip": (
+        "tensor_grey",
+        lambda s: tensor_augment.TensorRandomFlip(axis=[2, 3]),
+    ),
+    "tensor_cutout": (
+        "tensor_grey",
+        lambda s: tensor_augment.TensorCutout(min_box=s // 8, max_box=s // 4),
+    ),
+    "tensor_randomcrop": (
+        "tensor_grey",
+        lambda s: tensor_augment.RandomCrop(size=(s // 2, s // 2)),
+    ),
+    "tensor_resize": (
+        "tensor_grey",
+        lambda s: tensor_augment.Resize(
+            size=(s // 2, s // 2), interpolation="bilinear"
+        ),
+    ),
+    "tensor_centercrop": (
+        "tensor_grey",
+        lambda s: tensor_augment.CenterCrop(size=(s // 2, s // 2)),
+    ),
+    "tensor_horizontalflip": (
+        "tensor_grey",
+        lambda s: tensor_augment.RandomHorizontalFlip(),
+    ),
+    "tensor_verticalflip": (
+        "tensor_grey",
+        lambda s: tensor_augment.RandomVerticalFlip(),
+    ),
+    "tensor_gaussiannoise": ("tensor_grey", lambda s: tensor_augment.GaussianNoise()),
+}
+
+_rs = partial(np.random.RandomState, 0)
+_NDIM_CASES: Dict[str, Tuple[str, Callable[[int], Callable]]] = {
+    "randomflip": ("volume", lambda s: ndim_transforms.RandomFlip(_rs())),
+    "randomrotate90": ("volume", lambda s: ndim_transforms.RandomRotate90(_rs())),
+    "randomrotate": ("volume", lambda s: ndim_transforms.RandomRotate(_rs())),
+    "randomcontrast": (
+        "volume",
+        lambda s: ndim_transforms.RandomContrast(_rs(), execution_probability=1),
+    ),
+    "elasticdeformation": (
+        "volume",
+        lambda s: ndim_transforms.ElasticDeformation(
+            _rs(), spline_order=3, execution_probability=1
+        ),
+    ),
+    "standardlabeltoboundary": (
+        "label_volume",
+        lambda s: ndim_transforms.StandardLabelToBoundary(),
+    ),
+    "labeltoaffinities": (
+        "label_volume",
+        lambda s: ndim_transforms.LabelToAffinities(offsets=[1, 2, 4, 8]),
+    ),
+    "randomlabeltoaffinities": (
+        "label_volume",
+        lambda s: ndim_transforms.RandomLabelToAffinities(_rs()),
+    ),
+    "labeltoboundaryandaffinities": (
+        "label_volume",
+        lambda s: ndim_transforms.LabelToBoundaryAndAffinities(
+            xy_offsets=[1, 2, 4], z_offsets=[1, 1, 2]
+        ),
+    ),
+    "normalize": ("volume", lambda s: ndim_transforms.Normalize(mean=0.5, std=0.2)),
+    "rangenormalize": (
+        "volume",
+        lambda s: ndim_transforms.RangeNormalize(max_value=1),
+    ),
+    "gaussiannoise": (
+        "volume",
+        lambda s: ndim_transforms.GaussianNoise(_rs(), max_sigma=2, max_value=1),
+    ),
+    "totensor": ("volume", lambda s: ndim_transforms.ToTensor(expand_dims=True)),
+}
+
+
+def _sequential_wrapper(s: int) -> Callable:
+    wrapper = SequentialWrapper(
+        img_transform=Compose(
+            [
+                pil_augment.RandomCrop(size=(s // 2, s // 2)),
+                pil_augment.RandomHorizontalFlip(),
+                pil_augment.Img2Tensor(include_rgb=False, include_grey=True),
+            ]
+        ),
+        target_transform=Compose(
+            [
+                pil_augment.RandomCrop(size=(s // 2, s // 2)),
+                pil_augment.RandomHorizontalFlip(),
+                pil_augment.ToLabel(),
+            ]
+        ),
+        if_is_target=[False, True],
+    )
+    return lambda inputs: wrapper(*inputs)
+
+
+def _percentile_ms(latencies: np.ndarray, q: float) -> float:
+    return float(np.percentile(latencies, q) * 1e3)
+
+
+def benchmark_transform(
+    transform: Callable,
+    make_input: Callable[[], Any],
+    num_images: int = 1,
+    repeat: int = 50,
+    warmup: int = 5,
+) -> Dict[str, float]:
+    """
+    time `transform` on a fresh input for every call.
+    :param num_images: number of images in one input, used to report images/s
+    :return: dict of images/s, latency percentiles in ms and the peak python-side (tracemalloc) allocation per call
+    """
+    inputs = [make_input() for _ in range(warmup + repeat)]
+    for i in range(warmup):
+        transform(inputs[i])
+
+    latencies = np.empty(repeat, dtype=np.float64)
+    for i in range(repeat):
+        _input = inputs[warmup + i]
+        start = time.perf_counter()
+        transform(_input)
+        latencies[i] = time.perf_counter() - start
+
+    # allocations are measured in a separate pass, as tracing slows down the calls.
+    # numpy reports its buffers to tracemalloc, the torch CPU allocator does not.
+    peaks = []
+    for i in range(min(repeat, 10)):
+        _input = inputs[warmup + i]
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        result = transform(_input)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        peaks.append(peak - base)
+
+    return {
+        "images_per_s": float(num_images * repeat / latencies.sum()),
+        "latency_mean_ms": float(latencies.mean() * 1e3),
+        "latency_p50_ms": _percentile_ms(latencies, 50),
+        "latency_p90_ms": _percentile_ms(latencies, 90),
+        "latency_p99_ms": _percentile_ms(latencies, 99),
+        "alloc_peak_kb": float(np.mean(peaks) / 1024),
+    }
+
+
+def _build_registered(
+    callable: Callable, kwargs: Callable[[int], Dict[str, Any]], s: int
+) -> Callable:
+    return callable(**kwargs(s))
+
+
+def _iter_cases(
+    sizes_2d: List[int], sizes_3d: List[int]
+) -> Iterator[Tuple[str, str, int, str, Callable[[int], Callable]]]:
+    """
+    yield (group, name, size, input name, transform factory) for every case.
+    """
+    for s in sizes_2d:
+        for name, callable in TRANSFORM_CALLABLE.items():
+            input_name, kwargs = _REGISTERED_CASES.get(name, ("pil_rgb", lambda s: {}))
+            yield "pil_augment", name, s, input_name, partial(
+                _build_registered, callable, kwargs
+            )
+        for name, (input_name, factory) in _TENSOR_CASES.items():
+            yield "tensor_augment", name, s, input_name, factory
+        yield "sequential_wrapper", "sequentialwrapper", s, "pil_pair", _sequential_wrapper
+    for s in sizes_3d:
+        for name, (input_name, factory) in _NDIM_CASES.items():
+            yield "ndim_transforms", name, s, input_name, factory
+
+
+def run_benchmark(
+    sizes_2d: List[int] = (64, 256),
+    sizes_3d: List[int] = (32, 64),
+    batch_size: int = 16,
+    repeat: int = 50,
+    warmup: int = 5,
+    verbose: bool = True,
+) -> Dict[str, Any]:
+    """
+    run all the cases on CPU.
+    :param batch_size: batch size of the tensor inputs of `tensor_augment`
+    :return: dict with a `meta` and a `results` entry, the latter keyed by "group/name/size"
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for group, name, s, input_name, factory in _iter_cases(
+        list(sizes_2d), list(sizes_3d)
+    ):
+        key = f"{group}/{name}/{s}"
+        num_images = 1
+        if input_name == "pil_pair":
+            make_input = lambda s=s: (
+                _INPUTS_2D["pil_rgb"](s),
+                _INPUTS_2D["pil_label"](s),
+            )
+        elif group == "tensor_augment":
+            make_input = lambda s=s: torch.rand(batch_size, 1, s, s)
+            num_images = batch_size
+        elif input_name in _INPUTS_3D:
+            make_input = partial(_INPUTS_3D[input_name], s)
+        else:
+            make_input = partial(_INPUTS_2D[input_name], s)
+        try:
+            transform = factory(s)
+            results[key] = benchmark_transform(
+                transform,
+                make_input,
+                num_images=num_images,
+                repeat=repeat,
+                warmup=warmup,
+            )
+        except Exception as e:  # a broken transform should not stop the others
+            results[key] = {"error": f"{e.__class__.__name__}: {e}"}
+        if verbose:
+            print(f"{key:<55}{_format_result(results[key])}")
+
+    return {
+        "meta": {
+            "sizes_2d": list(sizes_2d),
+            "sizes_3d": list(sizes_3d),
+            "batch_size": batch_size,
+            "repeat": repeat,
+            "warmup": warmup,
+            "num_threads": torch.get_num_threads(),
+            "torch": torch.__version__,
+            "numpy": np.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+
+
+def _format_result(result: Dict[str, Any]) -> str:
+    if "error" in result:
+        return f"error: {result['error']}"
+    return (
+        f"{result['images_per_s']:>10.1f} img/s, "
+        f"p50 {result['latency_p50_ms']:.3f}ms, "
+        f"p99 {result['latency_p99_ms']:.3f}ms, "
+        f"alloc {result['alloc_peak_kb']:.1f}KB"
+    )
+
+
+def compare_with_baseline(
+    current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2
+) -> Dict[str, Dict[str, float]]:
+    """
+    compare the images/s of the cases found in both runs.
+    :param tolerance: relative slowdown tolerated before a case is flagged
+    :return: dict of the regressed cases, with their baseline and current images/s,
+    and the error of the cases failing in the current run only
+    """
+    regressions = {}
+    for key, result in current["results"].items():
+        base_result = baseline["results"].get(key)
+        if base_result is None or "error" in base_result:
+            continue
+        if "error" in result:
+            regressions[key] = {
+                "baseline_images_per_s": base_result["images_per_s"],
+                "images_per_s": 0.0,
+                "ratio": 0.0,
+                "error": result["error"],
+            }
+            continue
+        ratio = result["images_per_s"] / base_result["images_per_s"]
+        if ratio < 1 - tolerance:
+            regressions[key] = {
+                "baseline_images_per_s": base_result["images_per_s"],
+                "images_per_s": result["images_per_s"],
+                "ratio": ratio,
+            }
+    return regressions
+
+
+def arg_parser() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the augmentation throughput on CPU.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes_2d", type=int, nargs="*", default=[64, 256], help="2D image sizes."
+    )
+    parser.add_argument(
+        "--sizes_3d", type=int, nargs="*", default=[32, 64], help="3D volume sizes."
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=16, help="batch size of tensor inputs."
+    )
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per case.")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed calls per case.")
+    parser.add_argument(
+        "--num_threads", type=int, default=None, help="torch intra-op threads."
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="json file to save the results."
+    )
+    parser.add_argument(
+        "--baseline", type=str, default=None, help="json file of a previous run."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="relative images/s drop flagged as a regression.",
+    )
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> int:
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    result = run_benchmark(
+        sizes_2d=args.sizes_2d,
+        sizes_3d=args.sizes_3d,
+        batch_size=args.batch_size,
+        repeat=args.repeat,
+        warmup=args.warmup,
+    )
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"results saved to {args.output}")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+        for key, r in regressions.items():
+            if "error" in r:
+                print(f"regression {key}: {r['error']}")
+                continue
+            print(
+                f"regression {key}: {r['baseline_images_per_s']:.1f} -> "
+                f"{r['images_per_s']:.1f} img/s ({r['ratio']:.2f}x)"
+            )
+        if regressions:
+            return 1
+        print(f"no regression found against {args.baseline}")
+    return 0
+
+
+def call_from_cmd():
+    args = arg_parser()
+    sys.exit(main(args))
+
+
+if __name__ == "__main__":
+    call_from_cmd()
@@ -1,13 +1,11 @@
 # taken from https://github.com/wolny/pytorch-3dunet
 import importlib
+from itertools import product
 from typing import Tuple, List, Union, Any
 
 import numpy as np
 import torch
 from scipy.ndimage import rotate, map_coordinates, gaussian_filter
-from scipy.ndimage.filters import convolve
-from skimage.filters import gaussian
-from skimage.segmentation import find_boundaries
 from torchvision.transforms import Compose
 
 
@@ -216,21 +214,70 @@ class ElasticDeformation(object):
         return m
 
 
-def blur_boundary(boundary: np.ndarray, sigma: float):
-    boundary = gaussian(boundary, sigma=sigma)
-    boundary[boundary >= 0.5] = 1
-    boundary[boundary < 0.5] = 0
-    return boundary
+def blur_boundary(boundary: np.ndarray, sigma: float, batch_axis: int = None):
+    """
+    Gaussian blur a binary boundary map and threshold it back to {0, 1}.
+    :param batch_axis: if given, the blur is not applied along this axis, so that a stack of boundary maps is blurred
+        in a single call
+    """
+    sigmas = [sigma] * boundary.ndim
+    if batch_axis is not None:
+        sigmas[batch_axis] = 0
+    # same as `skimage.filters.gaussian` with its defaults
+    boundary = gaussian_filter(
+        boundary.astype(np.float64), sigmas, mode="nearest", truncate=4.0
+    )
+    return (boundary >= 0.5).astype(np.float64)
+
+
+def _find_boundaries(m: np.ndarray, connectivity: int = 1) -> np.ndarray:
+    """
+    Shifted-slice equivalent of `skimage.segmentation.find_boundaries(m, connectivity, mode="thick")`:
+    a voxel is on a boundary if any of its neighbours (defined by `connectivity`) has a different label.
+    """
+    boundaries = np.zeros(m.shape, dtype=np.bool_)
+    for shift in product((-1, 0, 1), repeat=m.ndim):
+        nonzero = [s for s in shift if s != 0]
+        # every pair of neighbours is compared only once
+        if not nonzero or len(nonzero) > connectivity or nonzero[0] < 0:
+            continue
+        a, b = [], []
+        for size, s in zip(m.shape, shift):
+            a.append(slice(max(0, -s), size - max(0, s)))
+            b.append(slice(max(0, s), size - max(0, -s)))
+        a, b = tuple(a), tuple(b)
+        not_equal = m[a] != m[b]
+        boundaries[a] |= not_equal
+        boundaries[b] |= not_equal
+    return boundaries
+
+
+def _finalize_boundaries(
+    out: np.ndarray, m: np.ndarray, num_channels: int, ignore_index, append_label: bool
+) -> np.ndarray:
+    """
+    Fill in the ignore index and the appended label of the preallocated `out`,
+    whose first `num_channels` channels hold the boundaries.
+    """
+    if ignore_index is not None:
+        mask = m == ignore_index
+        out[:num_channels, mask] = ignore_index
+    if append_label:
+        out[num_channels] = m
+    return out
 
 
 class AbstractLabelToBoundary:
-    AXES_TRANSPOSE = [(0, 1, 2), (0, 2, 1), (2, 0, 1)]  # X  # Y  # Z
+    # array axis along which the X, Y, Z affinities are computed
+    AXES = (2, 1, 0)  # X  # Y  # Z
 
     def __init__(
         self,
         ignore_index=None,
         aggregate_affinities=False,
         append_label=False,
+        blur=False,
+        sigma=1,
         **kwargs,
     ):
         """
@@ -244,6 +291,8 @@ class AbstractLabelToBoundary:
         self.ignore_index = ignore_index
         self.aggregate_affinities = aggregate_affinities
         self.append_label = append_label
+        self.blur = blur
+        self.sigma = sigma
 
     def __call__(self, m: np.ndarray) -> np.ndarray:
         """
@@ -253,50 +302,60 @@ class AbstractLabelToBoundary:
         """
         assert m.ndim == 3
 
-        kernels = self.get_kernels()
-        boundary_arr = [
-            np.where(np.abs(convolve(m, kernel)) > 0, 1, 0) for kernel in kernels
-        ]
-        channels = np.stack(boundary_arr)
-        results = []
+        axis_offsets = self.get_offsets()
         if self.aggregate_affinities:
             assert (
-                len(kernels) % 3 == 0
-            ), "Number of kernels must be divided by 3 (one kernel per offset per Z,Y,X axes"
-            # aggregate affinities with the same offset
-            for i in range(0, len(kernels), 3):
-                # merge across X,Y,Z axes (logical OR)
-                xyz_aggregated_affinities = np.logical_or.reduce(
-                    channels[i : i + 3, ...]
-                ).astype(np.int)
-                # recover ignore index
-                xyz_aggregated_affinities = _recover_ignore_index(
-                    xyz_aggregated_affinities, m, self.ignore_index
-                )
-                results.append(xyz_aggregated_affinities)
+                len(axis_offsets) % 3 == 0
+            ), "Number of offsets must be divided by 3 (one offset per Z,Y,X axes"
+            num_channels = len(axis_offsets) // 3
         else:
-            results = [
-                _recover_ignore_index(channels[i], m, self.ignore_index)
-                for i in range(channels.shape[0])
-            ]
+            num_channels = len(axis_offsets)
 
+        dtype = np.float64 if self.blur else np.int64
         if self.append_label:
-            # append original input data
-            results.append(m)
+            dtype = np.result_type(dtype, m.dtype)
+        out = np.empty((num_channels + int(self.append_label), *m.shape), dtype=dtype)
+
+        # pad once per axis with the largest margins needed by its offsets, the same way `convolve` reflects
+        padded = {}
+        for axis in set(a for a, _ in axis_offsets):
+            offsets = [o for a, o in axis_offsets if a == axis]
+            before = max(o - (o + 1) // 2 for o in offsets)
+            after = max((o + 1) // 2 for o in offsets)
+            pad_width = [(0, 0)] * m.ndim
+            pad_width[axis] = (before, after)
+            padded[axis] = (np.pad(m, pad_width, mode="symmetric"), before)
+
+        not_equal = np.empty(m.shape, dtype=np.bool_)
+        for i, (axis, offset) in enumerate(axis_offsets):
+            # the convolution with the [1, 0, ..., 0, -1] kernel is nonzero where
+            # x[i + (offset + 1) // 2] != x[i + (offset + 1) // 2 - offset]
+            pad, before = padded[axis]
+            start = before + (offset + 1) // 2 - offset
+            a, b = [slice(None)] * m.ndim, [slice(None)] * m.ndim
+            a[axis] = slice(start, start + m.shape[axis])
+            b[axis] = slice(start + offset, start + offset + m.shape[axis])
+            a, b = tuple(a), tuple(b)
+            if not self.aggregate_affinities:
+                np.not_equal(pad[a], pad[b], out=out[i])
+            elif i % 3 == 0:
+                np.not_equal(pad[a], pad[b], out=out[i // 3])
+            else:
+                # merge across X,Y,Z axes (logical OR)
+                np.not_equal(pad[a], pad[b], out=not_equal)
+                np.logical_or(out[i // 3], not_equal, out=out[i // 3])
+
+        if self.blur:
+            out[:num_channels] = blur_boundary(out[:num_channels], self.sigma, 0)
 
-        # stack across channel dim
-        return np.stack(results, axis=0)
+        return _finalize_boundaries(
+            out, m, num_channels, self.ignore_index, self.append_label
+        )
 
-    @staticmethod
-    def create_kernel(axis, offset):
-        # create conv kernel
-        k_size = offset + 1
-        k = np.zeros((1, 1, k_size), dtype=np.int)
-        k[0, 0, 0] = 1
-        k[0, 0, offset] = -1
-        return np.transpose(k, axis)
-
-    def get_kernels(self):
+    def get_offsets(self) -> List[Tuple[int, int]]:
+        """
+        :return: list of (axis, offset) pairs, one output channel is computed for each pair
+        """
         raise NotImplementedError
 
 
@@ -312,17 +371,18 @@ class StandardLabelToBoundary:
     def __call__(self, m):
         assert m.ndim == 3
 
-        boundaries = find_boundaries(m, connectivity=2)
+        boundaries = _find_boundaries(m, connectivity=2)
         if self.blur:
             boundaries = blur_boundary(boundaries, self.sigma)
+        boundaries = _recover_ignore_index(boundaries, m, self.ignore_index)
 
-        results = [_recover_ignore_index(boundaries, m, self.ignore_index)]
-
+        dtype = boundaries.dtype
         if self.append_label:
-            # append original input data
-            results.append(m)
+            dtype = np.result_type(dtype, m.dtype)
+        out = np.empty((1 + int(self.append_label), *m.shape), dtype=dtype)
+        out[0] = boundaries
 
-        return np.stack(results, axis=0)
+        return _finalize_boundaries(out, m, 1, None, self.append_label)
 
 
 class RandomLabelToAffinities(AbstractLabelToBoundary):
@@ -352,23 +412,23 @@ class RandomLabelToAffinities(AbstractLabelToBoundary):
         self.offsets = tuple(range(1, max_offset + 1))
         self.z_offset_scale = z_offset_scale
 
-    def get_kernels(self):
+    def get_offsets(self):
         rand_offset = self.random_state.choice(self.offsets)
         axis_ind = self.random_state.randint(3)
         # scale down z-affinities due to anisotropy
         if axis_ind == 2:
             rand_offset = max(1, rand_offset // self.z_offset_scale)
 
-        rand_axis = self.AXES_TRANSPOSE[axis_ind]
-        # return a single kernel
-        return [self.create_kernel(rand_axis, rand_offset)]
+        # return a single offset
+        return [(self.AXES[axis_ind], int(rand_offset))]
 
 
 class LabelToAffinities(AbstractLabelToBoundary):
     """
     Converts a given volumetric label array to binary mask corresponding to borders between labels (which can be seen
     as an affinity graph: https://arxiv.org/pdf/1706.00120.pdf)
-    One specify the offsets (thickness) of the border. The boundary will be computed via the convolution operator.
+    One specify the offsets (thickness) of the border. The boundary is computed by comparing the label array with
+    its shifted copy.
     """
 
     def __init__(
@@ -400,18 +460,18 @@ class LabelToAffinities(AbstractLabelToBoundary):
             z_offsets = list(offsets)
         self.z_offsets = z_offsets
 
-        self.kernels = []
-        # create kernel for every axis-offset pair
+        self.axis_offsets = []
+        # create (axis, offset) pair for every axis-offset pair
         for xy_offset, z_offset in zip(offsets, z_offsets):
-            for axis_ind, axis in enumerate(self.AXES_TRANSPOSE):
+            for axis_ind, axis in enumerate(self.AXES):
                 final_offset = xy_offset
                 if axis_ind == 2:
                     final_offset = z_offset
-                # create kernels for a given offset in every direction
-                self.kernels.append(self.create_kernel(axis, final_offset))
+                # offset in every direction
+                self.axis_offsets.append((axis, final_offset))
 
-    def get_kernels(self):
-        return self.kernels
+    def get_offsets(self):
+        return self.axis_offsets
 
 
 class LabelToBoundaryAndAffinities:
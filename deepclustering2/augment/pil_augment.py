@@ -22,6 +22,8 @@ from PIL import Image
 from torch import nn
 from torchvision.transforms import Compose
 
+from ..utils.general import Vectorize
+
 Iterable = collections.abc.Iterable
 
 _pil_interpolation_to_str = {
@@ -586,11 +588,11 @@ class ToLabel(object):
         :param mapping: Optional dictionary containing the mapping.
         """
         super().__init__()
-        self.mapping_call = np.vectorize(lambda x: mapping[x]) if mapping else None
+        self.mapping_call = Vectorize(mapping, default=None) if mapping else None
 
     def __call__(self, img: Image.Image):
-        np_img = np.array(img)[None, ...].astype(np.float32)  # type: ignore
+        np_img = np.array(img)[None, ...]  # type: ignore
         if self.mapping_call:
             np_img = self.mapping_call(np_img)
-        t_img = torch.from_numpy(np_img)
-        return t_img.long()
+        t_img = torch.from_numpy(np_img.astype(np.int64))
+        return t_img
@@ -5,6 +5,7 @@ import torch
 import torch.distributed as dist
 from torch import nn
 from torch.backends import cudnn
+from torch.utils.data import DataLoader, DistributedSampler
 
 
 def initialize_ddp_environment(
@@ -59,3 +60,50 @@ class _DDPMixin:
 
     def on_master(self) -> bool:
         return (self.rank == 0) or (self.rank is None)
+
+
+class UnpaddedDistributedSampler(DistributedSampler):
+    """
+    `DistributedSampler` for evaluation, giving the indices `rank::num_replicas` to each rank,
+    without padding nor dropping, so that each sample is evaluated exactly once over the ranks.
+    The shards may then differ by one sample.
+    """
+
+    def __init__(self, dataset, num_replicas=None, rank=None, shuffle=False, seed=0):
+        super().__init__(
+            dataset, num_replicas=num_replicas, rank=rank, shuffle=shuffle, seed=seed
+        )
+        self.num_samples = len(range(self.rank, len(self.dataset), self.num_replicas))
+        self.total_size = len(self.dataset)
+
+    def __iter__(self):
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            indices = torch.randperm(len(self.dataset), generator=generator).tolist()
+        else:
+            indices = list(range(len(self.dataset)))
+        return iter(indices[self.rank :: self.num_replicas])
+
+
+def shard_dataloader(dataloader: DataLoader) -> DataLoader:
+    """
+    copy of an evaluation `dataloader` iterating on the shard of the current rank only,
+    the loader itself if the process group is not initialized.
+    """
+    if not (dist.is_available() and dist.is_initialized()):
+        return dataloader
+    assert not isinstance(
+        dataloader.sampler, DistributedSampler
+    ), "the dataloader is already sharded."
+    return DataLoader(
+        dataloader.dataset,
+        batch_size=dataloader.batch_size,
+        sampler=UnpaddedDistributedSampler(dataloader.dataset),
+        num_workers=dataloader.num_workers,
+        collate_fn=dataloader.collate_fn,
+        pin_memory=dataloader.pin_memory,
+        drop_last=dataloader.drop_last,
+        timeout=dataloader.timeout,
+        worker_init_fn=dataloader.worker_init_fn,
+    )
@@ -1,5 +1,6 @@
 from deepclustering2.utils import nice_dict
 from ._epocher import _Epocher, proxy_trainer
+from ._profiler import EpochProfiler, PHASES
 
 
 
@@ -1,18 +1,28 @@
 import sys
 import weakref
 from abc import abstractmethod, ABCMeta
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from functools import wraps
-from typing import Union, Tuple
+from typing import Any, Callable, Iterable, Iterator, Optional, Union, Tuple
 
 import torch
 from torch import nn
+from torch.profiler import record_function
 
 from deepclustering2.meters2 import MeterInterface, EpochResultDict
+from deepclustering2.models.accumulation import (
+    GradientAccumulator,
+    find_micro_batch_size,
+    split_batch,
+)
 from deepclustering2.models.models import Model
 from deepclustering2.tqdm import tqdm
+from ._profiler import EpochProfiler, record_next
 from ..ddp.ddp import _DDPMixin
 
+# returned by `_Epocher._phase` when not profiling
+_no_phase = nullcontext()
+
 
 def proxy_trainer(func):
     @wraps(func)
@@ -26,18 +36,36 @@ def proxy_trainer(func):
 
 
 class _Epocher(_DDPMixin, metaclass=ABCMeta):
+    # indicator of each epocher class, reused from an epoch to the next
+    _indicators = {}
+    # set with `set_profiler`, None for no profiling
+    _profiler: Optional[EpochProfiler] = None
+
     def __init__(
         self,
         model: Union[Model, nn.Module],
         num_batches: int = None,
         cur_epoch=0,
         device="cpu",
+        reduce_meters: bool = False,
     ) -> None:
+        """
+        :param reduce_meters: all-reduce the meters across the ranks before reporting the epoch result,
+                for an epoch run on a shard of the data by each rank.
+        """
         super().__init__()
         self._model = model
         self._device = device
         self._num_batches = num_batches
         self._cur_epoch = cur_epoch
+        self._reduce_meters = reduce_meters
+        # the running `torch.profiler.profile`, if any
+        self._profile = None
+        self._accumulate_steps = 1
+        self._micro_batch_size = None
+        self._memory_budget = None
+        self._step_scheduler = False
+        self._accumulator = None
 
     @property
     def device(self):
@@ -60,19 +88,136 @@ class _Epocher(_DDPMixin, metaclass=ABCMeta):
             self._num_batches, int
         ), f"self._num_batches must be provided as an integer, given {self._num_batches}."
         sys.stdout.flush()
-        indicator = tqdm(
-            range(self._num_batches), disable=False if self.on_master() else True
-        )
+        disable = False if self.on_master() else True
+        indicator = _Epocher._indicators.get(self.__class__.__name__)
+        if indicator is None or indicator.disable != disable:
+            indicator = tqdm(range(self._num_batches), disable=disable)
+            _Epocher._indicators[self.__class__.__name__] = indicator
+        else:
+            indicator.restart(range(self._num_batches))
         indicator = indicator.set_desc_from_epocher(self)
         yield indicator
         indicator._print_description()
         sys.stdout.flush()
 
+    @contextmanager
+    def _register_profiler(self):
+        if self._profiler is None or not self._profiler.enabled_for(self._cur_epoch):
+            yield
+            return
+        name = f"{self.__class__.__name__}_{self._cur_epoch:03d}"
+        with self._profiler.profile(name, self.device) as self._profile:
+            try:
+                yield
+            finally:
+                self._profile = None
+
+    def set_profiler(self, profiler: Optional[EpochProfiler]):
+        self._profiler = profiler
+
+    def set_reduce_meters(self, reduce_meters: bool):
+        """
+        see `reduce_meters` of `__init__`, to be set before `run`.
+        """
+        self._reduce_meters = reduce_meters
+
+    def _phase(self, name: str):
+        """
+        context recording `name` (one of `PHASES`) as a range of the step when profiling, doing nothing otherwise:
+        >>> with self._phase("forward"):
+        >>>     logits = self._model(image)
+        """
+        if self._profile is None:
+            return _no_phase
+        return record_function(name)
+
+    def _batches(self, loader: Iterable, **kwargs) -> Iterator:
+        """
+        iterate `loader` with `self._indicator.track`, marking the steps and the data wait for the profiler.
+        """
+        if self._profile is None:
+            yield from self._indicator.track(loader, **kwargs)
+            return
+        for batch in self._indicator.track(record_next(loader, "data"), **kwargs):
+            yield batch
+            self._profile.step()
+
+    def set_gradient_accumulation(
+        self,
+        accumulate_steps: int = 1,
+        micro_batch_size: Union[int, str] = None,
+        memory_budget: int = None,
+        step_scheduler: bool = False,
+    ):
+        """
+        :param accumulate_steps: number of batches per optimizer step, `self._accumulator` stepping the optimizer
+        :param micro_batch_size: number of samples of the micro-batches given by `_micro_batches`, the whole batch
+                if None, or "auto" for the largest one fitting in memory (and `memory_budget` bytes if given)
+        :param step_scheduler: step the scheduler of the model after each optimizer step, for schedules counted in
+                iterations
+        """
+        assert (
+            micro_batch_size is None
+            or micro_batch_size == "auto"
+            or (isinstance(micro_batch_size, int) and micro_batch_size >= 1)
+        ), micro_batch_size
+        self._accumulate_steps = accumulate_steps
+        self._micro_batch_size = micro_batch_size
+        self._memory_budget = memory_budget
+        self._step_scheduler = step_scheduler
+
+    @property
+    def micro_batch_size(self) -> Union[int, str, None]:
+        """micro-batch size, "auto" being replaced by the size found on the first batch"""
+        return self._micro_batch_size
+
+    @contextmanager
+    def _register_accumulator(self):
+        if not callable(getattr(self._model, "step", None)):
+            # no optimizer to step, e.g. for evaluation
+            yield
+            return
+        scheduler = None
+        if self._step_scheduler:
+            scheduler = getattr(self._model, "scheduler", None)
+        self._accumulator = GradientAccumulator(
+            self._model, self._accumulate_steps, scheduler=scheduler
+        )
+        yield
+        # the last batches of the epoch, short of a full cycle
+        self._accumulator.flush()
+
+    def _micro_batches(self, batch, probe: Callable[[Any], None] = None):
+        """
+        split `batch` into micro-batches of `micro_batch_size` samples, with their share of the batch:
+        >>> with self._accumulator.step():
+        >>>     for micro_batch, weight in self._micro_batches(batch, probe=self._forward_backward):
+        >>>         self._accumulator.backward(self._loss(micro_batch) * weight)
+        :param probe: forward and backward of a micro-batch, to search for the micro-batch size when it is "auto"
+        """
+        if self._micro_batch_size == "auto":
+            assert probe is not None, "`probe` is needed to search the micro-batch size"
+            # running statistics (e.g. of batch norm) updated by the probes
+            buffers = list(getattr(self._model, "_torchnet", self._model).buffers())
+            saved = [b.clone() for b in buffers]
+            self._micro_batch_size = find_micro_batch_size(
+                probe, batch, self._memory_budget, self.device
+            )
+            with torch.no_grad():
+                for b, s in zip(buffers, saved):
+                    b.copy_(s)
+            # gradients of the probes
+            self._model.zero_grad()
+        return split_batch(batch, self._micro_batch_size)
+
     @contextmanager
     def _register_meters(self):
-        meters: MeterInterface = MeterInterface()
+        meters: MeterInterface = MeterInterface(reduce_final=self._reduce_meters)
         meters = self._configure_meters(meters)
-        yield meters
+        try:
+            yield meters
+        finally:
+            meters.join()
 
     @abstractmethod
     def _configure_meters(self, meters: MeterInterface) -> MeterInterface:
@@ -102,7 +247,7 @@ class _Epocher(_DDPMixin, metaclass=ABCMeta):
         self.to(self._device)  # put all things into the same device
         with self._register_meters() as self.meters, self._register_indicator() as self._indicator, self._configure_model(
             self._model
-        ):
+        ), self._register_profiler(), self._register_accumulator():
             return self._run(*args, **kwargs)
 
     def to(self, device: Union[torch.device, str] = torch.device("cpu")):
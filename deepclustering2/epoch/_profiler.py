@@ -0,0 +1,122 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Sequence, Union
+
+import torch
+from torch.profiler import (
+    ProfilerActivity,
+    profile,
+    record_function,
+    schedule,
+)
+
+__all__ = ["EpochProfiler", "PHASES"]
+
+# names of the ranges recorded in an epoch, by `_Epocher._phase`
+PHASES = (
+    "data",
+    "h2d",
+    "forward",
+    "loss",
+    "backward",
+    "optimizer",
+    "ema",
+    "meters",
+    "logging",
+)
+
+
+def record_next(iterable: Iterable, name="data"):
+    """
+    iterate `iterable`, recording each `next` call as the range `name`.
+    """
+    iterator = iter(iterable)
+    while True:
+        with record_function(name):
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+        yield batch
+
+
+class EpochProfiler:
+    def __init__(
+        self,
+        save_dir: Union[str, Path],
+        wait: int = 1,
+        warmup: int = 1,
+        active: int = 5,
+        repeat: int = 1,
+        epochs: Sequence[int] = None,
+        profile_memory: bool = True,
+        record_shapes: bool = True,
+        with_stack: bool = False,
+        row_limit: int = 30,
+    ) -> None:
+        """
+        `torch.profiler` window over the steps of the epochs, exported to `save_dir` as Chrome traces
+        (chrome://tracing or https://ui.perfetto.dev) and tables of the operators by time and by CPU memory.
+        :param wait: steps skipped at the beginning of a cycle
+        :param warmup: steps profiled but discarded, after `wait`
+        :param active: steps recorded, after `warmup`
+        :param repeat: number of cycles of each epoch, 0 for as many as the epoch holds
+        :param epochs: epochs to profile, all of them if None
+        :param profile_memory: record the tensor allocations
+        """
+        assert wait >= 0 and warmup >= 0 and active >= 1, (wait, warmup, active)
+        self._save_dir = Path(save_dir)
+        self._schedule = schedule(
+            wait=wait, warmup=warmup, active=active, repeat=repeat
+        )
+        self._epochs = None if epochs is None else set(epochs)
+        self._profile_memory = profile_memory
+        self._record_shapes = record_shapes
+        self._with_stack = with_stack
+        self._row_limit = row_limit
+        self._use_cuda = False
+
+    def enabled_for(self, cur_epoch: int) -> bool:
+        return self._epochs is None or cur_epoch in self._epochs
+
+    def _trace_handler(self, name: str):
+        def handler(prof: profile):
+            self._save_dir.mkdir(parents=True, exist_ok=True)
+            prefix = str(self._save_dir / f"{name}_step{prof.step_num:05d}")
+            prof.export_chrome_trace(f"{prefix}.json")
+            averages = prof.key_averages()
+            sort_by = (
+                "self_cuda_time_total" if self._use_cuda else "self_cpu_time_total"
+            )
+            with open(f"{prefix}.txt", "w") as f:
+                f.write(averages.table(sort_by=sort_by, row_limit=self._row_limit))
+                if self._profile_memory:
+                    f.write(os.linesep)
+                    f.write(
+                        averages.table(
+                            sort_by="self_cpu_memory_usage", row_limit=self._row_limit
+                        )
+                    )
+
+        return handler
+
+    @contextmanager
+    def profile(self, name: str, device: torch.device):
+        """
+        profile the steps run in the context, `step` of the returned profiler marking the end of each of them.
+        :param name: prefix of the exported files, e.g. the epocher and its epoch
+        """
+        activities = [ProfilerActivity.CPU]
+        self._use_cuda = device.type == "cuda"
+        if self._use_cuda:
+            activities.append(ProfilerActivity.CUDA)
+        with profile(
+            activities=activities,
+            schedule=self._schedule,
+            on_trace_ready=self._trace_handler(name),
+            profile_memory=self._profile_memory,
+            record_shapes=self._record_shapes,
+            with_stack=self._with_stack,
+        ) as prof:
+            yield prof
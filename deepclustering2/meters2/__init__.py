@@ -1,5 +1,5 @@
 from .meter_interface import MeterInterface, EpochResultDict
-from .historicalContainer import HistoricalContainer
+from .historicalContainer import HistoricalContainer, ColumnarContainer
 from .individual_meters import *
 from .storage_interface import Storage, StorageIncomeDict
 
@@ -0,0 +1,233 @@
+"""
+Background evaluation of the meters registered in `MeterInterface` with `async_mode`.
+
+Each asynchronous meter is owned by one worker, a thread or a process, which applies the `add` calls in their
+submission order. The inputs are detached and copied before being queued, so that the training loop can modify
+them right after, and the queue is bounded so that a slow meter slows the loop down instead of piling up inputs.
+`flush` waits for all the submitted calls to be applied, and raises the first error met by the worker.
+"""
+
+import multiprocessing as mp
+import queue
+import threading
+from typing import Any, Optional
+
+import numpy as np
+import torch
+
+from .individual_meters._metric import _Metric
+
+__all__ = ["ASYNC_MODES", "AsyncMeterProxy", "create_worker"]
+
+ASYNC_MODES = ("thread", "process")
+
+
+def _snapshot(obj: Any, to_cpu: bool = False) -> Any:
+    if isinstance(obj, torch.Tensor):
+        tensor = obj.detach()
+        if to_cpu:
+            tensor = tensor.cpu()
+        return tensor.clone()
+    if isinstance(obj, np.ndarray):
+        return obj.copy()
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(o, to_cpu) for o in obj)
+    if isinstance(obj, dict):
+        return {k: _snapshot(v, to_cpu) for k, v in obj.items()}
+    return obj
+
+
+class _MeterWorker:
+    def __init__(self, name: str, meter: _Metric, max_pending: int) -> None:
+        assert max_pending >= 1, max_pending
+        self._name = name
+        self._meter = meter
+        self._max_pending = max_pending
+
+    @property
+    def meter(self) -> _Metric:
+        return self.flush()
+
+    def submit(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def flush(self) -> _Metric:
+        """
+        wait until all submitted inputs are added, and return the up-to-date meter.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+class _ThreadMeterWorker(_MeterWorker):
+    def __init__(self, name: str, meter: _Metric, max_pending: int) -> None:
+        super().__init__(name, meter, max_pending)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._loop, name=f"meter_{name}", daemon=True
+        )
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    args, kwargs = item
+                    self._meter.add(*args, **kwargs)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, *args, **kwargs):
+        self._raise_error()
+        # blocks when `max_pending` inputs are waiting
+        self._queue.put((_snapshot(args), _snapshot(kwargs)))
+
+    def flush(self) -> _Metric:
+        self._queue.join()
+        self._raise_error()
+        return self._meter
+
+    def reset(self):
+        self.flush()
+        self._meter.reset()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+
+def _process_loop(meter: _Metric, in_queue: mp.Queue, out_queue: mp.Queue):
+    error = None
+    while True:
+        command, payload = in_queue.get()
+        if command == "add":
+            if error is None:
+                try:
+                    args, kwargs = payload
+                    meter.add(*args, **kwargs)
+                except Exception as e:
+                    error = e
+        elif command == "flush":
+            out_queue.put((meter, error))
+            error = None
+        elif command == "reset":
+            meter.reset()
+        elif command == "close":
+            return
+
+
+class _ProcessMeterWorker(_MeterWorker):
+    """
+    the meter lives in the worker process, and is sent back to the main one at each flush.
+    """
+
+    def __init__(self, name: str, meter: _Metric, max_pending: int) -> None:
+        super().__init__(name, meter, max_pending)
+        self._in_queue = mp.Queue(maxsize=max_pending)
+        self._out_queue = mp.Queue()
+        self._process = mp.Process(
+            target=_process_loop,
+            args=(meter, self._in_queue, self._out_queue),
+            name=f"meter_{name}",
+            daemon=True,
+        )
+        self._process.start()
+        self._dirty = False
+
+    def _check_alive(self):
+        if not self._process.is_alive():
+            raise RuntimeError(
+                f"worker process of meter `{self._name}` has exited "
+                f"with exit code {self._process.exitcode}."
+            )
+
+    def _put(self, item):
+        # polled, as a full queue would block forever once the worker is dead
+        while True:
+            self._check_alive()
+            try:
+                return self._in_queue.put(item, timeout=1.0)
+            except queue.Full:
+                pass
+
+    def _get(self):
+        while True:
+            try:
+                return self._out_queue.get(timeout=1.0)
+            except queue.Empty:
+                self._check_alive()
+
+    def submit(self, *args, **kwargs):
+        self._put(("add", (_snapshot(args, True), _snapshot(kwargs, True))))
+        self._dirty = True
+
+    def flush(self) -> _Metric:
+        if self._dirty:
+            self._put(("flush", None))
+            self._meter, error = self._get()
+            self._dirty = False
+            if error is not None:
+                raise error
+        return self._meter
+
+    def reset(self):
+        self.flush()
+        self._put(("reset", None))
+        self._meter.reset()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._process.is_alive():
+                self._in_queue.put(("close", None))
+                self._process.join()
+
+
+def create_worker(
+    name: str, meter: _Metric, async_mode: str, max_pending: int
+) -> _MeterWorker:
+    assert async_mode in ASYNC_MODES, async_mode
+    if async_mode == "thread":
+        return _ThreadMeterWorker(name, meter, max_pending)
+    return _ProcessMeterWorker(name, meter, max_pending)
+
+
+class AsyncMeterProxy:
+    """
+    what `MeterInterface[name]` returns for an asynchronous meter: `add` is submitted to the worker,
+    and any other access waits for the pending inputs first.
+    """
+
+    def __init__(self, worker: _MeterWorker) -> None:
+        self._worker = worker
+
+    def add(self, *args, **kwargs):
+        self._worker.submit(*args, **kwargs)
+
+    def reset(self):
+        self._worker.reset()
+
+    def __getattr__(self, item):
+        return getattr(self._worker.flush(), item)
+
+    def __repr__(self):
+        return repr(self._worker.flush())
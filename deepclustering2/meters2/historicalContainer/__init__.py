@@ -1 +1,2 @@
 from .historical_container import HistoricalContainer
+from .columnar_container import ColumnarContainer
@@ -0,0 +1,188 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+_Record_Type = Dict[str, float]
+
+__all__ = ["ColumnarContainer"]
+
+
+class ColumnarContainer:
+    """
+    Append-only historical container, with the same interface as `HistoricalContainer`.
+    Each epoch is a row of a preallocated float64 array, grown by x2, whose columns are the keys of the added
+    dicts (missing entries being nan), so that `add` is O(1) amortized and the DataFrame is only built in
+    `summary`. Values should be scalars.
+    The records of all the epochs hold all the keys, nan for the absent ones.
+    """
+
+    def __init__(self, initial_capacity: int = 64) -> None:
+        assert initial_capacity >= 1, initial_capacity
+        self._initial_capacity = initial_capacity
+        self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def reset(self) -> None:
+        self._columns: Dict[str, int] = {}
+        self._epoch2row: Dict[int, int] = {}
+        self._epochs = np.empty(self._initial_capacity, dtype=np.int64)
+        self._values = np.full((self._initial_capacity, 0), np.nan)
+        self._n = 0
+        self._current_epoch: int = 0
+        # whether the row i holds the epoch i
+        self._contiguous = True
+
+    @property
+    def current_epoch(self) -> int:
+        """return current epoch"""
+        return self._current_epoch
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns.keys())
+
+    @property
+    def epochs(self) -> np.ndarray:
+        return self._epochs[: self._n]
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        the recorded rows, of shape (number of epochs, number of columns)
+        """
+        return self._values[: self._n, : len(self._columns)]
+
+    def add(self, input_dict: _Record_Type, epoch=None) -> None:
+        if epoch:
+            self._current_epoch = epoch
+        row = self._epoch2row.get(self._current_epoch)
+        if row is None:
+            row = self._append_row(self._current_epoch)
+        else:
+            # an epoch added again replaces its previous record
+            self._values[row] = np.nan
+        for k, v in input_dict.items():
+            column = self._columns.get(k)
+            if column is None:
+                column = self._append_column(k)
+            self._values[row, column] = float(v)
+        self._current_epoch += 1
+
+    def _append_row(self, epoch: int) -> int:
+        if self._n == self._values.shape[0]:
+            capacity = 2 * self._values.shape[0]
+            values = np.full((capacity, self._values.shape[1]), np.nan)
+            values[: self._n] = self._values[: self._n]
+            epochs = np.empty(capacity, dtype=np.int64)
+            epochs[: self._n] = self._epochs[: self._n]
+            self._values, self._epochs = values, epochs
+        row = self._n
+        self._contiguous = self._contiguous and epoch == row
+        self._epochs[row] = epoch
+        self._epoch2row[epoch] = row
+        self._n += 1
+        return row
+
+    def _append_column(self, name: str) -> int:
+        column = len(self._columns)
+        if column == self._values.shape[1]:
+            values = np.full((self._values.shape[0], max(2 * column, 8)), np.nan)
+            values[:, :column] = self._values
+            self._values = values
+        self._columns[name] = column
+        return column
+
+    @property
+    def record_dict(self) -> Dict[int, _Record_Type]:
+        return {epoch: self[epoch] for epoch in self.epochs.tolist()}
+
+    def get_record_dict(self, epoch=None):
+        if epoch is None:
+            return self.record_dict
+        assert epoch in self._epoch2row, "epoch {} not saved in {}".format(
+            epoch, ", ".join(map(str, self.epochs.tolist()))
+        )
+        return self[epoch]
+
+    def __getitem__(self, epoch: int) -> _Record_Type:
+        row = self._values[self._epoch2row[epoch]]
+        return {k: row[column] for k, column in self._columns.items()}
+
+    def __len__(self):
+        return self._n
+
+    def table(self, epochs: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        rows of `epochs`, nan for the epochs not recorded.
+        :param epochs: the epochs of `index` by default
+        """
+        if epochs is None:
+            epochs = self.index
+        epochs = np.asarray(epochs, dtype=np.int64)
+        if self._contiguous and (len(epochs) == 0 or epochs.max() < self._n):
+            return self.values[epochs]
+        table = np.full((len(epochs), len(self._columns)), np.nan)
+        order = np.argsort(self.epochs, kind="stable")
+        sorted_epochs = self.epochs[order]
+        position = np.searchsorted(sorted_epochs, epochs).clip(max=max(self._n - 1, 0))
+        recorded = (sorted_epochs[position] == epochs) if self._n else position < 0
+        table[recorded] = self.values[order[position[recorded]]]
+        return table
+
+    @property
+    def contiguous(self) -> bool:
+        return self._contiguous
+
+    @property
+    def index(self) -> np.ndarray:
+        """
+        the recorded epochs and the missing ones before `current_epoch`, sorted.
+        """
+        if self._contiguous:
+            return np.arange(max(self._n, self._current_epoch))
+        return np.union1d(self.epochs, np.arange(self._current_epoch))
+
+    def summary(self) -> pd.DataFrame:
+        index = self.index
+        return pd.DataFrame(self.table(index), index=index, columns=self.columns)
+
+    def state_dict(self) -> Dict[str, Any]:
+        """Returns the state of the class, holding only the recorded rows."""
+        return {
+            "columns": self.columns,
+            "epochs": self.epochs.copy(),
+            "values": self.values.copy(),
+            "current_epoch": self._current_epoch,
+        }
+
+    def load_state_dict(self, state_dict: Dict[str, Any]) -> None:
+        """Loads the state returned by `state_dict`."""
+        self.reset()
+        for name in state_dict["columns"]:
+            self._append_column(name)
+        for epoch, row in zip(state_dict["epochs"], state_dict["values"]):
+            # `_append_row` may reallocate `_values`
+            index = self._append_row(int(epoch))
+            self._values[index, : len(row)] = row
+        self._current_epoch = state_dict["current_epoch"]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_epochs"] = self.epochs.copy()
+        state["_values"] = self.values.copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._values.shape[0] == 0:
+            self._values = np.full((1, self._values.shape[1]), np.nan)
+            self._epochs = np.empty(1, dtype=np.int64)
+
+    def __repr__(self):
+        return str(self.summary())
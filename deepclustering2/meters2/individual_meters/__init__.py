@@ -1,4 +1,5 @@
 from ._metric import _Metric
+from ._segmentation_stats import SegmentationStats, segmentation_stats
 
 # individual package for meters based on
 """
@@ -24,10 +25,17 @@ from ._metric import _Metric
 >>>        pass
 """
 
-from .averagemeter import AverageValueMeter, MultipleAverageValueMeter
+from .averagemeter import (
+    AverageValueMeter,
+    MultipleAverageValueMeter,
+    TensorAverageValueMeter,
+)
 from .confusionmatrix import ConfusionMatrix
 from .hausdorff import HaussdorffDistance
 from .instance import InstanceValue
 from .iou import IoU
 from .general_dice_meter import UniversalDice
 from .surface_meter import SurfaceMeter
+from .volume_surface_meter import VolumeSurfaceMeter
+from .ranking_meter import StreamingAPMeter, StreamingAUCMeter
+from .throughput import ThroughputMeter
@@ -0,0 +1,131 @@
+"""
+Preallocated, growable row buffer for the meters logging a few values per `add`.
+
+Rows are written into a tensor whose capacity grows by x1.5 (as the storage of torchnet's `APMeter`), so that
+appending is O(1) amortized and reading the log is a view instead of a `torch.cat` of the whole history.
+Beyond `max_memory` bytes, the buffer moves to a memory-mapped file in `spill_dir`.
+The defaults of both are read from the `DEEPCLUSTERING_BUFFER_MAX_MEMORY` (in bytes, unlimited if unset) and
+`DEEPCLUSTERING_BUFFER_SPILL_DIR` environment variables.
+"""
+__all__ = ["GrowableBuffer"]
+
+import os
+from tempfile import NamedTemporaryFile
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import torch
+from torch import Tensor
+
+_default_max_memory = os.environ.get("DEEPCLUSTERING_BUFFER_MAX_MEMORY")
+_default_spill_dir = os.environ.get("DEEPCLUSTERING_BUFFER_SPILL_DIR")
+
+
+class GrowableBuffer:
+    def __init__(
+        self,
+        dtype: torch.dtype = None,
+        initial_capacity: int = 64,
+        max_memory: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        """
+        :param dtype: dtype of the rows, taken from the first rows if None
+        :param initial_capacity: number of rows allocated at the first append
+        :param max_memory: size in bytes beyond which the rows are kept in a memory-mapped file
+        :param spill_dir: directory of the memory-mapped file, the system temporary directory by default
+        """
+        assert initial_capacity >= 1, initial_capacity
+        if max_memory is None and _default_max_memory is not None:
+            max_memory = int(_default_max_memory)
+        self._dtype = dtype
+        self._initial_capacity = initial_capacity
+        self._max_memory = max_memory
+        self._spill_dir = spill_dir or _default_spill_dir
+        self.clear()
+
+    def clear(self):
+        self._data: Optional[Tensor] = None
+        self._n = 0
+        # deletes the file of a spilled buffer
+        if getattr(self, "_spill_file", None) is not None:
+            self._spill_file.close()
+        self._spill_file = None
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill_file is not None
+
+    def append(self, rows: Union[Tensor, np.ndarray, float]):
+        """
+        append rows of shape (n, *row_shape), or a single row of shape `row_shape` if the buffer
+        was created from rows of one more dimension.
+        """
+        if not torch.is_tensor(rows):
+            rows = torch.as_tensor(np.asarray(rows))
+        rows = rows.detach()
+        if self._data is None:
+            if rows.dim() == 0:
+                rows = rows.view(1)
+            self._allocate(rows)
+        if rows.dim() == self._data.dim() - 1:
+            rows = rows.unsqueeze(0)
+        assert rows.shape[1:] == self._data.shape[1:], (
+            f"incompatible row shape, given {tuple(rows.shape[1:])}, "
+            f"expected {tuple(self._data.shape[1:])}."
+        )
+        self._reserve(self._n + rows.shape[0])
+        self._data[self._n : self._n + rows.shape[0]] = rows.to(self._data.device)
+        self._n += rows.shape[0]
+
+    def view(self) -> Tensor:
+        """
+        the appended rows, of shape (n, *row_shape), sharing the memory of the buffer.
+        """
+        if self._data is None:
+            return torch.zeros(0)
+        return self._data[: self._n]
+
+    def _allocate(self, rows: Tensor):
+        dtype = self._dtype or rows.dtype
+        self._data = torch.empty(
+            (self._initial_capacity, *rows.shape[1:]), dtype=dtype, device=rows.device
+        )
+
+    def _reserve(self, size: int):
+        capacity = self._data.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, int(capacity * 1.5) + 1)
+        shape: Tuple[int, ...] = (new_capacity, *self._data.shape[1:])
+        row_bytes = self._data.element_size() * int(np.prod(shape[1:]))
+        previous_file = self._spill_file
+        if self._max_memory is not None and new_capacity * row_bytes > self._max_memory:
+            data = self._memmap(shape)
+        else:
+            data = self._data.new_empty(shape)
+        data[: self._n] = self._data[: self._n].to(data.device)
+        self._data = data
+        if previous_file is not None:
+            previous_file.close()
+
+    def _memmap(self, shape: Tuple[int, ...]) -> Tensor:
+        self._spill_file = NamedTemporaryFile(
+            prefix="meter_buffer_", suffix=".dat", dir=self._spill_dir
+        )
+        array = np.memmap(
+            self._spill_file.name,
+            dtype=torch.empty(0, dtype=self._data.dtype).numpy().dtype,
+            mode="w+",
+            shape=shape,
+        )
+        return torch.from_numpy(array)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None if self._data is None else self.view().clone()
+        state["_spill_file"] = None
+        return state
@@ -1,9 +1,22 @@
 import numbers
 from abc import abstractmethod, ABCMeta
+from copy import copy
 from functools import wraps
+from typing import Any, Dict, Tuple, Union
 
 import numpy as np
 import torch
+import torch.distributed as dist
+
+from ._reduction import (
+    get_stat,
+    set_stat,
+    sum_stats,
+    cat_stats,
+    is_distributed,
+    all_reduce_sum,
+    to_cpu,
+)
 
 
 class CustomizedType(type):
@@ -59,12 +72,111 @@ class MeterResultDict(dict):
         return string_info
 
 
+def _dirty_on_call(func):
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        self.__dict__["_summary_cache"] = {}
+        return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _cached_on_clean(func):
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if args or kwargs:
+            return func(self, *args, **kwargs)
+        cache = self.__dict__.setdefault("_summary_cache", {})
+        if func.__qualname__ not in cache:
+            cache[func.__qualname__] = func(self)
+        return copy(cache[func.__qualname__])
+
+    return wrapper
+
+
 class _Metric(metaclass=ABCMeta):
     """Base class for all metrics.
     record the values within a single epoch
     From: https://github.com/pytorch/tnt/blob/master/torchnet/meter/meter.py
+
+    `summary` and `detailed_summary` are cached until the meter gets dirty, i.e. until one of the
+    `_mutating_methods` is called. Subclasses modifying their state elsewhere should list the method there,
+    or call `mark_dirty`.
+
+    Meters of several processes are combined through their `state`, the sufficient statistics listed in
+    `_reduce_sum` (summed) and `_reduce_cat` (concatenated), with `merge` and `all_reduce`.
+    Meters with other statistics override `state`, `load_state` and `_merge_states`.
     """
 
+    _mutating_methods = ("add", "reset")
+    _cached_methods = ("summary", "detailed_summary")
+    _reduce_sum: Tuple[str, ...] = ()
+    _reduce_cat: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in cls._mutating_methods:
+            if name in cls.__dict__:
+                setattr(cls, name, _dirty_on_call(cls.__dict__[name]))
+        for name in cls._cached_methods:
+            if name in cls.__dict__:
+                setattr(cls, name, _cached_on_clean(cls.__dict__[name]))
+
+    def mark_dirty(self):
+        """
+        drop the cached summaries.
+        """
+        self.__dict__["_summary_cache"] = {}
+
+    @property
+    def reducible(self) -> bool:
+        return bool(self._reduce_sum or self._reduce_cat) or (
+            type(self).state is not _Metric.state
+        )
+
+    def state(self) -> Dict[str, Any]:
+        """
+        sufficient statistics of the meter.
+        """
+        if not self.reducible:
+            raise NotImplementedError(
+                f"{self.__class__.__name__} does not define its reduction state."
+            )
+        return {k: get_stat(self, k) for k in self._reduce_sum + self._reduce_cat}
+
+    def load_state(self, state: Dict[str, Any]):
+        for k, v in state.items():
+            set_stat(self, k, v)
+        self.mark_dirty()
+
+    def _merge_states(self, *states: Dict[str, Any]) -> Dict[str, Any]:
+        merged = {k: sum_stats([s[k] for s in states]) for k in self._reduce_sum}
+        merged.update({k: cat_stats([s[k] for s in states]) for k in self._reduce_cat})
+        return merged
+
+    def merge(self, other: Union["_Metric", Dict[str, Any]]):
+        """
+        add the statistics of `other`, a meter of the same configuration or its state.
+        """
+        other_state = other.state() if isinstance(other, _Metric) else other
+        self.load_state(self._merge_states(self.state(), other_state))
+
+    def all_reduce(self, group=None):
+        """
+        combine the statistics of the meters of all the ranks of `group`, leaving the result on each rank.
+        Summed statistics use `all_reduce`, the others are gathered.
+        """
+        if not is_distributed(group):
+            return
+        state = self.state()
+        if not self._reduce_cat and type(self).state is _Metric.state:
+            state = {k: all_reduce_sum(v, group) for k, v in state.items()}
+        else:
+            states = [None] * dist.get_world_size(group)
+            dist.all_gather_object(states, to_cpu(state), group=group)
+            state = self._merge_states(*states)
+        self.load_state(state)
+
     @abstractmethod
     def reset(self):
         pass
@@ -0,0 +1,115 @@
+"""
+Helpers of the `state` reduction protocol of `_Metric`.
+
+The state of a meter is a dict of sufficient statistics, each of them either summed (counts, sums, confusion
+matrices) or concatenated (logs of per-sample values) when states of several meters are merged.
+"""
+__all__ = [
+    "get_stat",
+    "set_stat",
+    "sum_stats",
+    "cat_stats",
+    "is_distributed",
+    "all_reduce_sum",
+    "to_cpu",
+]
+
+from functools import reduce
+from typing import Any, List
+
+import numpy as np
+import torch
+import torch.distributed as dist
+
+from ._growable_buffer import GrowableBuffer
+
+
+def _resolve(obj, name: str):
+    *parents, attribute = name.split(".")
+    for parent in parents:
+        obj = getattr(obj, parent)
+    return obj, attribute
+
+
+def get_stat(obj, name: str) -> Any:
+    """
+    copy of the attribute `name` (dotted path allowed), logs of `GrowableBuffer` being returned as tensors.
+    """
+    value = getattr(*_resolve(obj, name))
+    if isinstance(value, GrowableBuffer):
+        return value.view().clone()
+    if torch.is_tensor(value):
+        return value.detach().clone()
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+def set_stat(obj, name: str, value: Any):
+    owner, attribute = _resolve(obj, name)
+    current = getattr(owner, attribute)
+    if isinstance(current, GrowableBuffer):
+        current.clear()
+        if len(value) > 0:
+            current.append(value)
+        return
+    if torch.is_tensor(current) and torch.is_tensor(value):
+        value = value.to(current.device, current.dtype)
+    elif isinstance(current, np.ndarray):
+        value = np.asarray(value, dtype=current.dtype)
+    setattr(owner, attribute, value)
+
+
+def sum_stats(values: List[Any]) -> Any:
+    return reduce(lambda a, b: a + b, values)
+
+
+def cat_stats(values: List[Any]) -> Any:
+    values = [v for v in values if len(v) > 0] or values[:1]
+    if torch.is_tensor(values[0]):
+        return torch.cat([v.to(values[0].device) for v in values])
+    if isinstance(values[0], np.ndarray):
+        return np.concatenate(values)
+    return sum((list(v) for v in values), [])
+
+
+def is_distributed(group=None) -> bool:
+    return (
+        dist.is_available() and dist.is_initialized() and dist.get_world_size(group) > 1
+    )
+
+
+def all_reduce_sum(value: Any, group=None) -> Any:
+    """
+    sum a number, an array or a tensor over the ranks of `group`.
+    """
+    is_tensor = torch.is_tensor(value)
+    tensor = torch.as_tensor(value)
+    dtype, device = tensor.dtype, tensor.device
+    reduced = tensor.to(torch.float64 if tensor.is_floating_point() else torch.int64)
+    if dist.get_backend(group) == "nccl":
+        reduced = reduced.cuda()
+    else:
+        reduced = reduced.cpu()
+    dist.all_reduce(reduced, group=group)
+    reduced = reduced.to(device, dtype)
+    if is_tensor:
+        return reduced
+    if isinstance(value, np.ndarray):
+        return reduced.numpy()
+    return reduced.item()
+
+
+def to_cpu(state: Any) -> Any:
+    """
+    copy of a (nested) state with its tensors moved to the cpu, to be exchanged between processes.
+    """
+    if torch.is_tensor(state):
+        return state.cpu()
+    if isinstance(state, dict):
+        return {k: to_cpu(v) for k, v in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(to_cpu(v) for v in state)
+    return state
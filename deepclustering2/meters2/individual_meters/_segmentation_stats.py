@@ -0,0 +1,133 @@
+"""
+One-pass per-sample, per-class confusion statistics for segmentation meters.
+
+The dice, IoU, accuracy and confusion-matrix meters all derive their values from the same counts, so instead of
+building B x C x H x W one-hot tensors for each of them, a single bincount over the label maps gives
+the per-sample C x C confusion matrices from which TP, FP and FN are read.
+The result of the last call is memoized, so that several meters registered on the same prediction share it.
+"""
+__all__ = ["SegmentationStats", "segmentation_stats"]
+
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from ._memo import LastCallMemo
+
+
+class SegmentationStats:
+    """
+    Per-sample confusion matrices of shape (B, C, C), rows being the targets and columns the predictions.
+    """
+
+    def __init__(self, confusion: Tensor) -> None:
+        assert confusion.dim() == 3 and confusion.shape[1] == confusion.shape[2]
+        self.confusion = confusion
+
+    @property
+    def num_classes(self) -> int:
+        return self.confusion.shape[1]
+
+    @property
+    def tp(self) -> Tensor:
+        return self.confusion.diagonal(dim1=1, dim2=2)
+
+    @property
+    def fp(self) -> Tensor:
+        return self.confusion.sum(1) - self.tp
+
+    @property
+    def fn(self) -> Tensor:
+        return self.confusion.sum(2) - self.tp
+
+    def dice(self, per_sample: bool = True, eps: float = 1e-8) -> Tensor:
+        """
+        :param per_sample: dice of each sample with shape (B, C) if True, otherwise dice of the batch with shape (C,)
+        """
+        tp, fp, fn = self.tp, self.fp, self.fn
+        if not per_sample:
+            tp, fp, fn = tp.sum(0), fp.sum(0), fn.sum(0)
+        return (2 * tp.float() + eps) / ((2 * tp + fp + fn).float() + eps)
+
+    def iou(self, per_sample: bool = True, eps: float = 1e-16) -> Tensor:
+        tp, fp, fn = self.tp, self.fp, self.fn
+        if not per_sample:
+            tp, fp, fn = tp.sum(0), fp.sum(0), fn.sum(0)
+        return (tp.double() + eps) / ((tp + fp + fn).double() + eps)
+
+    def accuracy(self) -> Tensor:
+        return self.tp.sum().double() / self.confusion.sum().double()
+
+    def confusion_matrix(self) -> Tensor:
+        """
+        confusion matrix of the batch, with shape (C, C)
+        """
+        return self.confusion.sum(0)
+
+
+def _to_labels(pred: Tensor, target: Tensor) -> Tuple[Tensor, Tensor]:
+    """
+    bring `pred` and `target` to label maps of the same shape (B, *).
+    `pred` with one more dimension than `target`, or with a class dimension when `target` has a singleton one,
+    is considered as class scores of shape (B, C, *) and converted with argmax.
+    """
+    if target.dim() >= pred.dim() and target.dim() >= 3 and target.shape[1] == 1:
+        if pred.dim() == target.dim() - 1 or pred.shape[1] != 1:
+            target = target.squeeze(1)
+    if pred.dim() == target.dim() + 1:
+        pred = pred.argmax(1)
+    return pred, target
+
+
+_last_call = LastCallMemo()
+
+
+def segmentation_stats(
+    pred: Union[Tensor, np.ndarray],
+    target: Union[Tensor, np.ndarray],
+    num_classes: int,
+    ignore_index: Optional[int] = None,
+) -> SegmentationStats:
+    """
+    compute the per-sample, per-class confusion statistics in one bincount pass.
+    :param pred: label map (B, *) or class scores (B, C, *), converted with argmax.
+    :param target: label map (B, *) or (B, 1, *).
+    :param num_classes: C
+    :param ignore_index: target label excluded from the counts. Targets and predictions out of [0, C) are
+        always excluded.
+    :return: SegmentationStats
+    """
+    if isinstance(pred, np.ndarray):
+        pred = torch.from_numpy(pred)
+    if isinstance(target, np.ndarray):
+        target = torch.from_numpy(target)
+
+    stats = _last_call.get(pred, target, num_classes, ignore_index)
+    if stats is not None:
+        return stats
+
+    pred_label, target_label = _to_labels(pred.detach(), target.detach())
+    pred_label, target_label = pred_label.long(), target_label.long()
+    assert pred_label.shape == target_label.shape, (
+        f"incompatible shape of `pred` and `target`, given "
+        f"{pred.shape} and {target.shape}."
+    )
+    if pred_label.dim() == 1:  # a single sample of N elements
+        pred_label, target_label = pred_label[None], target_label[None]
+    B = pred_label.shape[0]
+    pred_label, target_label = pred_label.reshape(B, -1), target_label.reshape(B, -1)
+
+    valid = (target_label >= 0) & (target_label < num_classes)
+    valid &= (pred_label >= 0) & (pred_label < num_classes)
+    if ignore_index is not None:
+        valid &= target_label != ignore_index
+    sample_offset = torch.arange(B, device=pred_label.device)[:, None] * num_classes**2
+    index = sample_offset + target_label * num_classes + pred_label
+    confusion = torch.bincount(index[valid], minlength=B * num_classes**2).view(
+        B, num_classes, num_classes
+    )
+    stats = SegmentationStats(confusion)
+    _last_call.set(stats, pred, target, num_classes, ignore_index)
+    return stats
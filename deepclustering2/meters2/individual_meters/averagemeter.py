@@ -1,12 +1,16 @@
 from collections import defaultdict
-from typing import List
+from typing import List, Union
 
 import numpy as np
+import torch
+from torch import Tensor
 
 from ._metric import _Metric, MeterResultDict
 
 
 class AverageValueMeter(_Metric):
+    _reduce_sum = ("sum", "var", "n")
+
     def __init__(self):
         super(AverageValueMeter, self).__init__()
         self.reset()
@@ -44,6 +48,17 @@ class AverageValueMeter(_Metric):
         self.m_s = 0.0
         self.std = 0.0
 
+    def load_state(self, state):
+        super().load_state(state)
+        # the running moments are recovered from the sums
+        if self.n == 0:
+            self.mean, self.std = np.nan, np.nan
+            return
+        self.mean = self.sum / self.n
+        self.mean_old = self.mean
+        self.m_s = self.var - self.sum * self.sum / self.n
+        self.std = np.inf if self.n == 1 else np.sqrt(self.m_s / (self.n - 1.0))
+
     def summary(self) -> dict:
         # this function returns a dict and tends to aggregate the historical results.
         return MeterResultDict({"mean": self.value()[0]})
@@ -56,20 +71,165 @@ class AverageValueMeter(_Metric):
         return f"{self.__class__.__name__}: n={self.n} \t {self.detailed_summary()}"
 
 
+class TensorAverageValueMeter(_Metric):
+    """
+    average meter accumulating the sum, the sum of squares and the count of the added values.
+    Tensors are detached and accumulated on their own device, so that `add` never waits for the device,
+    and the accumulators are only copied to the host, in one transfer, when the result is requested.
+    """
+
+    _reduce_sum = ("_sum", "_sumsq", "n")
+
+    def __init__(self):
+        super(TensorAverageValueMeter, self).__init__()
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self._sum: Union[float, Tensor] = 0.0
+        self._sumsq: Union[float, Tensor] = 0.0
+        self._val: Union[float, Tensor] = 0.0
+        # number of transfers of the device accumulators to the host since the last reset
+        self.host_syncs = 0
+
+    def add(self, value: Union[float, Tensor], n=1):
+        if isinstance(value, Tensor):
+            assert value.numel() == 1, value.shape
+            value = value.detach().reshape(()).to(torch.float64)
+        self._val = value
+        self._sum = self._sum + value
+        self._sumsq = self._sumsq + value * value
+        self.n += n
+
+    def value(self):
+        if self.n == 0:
+            return np.nan, np.nan
+        if "value" not in self._summary_cache:
+            self._summary_cache["value"] = self._compute_value()
+        return self._summary_cache["value"]
+
+    @property
+    def _on_device(self) -> bool:
+        return isinstance(self._sum, Tensor) or isinstance(self._sumsq, Tensor)
+
+    def _compute_value(self):
+        if self._on_device:
+            total, total_sq = (
+                torch.stack([torch.as_tensor(self._sum), torch.as_tensor(self._sumsq)])
+                .cpu()
+                .tolist()
+            )
+            self.host_syncs += 1
+        else:
+            total, total_sq = self._sum, self._sumsq
+        return self._finalize(total, total_sq)
+
+    def _finalize(self, total: float, total_sq: float):
+        mean = total / self.n
+        if self.n == 1:
+            return mean, np.inf
+        var = max(total_sq - total * total / self.n, 0.0) / (self.n - 1.0)
+        return mean, float(np.sqrt(var))
+
+    @property
+    def val(self) -> float:
+        if isinstance(self._val, Tensor):
+            self.host_syncs += 1
+            return self._val.item()
+        return self._val
+
+    def summary(self) -> dict:
+        return MeterResultDict({"mean": self.value()[0]})
+
+    def detailed_summary(self) -> dict:
+        return MeterResultDict({"mean": self.value()[0], "val": self.value()[1]})
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}: n={self.n} \t {self.detailed_summary()}"
+
+
 class MultipleAverageValueMeter(_Metric):
-    def __init__(self) -> None:
+    def __init__(self, meter_class=TensorAverageValueMeter) -> None:
+        """
+        :param meter_class: meter of each key, `TensorAverageValueMeter` by default,
+                or `AverageValueMeter` for the python float arithmetic.
+        """
         super().__init__()
-        self._meter_dicts = defaultdict(AverageValueMeter)
+        self._meter_dicts = defaultdict(meter_class)
+        self._host_syncs = 0
 
     def reset(self):
         for k, v in self._meter_dicts.items():
             v.reset()
+        self._host_syncs = 0
+
+    @property
+    def host_syncs(self) -> int:
+        """
+        number of device to host transfers since the last reset.
+        """
+        return self._host_syncs + sum(
+            getattr(v, "host_syncs", 0) for v in self._meter_dicts.values()
+        )
+
+    def _sync_values(self):
+        """
+        bring the pending results of the tensor meters to the host in one transfer per device.
+        """
+        pending = defaultdict(list)
+        for v in self._meter_dicts.values():
+            if (
+                isinstance(v, TensorAverageValueMeter)
+                and v.n > 0
+                and v._on_device
+                and "value" not in v._summary_cache
+            ):
+                device = torch.as_tensor(v._sum).device
+                pending[device].append(v)
+        for device, meters in pending.items():
+            if len(meters) == 1:
+                continue
+            totals = (
+                torch.stack(
+                    [
+                        torch.as_tensor(t, dtype=torch.float64, device=device)
+                        for m in meters
+                        for t in (m._sum, m._sumsq)
+                    ]
+                )
+                .cpu()
+                .tolist()
+            )
+            self._host_syncs += 1
+            for i, m in enumerate(meters):
+                m._summary_cache["value"] = m._finalize(*totals[2 * i : 2 * i + 2])
 
     def add(self, *_, **kwargs):
         for k, v in kwargs.items():
             self._meter_dicts[k].add(v)
 
+    def state(self):
+        return {k: v.state() for k, v in self._meter_dicts.items()}
+
+    def load_state(self, state):
+        for k, v in state.items():
+            self._meter_dicts[k].load_state(v)
+        self.mark_dirty()
+
+    def _merge_states(self, *states):
+        # the keys may differ between the merged meters
+        merged = {}
+        for state in states:
+            for k, v in state.items():
+                merged[k] = (
+                    self._meter_dicts[k]._merge_states(merged[k], v)
+                    if k in merged
+                    else v
+                )
+        return merged
+
     def summary(self) -> MeterResultDict:
+        self._sync_values()
         result = {}
         for k, v in self._meter_dicts.items():
             result[k] = v.summary()["mean"]
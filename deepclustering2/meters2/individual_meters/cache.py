@@ -1,5 +1,6 @@
 import torch
 from numbers import Number
+from ._growable_buffer import GrowableBuffer
 from ._metric import _Metric
 import numpy as np
 
@@ -9,6 +10,8 @@ class Cache(_Metric):
     Cache is a meter to just store the elements in self.log. For statistic propose of use.
     """
 
+    _reduce_cat = ("log",)
+
     def __init__(self) -> None:
         super().__init__()
         self.log = []
@@ -34,6 +37,13 @@ class AveragewithStd(Cache):
     this Meter is going to return the mean and std_lower, std_high for a list of scalar values
     """
 
+    def __init__(self) -> None:
+        super().__init__()
+        self.log = GrowableBuffer(dtype=torch.float64)
+
+    def reset(self):
+        self.log = GrowableBuffer(dtype=torch.float64)
+
     def add(self, input):
         assert (
             isinstance(input, Number)
@@ -43,13 +53,13 @@ class AveragewithStd(Cache):
         if torch.is_tensor(input):
             input = input.cpu().item()
 
-        super().add(input)
+        self.log.append(float(input))
 
     def value(self, **kwargs):
-        return torch.Tensor(self.log).mean().item()
+        return self.log.view().float().mean().item()
 
     def summary(self) -> dict:
-        torch_log = torch.Tensor(self.log)
+        torch_log = self.log.view().float()
         mean = torch_log.mean()
         std = torch_log.std()
         return {
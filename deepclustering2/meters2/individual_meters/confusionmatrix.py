@@ -4,6 +4,7 @@ import numpy as np
 import torch
 
 from ._metric import _Metric, MeterResultDict
+from ._segmentation_stats import SegmentationStats, segmentation_stats
 
 
 class ConfusionMatrix(_Metric):
@@ -19,6 +20,9 @@ class ConfusionMatrix(_Metric):
     Modified from: https://github.com/pytorch/tnt/blob/master/torchnet/meter/confusionmeter.py
     """
 
+    _mutating_methods = ("add", "add_stats", "reset")
+    _reduce_sum = ("conf",)
+
     def __init__(self, num_classes, ignore_index=255, normalized=False):
         super().__init__()
 
@@ -46,44 +50,15 @@ class ConfusionMatrix(_Metric):
         of integer values between 0 and K-1.
 
         """
-        # If target and/or predicted are tensors, convert them to numpy arrays
-        if torch.is_tensor(predicted):
-            predicted = predicted.cpu().numpy()
-        if torch.is_tensor(target):
-            target = target.cpu().numpy()
         assert predicted.shape == target.shape
-        # assert predicted.shape[0] == target.shape[0], \
-        #     'number of targets and predicted outputs do not match'
-        #
-        # if np.ndim(predicted) != 1:
-        #     assert predicted.shape[1] == self.num_classes, \
-        #         'number of predictions does not match size of confusion matrix'
-        #     predicted = np.argmax(predicted, 1)
-        # else:
-        #     assert (predicted.max() < self.num_classes) and (predicted.min() >= 0), \
-        #         'predicted values are not between 0 and k-1'
-        #
-        # if np.ndim(target) != 1:
-        #     assert target.shape[1] == self.num_classes, \
-        #         'Onehot target does not match size of confusion matrix'
-        #     assert (target >= 0).all() and (target <= 1).all(), \
-        #         'in one-hot encoding, target values should be 0 or 1'
-        #     assert (target.sum(1) == 1).all(), \
-        #         'multi-label setting is not supported'
-        #     target = np.argmax(target, 1)
-        # else:
-        #     assert (target.max() < self.num_classes) and (target.min() >= 0), \
-        #         'target values are not between 0 and k-1'
-
-        mask = (target >= 0) & (target < self.num_classes)
-
-        # hack for bincounting 2 arrays together
-        x = predicted[mask] + self.num_classes * target[mask]
-        bincount_2d = np.bincount(x.astype(np.int32), minlength=self.num_classes ** 2)
-        assert bincount_2d.size == self.num_classes ** 2
-        conf = bincount_2d.reshape((self.num_classes, self.num_classes))
-
-        self.conf += conf
+        self.add_stats(segmentation_stats(predicted, target, self.num_classes))
+
+    def add_stats(self, stats: SegmentationStats):
+        """
+        accumulate the counts of precomputed `SegmentationStats`, which can be shared with other meters.
+        """
+        assert stats.num_classes == self.num_classes
+        self.conf += stats.confusion_matrix().cpu().numpy().astype(self.conf.dtype)
 
     def value(self):
         """
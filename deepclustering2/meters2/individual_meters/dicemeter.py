@@ -3,10 +3,11 @@ import torch
 import torch.nn.functional as F
 from torch import Tensor
 
-from deepclustering2.loss.dice_loss import dice_coef, dice_batch
 from deepclustering2.type.typecheckconvert import to_float
-from deepclustering2.utils import probs2one_hot, class2one_hot
+from deepclustering2.utils import probs2one_hot, class2one_hot, sset
+from ._growable_buffer import GrowableBuffer
 from ._metric import _Metric, MeterResultDict
+from ._segmentation_stats import segmentation_stats
 
 __all__ = ["SliceDiceMeter", "BatchDiceMeter"]
 
@@ -27,7 +28,10 @@ def toOneHot(pred_logit, mask):
 
 
 class _DiceMeter(_Metric):
-    def __init__(self, call_function, C=4, report_axises=None) -> None:
+    _reduce_sum = ("_n",)
+    _reduce_cat = ("_diceLog",)
+
+    def __init__(self, per_sample: bool, C=4, report_axises=None) -> None:
         super(_DiceMeter, self).__init__()
         assert report_axises is None or isinstance(report_axises, (list, tuple))
         if report_axises is not None:
@@ -39,17 +43,17 @@ class _DiceMeter(_Metric):
         self._report_axis = list(range(self._C))
         if report_axises is not None:
             self._report_axis = report_axises
-        self._diceCallFunction = call_function
-        self._diceLog = []  # type: ignore
+        self._per_sample = per_sample
+        self._diceLog = GrowableBuffer()
         self._n = 0
 
     def reset(self):
-        self._diceLog = []  # type: ignore
+        self._diceLog.clear()
         self._n = 0
 
     def add(self, pred_logit: Tensor, gt: Tensor):
         """
-        call class2one_hot to convert onehot to input.
+        the dice is computed from the per-class counts of `segmentation_stats`, without onehot tensors.
         :param pred_logit: predicton, can be simplex or logit with shape b, c, h, w
         :param gt: ground truth label with shape b, h, w or b, 1, h, w
         :return:
@@ -58,7 +62,10 @@ class _DiceMeter(_Metric):
         if gt.shape.__len__() == 4:
             gt = gt.squeeze(2)
         assert gt.shape.__len__() == 3
-        dice_value = self._diceCallFunction(*toOneHot(pred_logit, gt))
+        assert sset(gt, list(range(self._C)))
+        dice_value = segmentation_stats(pred_logit, gt, num_classes=self._C).dice(
+            per_sample=self._per_sample
+        )
         if dice_value.shape.__len__() == 1:
             dice_value = dice_value.unsqueeze(0)
         assert dice_value.shape.__len__() == 2
@@ -67,7 +74,7 @@ class _DiceMeter(_Metric):
 
     def value(self):
         if self._n > 0:
-            log = torch.cat(self._diceLog)
+            log = self._diceLog.view()
             means = log.mean(0)
             stds = log.std(0)
             report_means = log[:, self._report_axis].mean(1)
@@ -100,7 +107,7 @@ class SliceDiceMeter(_DiceMeter):
     """
 
     def __init__(self, C=4, report_axises=None) -> None:
-        super().__init__(call_function=dice_coef, report_axises=report_axises, C=C)
+        super().__init__(per_sample=True, report_axises=report_axises, C=C)
 
 
 class BatchDiceMeter(_DiceMeter):
@@ -109,4 +116,4 @@ class BatchDiceMeter(_DiceMeter):
     """
 
     def __init__(self, C=4, report_axises=None) -> None:
-        super().__init__(call_function=dice_batch, report_axises=report_axises, C=C)
+        super().__init__(per_sample=False, report_axises=report_axises, C=C)
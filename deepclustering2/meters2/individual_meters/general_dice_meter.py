@@ -1,19 +1,16 @@
 from collections.abc import Iterable
-from typing import Union, List
+from typing import Union, List, Dict, Optional
 
 import numpy as np
 import torch
 from deepclustering2.meters2.individual_meters._metric import _Metric, MeterResultDict
 from deepclustering2.type import to_float
 from deepclustering2.utils import iter_average as average_list
-from deepclustering2.utils import (
-    simplex,
-    one_hot,
-    class2one_hot,
-    probs2one_hot,
-)
+from deepclustering2.utils import simplex, one_hot, sset
 from torch import Tensor
 
+from ._segmentation_stats import segmentation_stats
+
 
 class UniversalDice(_Metric):
     def __init__(self, C=4, report_axises=None) -> None:
@@ -33,9 +30,13 @@ class UniversalDice(_Metric):
         self.reset()
 
     def reset(self):
-        self._intersections = []
-        self._unions = []
-        self._group_names = []
+        # group name -> row of the running sums
+        self._group2id: Dict[str, int] = {}
+        # running per-group sums of shape (capacity, C), grown by doubling
+        self._intersections: Optional[Tensor] = None
+        self._unions: Optional[Tensor] = None
+        # groups named after `_n`, which are not shared by the meters of different ranks
+        self._auto_group_names = set()
         self._n = 0
 
     def add(
@@ -67,8 +68,8 @@ class UniversalDice(_Metric):
                 else:
                     raise TypeError(f"type of `group_name` wrong {type(group_name)}")
 
-        onehot_pred, onehot_target = self._convert2onehot(pred, target)
-        B, C, *hw = pred.shape
+        pred_label, target_label = self._convert2label(pred, target)
+        B, *_ = pred.shape
 
         # current group name:
         current_group_name = [
@@ -82,30 +83,111 @@ class UniversalDice(_Metric):
         assert isinstance(current_group_name, (list, tuple))
         if isinstance(current_group_name, tuple):
             current_group_name = list(current_group_name)
-        interaction, union = (
-            self._intersaction(onehot_pred, onehot_target),
-            self._union(onehot_pred, onehot_target),
-        )
-        self._intersections.append(interaction)
-        self._unions.append(union)
-        self._group_names.extend(current_group_name)
+        if group_name is None:
+            self._auto_group_names.update(current_group_name)
+        stats = segmentation_stats(pred_label, target_label, num_classes=self._C)
+        interaction = stats.tp
+        union = 2 * stats.tp + stats.fp + stats.fn
+        group_ids = self._get_group_ids(current_group_name, device=interaction.device)
+        self._reserve(len(self._group2id), interaction)
+        self._intersections.index_add_(0, group_ids, interaction)
+        self._unions.index_add_(0, group_ids, union)
         self._n += 1
 
+    def _get_group_ids(self, group_names: List[str], device) -> Tensor:
+        for name in group_names:
+            if name not in self._group2id:
+                self._group2id[name] = len(self._group2id)
+        return torch.tensor(
+            [self._group2id[name] for name in group_names],
+            dtype=torch.long,
+            device=device,
+        )
+
+    def _reserve(self, num_groups: int, like: Tensor):
+        if self._intersections is None:
+            capacity = max(num_groups, 16)
+            self._intersections = like.new_zeros((capacity, like.shape[1]))
+            self._unions = like.new_zeros((capacity, like.shape[1]))
+        elif num_groups > self._intersections.shape[0]:
+            capacity = max(num_groups, 2 * self._intersections.shape[0])
+            intersections = like.new_zeros((capacity, like.shape[1]))
+            unions = like.new_zeros((capacity, like.shape[1]))
+            intersections[: self._intersections.shape[0]] = self._intersections
+            unions[: self._unions.shape[0]] = self._unions
+            self._intersections, self._unions = intersections, unions
+
+    def state(self):
+        num_groups = len(self._group2id)
+        if self._intersections is None:
+            intersections = unions = torch.zeros(0, self._C, dtype=torch.long)
+        else:
+            intersections = self._intersections[:num_groups].clone()
+            unions = self._unions[:num_groups].clone()
+        return {
+            "group_names": list(self._group2id.keys()),
+            "intersections": intersections,
+            "unions": unions,
+            "auto_group_names": set(self._auto_group_names),
+            "n": self._n,
+        }
+
+    def load_state(self, state):
+        device = self._intersections.device if self._intersections is not None else None
+        self._group2id = {name: i for i, name in enumerate(state["group_names"])}
+        self._intersections = self._unions = None
+        if len(self._group2id) > 0:
+            self._intersections = state["intersections"].to(device)
+            self._unions = state["unions"].to(device)
+        self._auto_group_names = set(state["auto_group_names"])
+        self._n = state["n"]
+        self.mark_dirty()
+
+    def _merge_states(self, *states):
+        """
+        the counts of a group shared by several meters (a patient sliced over ranks) are summed,
+        the automatically named groups colliding between meters are renamed.
+        """
+        group2id, intersections, unions, auto_group_names = {}, [], [], set()
+        for k, state in enumerate(states):
+            for name, intersection, union in zip(
+                state["group_names"], state["intersections"], state["unions"]
+            ):
+                if name in state["auto_group_names"]:
+                    while name in group2id:
+                        name = f"{k}_{name}"
+                    auto_group_names.add(name)
+                if name not in group2id:
+                    group2id[name] = len(group2id)
+                    intersections.append(intersection)
+                    unions.append(union.to(intersection.device))
+                else:
+                    i = group2id[name]
+                    intersections[i] = intersections[i] + intersection.to(
+                        intersections[i].device
+                    )
+                    unions[i] = unions[i] + union.to(unions[i].device)
+        if len(group2id) == 0:
+            return states[0]
+        return {
+            "group_names": list(group2id.keys()),
+            "intersections": torch.stack(intersections),
+            "unions": torch.stack(unions),
+            "auto_group_names": auto_group_names,
+            "n": sum(state["n"] for state in states),
+        }
+
     @property
     def log(self):
         if self._n > 0:
-            group_names = self.group_names
-            interaction_array = torch.cat(self._intersections, dim=0)
-            union_array = torch.cat(self._unions, dim=0)
-            group_name_array = np.asarray(self._group_names)
-            resulting_dice = []
-            for unique_name in group_names:
-                index = group_name_array == unique_name
-                group_dice = (2 * interaction_array[index].sum(0) + 1e-6) / (
-                    union_array[index].sum(0) + 1e-6
-                )
-                resulting_dice.append(group_dice)
-            resulting_dice = torch.stack(resulting_dice, dim=0)
+            group_ids = torch.tensor(
+                [self._group2id[name] for name in self.group_names],
+                dtype=torch.long,
+                device=self._intersections.device,
+            )
+            resulting_dice = (2 * self._intersections[group_ids] + 1e-6) / (
+                self._unions[group_ids] + 1e-6
+            )
             return resulting_dice
 
     def value(self, **kwargs):
@@ -137,51 +219,17 @@ class UniversalDice(_Metric):
 
     @property
     def group_names(self):
-        return sorted(set(self._group_names))
+        return sorted(self._group2id.keys())
 
-    @staticmethod
-    def _intersaction(pred: Tensor, target: Tensor):
-        """
-        return the interaction, supposing the two inputs are onehot-coded.
-        :param pred: onehot pred
-        :param target: onehot target
-        :return: tensor of intersaction over classes
-        """
-        assert pred.shape == target.shape
-        assert one_hot(pred) and one_hot(target)
-
-        B, C, *hw = pred.shape
-        intersect = (pred * target).sum(list(range(2, 2 + len(hw))))
-        assert intersect.shape == (B, C)
-        return intersect
-
-    @staticmethod
-    def _union(pred: Tensor, target: Tensor):
-        """
-        return the union, supposing the two inputs are onehot-coded.
-        :param pred: onehot pred
-        :param target: onehot target
-        :return: tensor of intersaction over classes
-        """
-        assert pred.shape == target.shape
-        assert one_hot(pred) and one_hot(target)
-
-        B, C, *hw = pred.shape
-        union = (pred + target).sum(list(range(2, 2 + len(hw))))
-        assert union.shape == (B, C)
-        return union
-
-    def _convert2onehot(self, pred: Tensor, target: Tensor):
+    def _convert2label(self, pred: Tensor, target: Tensor):
         # only two possibility: both onehot or both class-coded.
         assert pred.shape == target.shape
         # if they are onehot-coded:
-        if simplex(pred, 1) and one_hot(target):
-            return probs2one_hot(pred).long(), target.long()
+        if simplex(pred, 1, force=True) and one_hot(target, force=True):
+            return pred.argmax(1), target.argmax(1)
         # here the pred and target are labeled long
-        return (
-            class2one_hot(pred, self._C).long(),
-            class2one_hot(target, self._C).long(),
-        )
+        assert sset(pred, list(range(self._C))) and sset(target, list(range(self._C)))
+        return pred, target
 
     def __repr__(self):
         string = f"C={self._C}, report_axis={self._report_axis}\n"
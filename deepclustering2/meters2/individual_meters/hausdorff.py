@@ -5,24 +5,27 @@ from typing import *
 
 import numpy as np
 import torch
-from medpy.metric.binary import hd
 from torch import Tensor
 
+from ._growable_buffer import GrowableBuffer
 from ._metric import _Metric
+from .surface_distance import hausdorff_distance, batch_surface_metrics
 from deepclustering2.utils import one_hot
 
 
 class HaussdorffDistance(_Metric):
     default_class_num = 4
+    _reduce_cat = ("_haussdorff_log",)
 
-    def __init__(self, C=None, report_axises=None) -> None:
+    def __init__(self, C=None, report_axises=None, num_workers: int = 0) -> None:
         super().__init__()
-        self._haussdorff_log: List[Tensor] = []
+        self._haussdorff_log = GrowableBuffer(dtype=torch.float32)
         self._C = C
         self._report_axises = report_axises
+        self._num_workers = num_workers
 
     def reset(self):
-        self._haussdorff_log = []
+        self._haussdorff_log.clear()
 
     def add(
         self,
@@ -54,20 +57,17 @@ class HaussdorffDistance(_Metric):
                 self._C == C
             ), f"Input dimension C: {C} is not consistent with the registered C:{self._C}"
 
-        res = torch.zeros((B, C), dtype=torch.float32, device=pred.device)
-        n_pred = pred.cpu().numpy()
-        n_target = label.cpu().numpy()
-        for b in range(B):
-            if C == 2:
-                res[b, :] = numpy_haussdorf(
-                    n_pred[b, 0], n_target[b, 0], voxelspacing=voxelspacing
-                )
-                continue
-
-            for c in range(C):
-                res[b, c] = numpy_haussdorf(
-                    n_pred[b, c], n_target[b, c], voxelspacing=voxelspacing
-                )
+        # with two classes, both entries report the distance of the first one.
+        classes = [0] if C == 2 else list(range(C))
+        hd = batch_surface_metrics(
+            pred.argmax(1).cpu(),
+            label.argmax(1).cpu(),
+            classes,
+            voxelspacing=voxelspacing,
+            num_workers=self._num_workers,
+            empty_value=0,
+        )["hausdorff"]
+        res = torch.from_numpy(hd).float().to(pred.device).expand(B, C).contiguous()
 
         self._haussdorff_log.append(res)
 
@@ -109,9 +109,9 @@ class HaussdorffDistance(_Metric):
 
     @property
     def log(self):
-        try:
-            log = torch.cat(self._haussdorff_log)
-        except RuntimeError:
+        if len(self._haussdorff_log) > 0:
+            log = self._haussdorff_log.view()
+        else:
             warnings.warn(f"No log has been found", RuntimeWarning)
             log = torch.Tensor(
                 tuple(
@@ -136,7 +136,7 @@ def numpy_haussdorf(
 
     # h = max(directed_hausdorff(pred, target)[0], directed_hausdorff(target, pred)[0])
     try:
-        h = hd(pred, target, voxelspacing)
+        h = hausdorff_distance(pred, target, voxelspacing)
     except RuntimeError:
         h = 0
     return h
@@ -3,6 +3,7 @@ import torch
 from deepclustering2.type import to_float
 
 from ._metric import _Metric, MeterResultDict
+from ._segmentation_stats import segmentation_stats
 from .confusionmatrix import ConfusionMatrix
 
 
@@ -24,6 +25,8 @@ class IoU(_Metric):
     when computing the IoU. Can be an int, or any iterable of ints.
     """
 
+    _reduce_sum = ("conf_metric.conf",)
+
     def __init__(self, num_classes, normalized=False, ignore_index=255, report_axis=None):
         super().__init__()
         self.num_classes = num_classes
@@ -47,6 +50,10 @@ class IoU(_Metric):
     def reset(self):
         self.conf_metric.reset()
 
+    def load_state(self, state):
+        super().load_state(state)
+        self.conf_metric.mark_dirty()
+
     def add(self, predicted, target):
         """Adds the predicted and target pair to the IoU metric.
 
@@ -70,13 +77,10 @@ class IoU(_Metric):
             target.dim() == 3 or target.dim() == 4
         ), "targets must be of dimension (N, H, W) or (N, K, H, W)"
 
-        # If the tensor is in categorical format convert it to integer format
-        if predicted.dim() == 4:
-            _, predicted = predicted.max(1)
-        # if target.dim() == 4:
-        #     _, target = target.max(1)
-
-        self.conf_metric.add(predicted.view(-1), target.long().view(-1))
+        # (N, K, H, W) scores are converted to integer format by `segmentation_stats`
+        self.conf_metric.add_stats(
+            segmentation_stats(predicted, target, num_classes=self.num_classes)
+        )
 
     def value(self):
         """Computes the IoU and mean IoU.
@@ -1,38 +1,124 @@
-from typing import List
+from typing import List, Optional
 
 import torch
-from sklearn.metrics import cohen_kappa_score
 from torch import Tensor
 
 from ._metric import _Metric
 
 
+def _accumulate_confusion(
+    confusion: Optional[Tensor], label1: Tensor, label2: Tensor
+) -> Tensor:
+    """
+    add the pairs of (label1, label2) to the square `confusion` matrix, grown to the largest label if needed.
+    """
+    label1, label2 = label1.long().reshape(-1), label2.long().reshape(-1)
+    assert label1.shape == label2.shape
+    num_labels = 0 if confusion is None else confusion.shape[0]
+    if label1.numel():
+        assert label1.min() >= 0 and label2.min() >= 0, "labels should be non-negative"
+        num_labels = max(num_labels, int(max(label1.max(), label2.max())) + 1)
+    if confusion is None:
+        confusion = torch.zeros(
+            (num_labels, num_labels), dtype=torch.long, device=label1.device
+        )
+    elif num_labels > confusion.shape[0]:
+        grown = confusion.new_zeros((num_labels, num_labels))
+        grown[: confusion.shape[0], : confusion.shape[1]] = confusion
+        confusion = grown
+    confusion += torch.bincount(
+        label1 * num_labels + label2.to(label1.device), minlength=num_labels ** 2
+    ).view(num_labels, num_labels)
+    return confusion
+
+
+def _kappa(confusion: Optional[Tensor]) -> float:
+    """
+    Cohen's kappa of a confusion matrix, same as sklearn's `cohen_kappa_score` on the pairs it counts.
+    """
+    if confusion is None or confusion.sum() == 0:
+        return float("nan")
+    confusion = confusion.double()
+    n = confusion.sum()
+    observed = confusion.trace() / n
+    expected = (confusion.sum(0) * confusion.sum(1)).sum() / n ** 2
+    if expected == 1:
+        return float("nan")
+    return ((observed - expected) / (1 - expected)).item()
+
+
+def _considered_mask(target: Tensor, considered_classes: Optional[List[int]]):
+    if considered_classes is None:
+        return torch.ones_like(target, dtype=torch.bool)
+    return torch.isin(
+        target, torch.as_tensor(list(considered_classes), device=target.device)
+    )
+
+
 class KappaMetrics(_Metric):
-    """ SKLearnMetrics computes various classification metrics at the end of a batch.
-     Unforunately, doesn't work when used with generators...."""
+    """SKLearnMetrics computes various classification metrics at the end of a batch.
+    Unforunately, doesn't work when used with generators....
+    The label pairs are accumulated in a confusion matrix per prediction, and the kappa of the whole epoch
+    is computed from it."""
 
     def __init__(self) -> None:
         super().__init__()
-        self.kappa = []
+        self._confusions: List[Optional[Tensor]] = []
 
     def add(
         self, predicts: List[Tensor], target: Tensor, considered_classes: List[int]
     ):
         for predict in predicts:
             assert predict.shape == target.shape
-        predicts = [predict.detach().data.cpu().numpy().ravel() for predict in predicts]
-        target = target.detach().data.cpu().numpy().ravel()
-        mask = [t in considered_classes for t in target]
-        predicts = [predict[mask] for predict in predicts]
-        target = target[mask]
-        kappa_score = [cohen_kappa_score(predict, target) for predict in predicts]
-        self.kappa.append(kappa_score)
+        target = target.detach().reshape(-1)
+        mask = _considered_mask(target, considered_classes)
+        if len(self._confusions) < len(predicts):
+            self._confusions += [None] * (len(predicts) - len(self._confusions))
+        for i, predict in enumerate(predicts):
+            predict = predict.detach().reshape(-1).to(target.device)
+            self._confusions[i] = _accumulate_confusion(
+                self._confusions[i], predict[mask], target[mask]
+            )
 
     def reset(self):
-        self.kappa = []
+        self._confusions = []
+
+    def state(self):
+        return {
+            "confusions": [
+                None if confusion is None else confusion.clone()
+                for confusion in self._confusions
+            ]
+        }
+
+    def load_state(self, state):
+        self._confusions = list(state["confusions"])
+        self.mark_dirty()
+
+    def _merge_states(self, *states):
+        num_predictions = max(len(state["confusions"]) for state in states)
+        confusions: List[Optional[Tensor]] = [None] * num_predictions
+        for state in states:
+            for i, confusion in enumerate(state["confusions"]):
+                if confusion is None:
+                    continue
+                if confusions[i] is None:
+                    confusions[i] = confusion.clone()
+                    continue
+                # matrices of different sizes are aligned on the smallest labels
+                size = max(confusions[i].shape[0], confusion.shape[0])
+                merged = confusions[i].new_zeros((size, size))
+                merged[
+                    : confusions[i].shape[0], : confusions[i].shape[0]
+                ] += confusions[i]
+                merged[: confusion.shape[0], : confusion.shape[0]] += confusion.to(
+                    merged.device
+                )
+                confusions[i] = merged
+        return {"confusions": confusions}
 
     def value(self):
-        return torch.Tensor(self.kappa).mean(0)
+        return torch.Tensor([_kappa(confusion) for confusion in self._confusions])
 
     def summary(self):
         return {f"kappa{i}": self.value()[i].item() for i in range(len(self.value()))}
@@ -53,17 +139,22 @@ class Kappa2Annotator(KappaMetrics):
         considered_classes=[1, 2, 3],
     ):
         assert predict1.shape == predict2.shape
-        gt = gt.data.cpu().numpy().ravel()
-        predict1 = predict1.detach().data.cpu().numpy().ravel()
-        predict2 = predict2.detach().data.cpu().numpy().ravel()
+        gt = gt.detach().reshape(-1)
+        predict1 = predict1.detach().reshape(-1).to(gt.device)
+        predict2 = predict2.detach().reshape(-1).to(gt.device)
 
-        if considered_classes is not None:
-            mask = [t in considered_classes for t in gt]
-            predict1 = predict1[mask]
-            predict2 = predict2[mask]
-
-        kappa = cohen_kappa_score(y1=predict1, y2=predict2)
-        self.kappa.append(kappa)
+        mask = _considered_mask(gt, considered_classes)
+        if not self._confusions:
+            self._confusions = [None]
+        self._confusions[0] = _accumulate_confusion(
+            self._confusions[0], predict1[mask], predict2[mask]
+        )
 
     def value(self, **kwargs):
-        return torch.Tensor(self.kappa).mean()
+        return torch.tensor(_kappa(self._confusions[0] if self._confusions else None))
+
+    def summary(self):
+        return {"kappa": self.value().item()}
+
+    def detailed_summary(self):
+        return {"kappa": self.value().item()}
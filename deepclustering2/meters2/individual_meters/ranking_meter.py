@@ -0,0 +1,402 @@
+"""
+Average precision and ROC AUC with bounded memory.
+
+Instead of storing every score like `torchnet`'s `APMeter` and `AUCMeter`, the scores are binned in a fixed
+histogram of `num_bins` uniform bins over `score_range`, per class and per label. The ordering of the scores
+falling in the same bin is unknown, so the meters report the value in the middle of the best and the worst
+orderings within the bins, and `error_bound` gives half of their difference, which bounds the error:
+- AP: positives ranked before (best) or after (worst) the negatives of their bin,
+- AUC: half of the fraction of positive-negative pairs falling in the same bin.
+The bound vanishes when positives and negatives do not share bins, and decreases with `num_bins`.
+Histograms of different batches, meters or ranks are merged by summation.
+
+With `exact=True`, the scores are also written in sorted runs to disk, and the exact values are computed by
+merging the runs (external sort), holding only `run_size` scores in memory. Equal scores are ranked together,
+as in sklearn: the precision and recall are evaluated at the distinct scores only, and tied positive-negative
+pairs count as half concordant in the AUC.
+"""
+
+__all__ = ["StreamingAPMeter", "StreamingAUCMeter"]
+
+import os
+from tempfile import TemporaryDirectory
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from ._metric import _Metric, MeterResultDict
+
+
+def _to_tensor(value) -> Tensor:
+    if not torch.is_tensor(value):
+        value = torch.from_numpy(np.asarray(value))
+    return value.detach()
+
+
+def _harmonic(x: Tensor) -> Tensor:
+    # H(x) = sum_{i=1}^{x} 1/i, extended to real x
+    return torch.digamma(x + 1) + np.euler_gamma
+
+
+def _sum_of_ratios(a: Tensor, b: Tensor, p: Tensor) -> Tensor:
+    """
+    sum_{j=1}^{p} (a + j) / (b + j), for b >= a >= 0
+    """
+    return p - (b - a) * (_harmonic(b + p) - _harmonic(b))
+
+
+class _SortedRuns:
+    """
+    scores and binary targets of one class, written to disk in runs sorted by descending score.
+    """
+
+    def __init__(self, directory: str, name: str, run_size: int) -> None:
+        self._directory = directory
+        self._name = name
+        self._run_size = run_size
+        self._scores: List[np.ndarray] = []
+        self._targets: List[np.ndarray] = []
+        self._buffered = 0
+        self._runs: List[Tuple[str, str]] = []
+
+    def append(self, scores: np.ndarray, targets: np.ndarray):
+        self._scores.append(scores.astype(np.float64))
+        self._targets.append(targets.astype(np.uint8))
+        self._buffered += len(scores)
+        if self._buffered >= self._run_size:
+            self._write_run()
+
+    def _write_run(self):
+        if self._buffered == 0:
+            return
+        scores, targets = np.concatenate(self._scores), np.concatenate(self._targets)
+        order = np.argsort(-scores, kind="stable")
+        prefix = os.path.join(self._directory, f"{self._name}_{len(self._runs):05d}")
+        np.save(prefix + "_scores.npy", scores[order])
+        np.save(prefix + "_targets.npy", targets[order])
+        self._runs.append((prefix + "_scores.npy", prefix + "_targets.npy"))
+        self._scores, self._targets, self._buffered = [], [], 0
+
+    def sorted_blocks(self):
+        """
+        yield (scores, targets) blocks in globally descending score order, merging the runs block by block.
+        """
+        self._write_run()
+        runs = [
+            (np.load(s, mmap_mode="r"), np.load(t, mmap_mode="r"))
+            for s, t in self._runs
+        ]
+        positions = [0] * len(runs)
+        block = max(self._run_size // max(len(runs), 1), 1)
+        while True:
+            active = [r for r in range(len(runs)) if positions[r] < len(runs[r][0])]
+            if not active:
+                return
+            threshold = -np.inf
+            for r in active:
+                end = positions[r] + block
+                if end < len(runs[r][0]):
+                    # scores after this block are not larger than its last one
+                    threshold = max(threshold, runs[r][0][end - 1])
+            emitted_scores, emitted_targets = [], []
+            for r in active:
+                scores, targets = runs[r]
+                block_scores = scores[positions[r] : positions[r] + block]
+                n = int(np.count_nonzero(block_scores >= threshold))
+                emitted_scores.append(block_scores[:n])
+                emitted_targets.append(targets[positions[r] : positions[r] + n])
+                positions[r] += n
+            scores = np.concatenate(emitted_scores)
+            targets = np.concatenate(emitted_targets)
+            order = np.argsort(-scores, kind="stable")
+            yield scores[order], targets[order]
+
+
+def _tied_counts(blocks):
+    """
+    yield the (positives, negatives) counts of the distinct scores of the (scores, targets) blocks given in
+    descending score order, equal scores being counted as one group even when they span several blocks.
+    """
+    # score and counts of the last group of the previous block, which may continue in the next one
+    carry = None
+    for scores, targets in blocks:
+        if len(scores) == 0:
+            continue
+        starts = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+        positives = np.add.reduceat(targets.astype(np.float64), starts)
+        negatives = np.diff(np.r_[starts, len(scores)]) - positives
+        if carry is not None:
+            carry_score, carry_positives, carry_negatives = carry
+            if carry_score == scores[0]:
+                positives[0] += carry_positives
+                negatives[0] += carry_negatives
+            else:
+                positives = np.r_[carry_positives, positives]
+                negatives = np.r_[carry_negatives, negatives]
+        carry = (scores[-1], positives[-1], negatives[-1])
+        yield positives[:-1], negatives[:-1]
+    if carry is not None:
+        yield np.array([carry[1]]), np.array([carry[2]])
+
+
+class _StreamingRankingMeter(_Metric):
+    _reduce_sum = ("histogram",)
+
+    def __init__(
+        self,
+        num_classes: int,
+        num_bins: int,
+        score_range: Tuple[float, float],
+        exact: bool,
+        run_size: int,
+        spill_dir: Optional[str],
+    ) -> None:
+        super().__init__()
+        assert num_bins >= 1, num_bins
+        assert score_range[1] > score_range[0], score_range
+        self._num_classes = num_classes
+        self._num_bins = num_bins
+        self._score_range = score_range
+        self._exact = exact
+        self._run_size = run_size
+        self._spill_dir = spill_dir
+        self._tmp_dir: Optional[TemporaryDirectory] = None
+        self.reset()
+
+    def reset(self):
+        # weighted counts of the (negative, positive) scores in each bin, of shape (2, K, bins)
+        self.histogram = torch.zeros(
+            2, self._num_classes, self._num_bins, dtype=torch.float64
+        )
+        if self._tmp_dir is not None:
+            self._tmp_dir.cleanup()
+        self._tmp_dir, self._runs = None, None
+        if self._exact:
+            self._tmp_dir = TemporaryDirectory(prefix="ranking_", dir=self._spill_dir)
+            self._runs = [
+                _SortedRuns(self._tmp_dir.name, f"class{k}", self._run_size)
+                for k in range(self._num_classes)
+            ]
+
+    def _add(self, output: Tensor, target: Tensor, weight: Optional[Tensor]):
+        """
+        :param output: scores of shape (N, K)
+        :param target: binary targets of shape (N, K)
+        :param weight: non-negative weights of shape (N,)
+        """
+        assert output.shape == target.shape and output.dim() == 2, (
+            output.shape,
+            target.shape,
+        )
+        assert output.shape[1] == self._num_classes, output.shape
+        assert torch.equal(target**2, target), "targets should be binary (0 or 1)"
+        output = output.to(self.histogram.device, torch.float64)
+        target = target.to(self.histogram.device, torch.long)
+        low, high = self._score_range
+        bins = ((output - low) / (high - low) * self._num_bins).long()
+        bins = bins.clamp_(0, self._num_bins - 1)
+        class_index = torch.arange(self._num_classes, device=bins.device)
+        index = (target * self._num_classes + class_index) * self._num_bins + bins
+        if weight is None:
+            weight = torch.ones_like(output)
+        else:
+            assert self._exact is False, "weights are not supported in the exact mode"
+            weight = weight.to(self.histogram.device, torch.float64).reshape(-1, 1)
+            assert weight.shape[0] == output.shape[0] and bool((weight >= 0).all())
+            weight = weight.expand_as(output)
+        self.histogram.view(-1).index_add_(0, index.reshape(-1), weight.reshape(-1))
+        if self._exact:
+            output, target = output.cpu().numpy(), target.cpu().numpy()
+            for k, runs in enumerate(self._runs):
+                runs.append(output[:, k], target[:, k])
+
+    def merge(self, other):
+        """
+        add the histogram of another meter of the same configuration, or of its `state`.
+        """
+        assert not self._exact, "exact meters can not be merged"
+        if isinstance(other, _StreamingRankingMeter):
+            assert other._score_range == self._score_range
+            other = other.state()
+        assert other["histogram"].shape == self.histogram.shape
+        super().merge(other)
+
+    def all_reduce(self, group=None):
+        """
+        sum the histograms across the ranks of `group`, if the process group is initialized.
+        """
+        assert not self._exact, "exact meters can not be merged"
+        super().all_reduce(group)
+
+
+class StreamingAPMeter(_StreamingRankingMeter):
+    """
+    Average precision per class, on scores of shape (N, K) and binary targets of shape (N, K),
+    with the memory of a (2, K, num_bins) histogram.
+    """
+
+    def __init__(
+        self,
+        num_classes: int = 1,
+        num_bins: int = 1000,
+        score_range: Tuple[float, float] = (0.0, 1.0),
+        exact: bool = False,
+        run_size: int = 1_000_000,
+        spill_dir: str = None,
+    ) -> None:
+        """
+        :param num_bins: number of bins of the histograms
+        :param score_range: range of the scores, scores out of it falling in the first or the last bin
+        :param exact: also spill the scores to disk to compute the exact AP
+        :param run_size: number of scores per class sorted in memory in the exact mode
+        :param spill_dir: directory of the spilled scores, the system temporary directory by default
+        """
+        super().__init__(num_classes, num_bins, score_range, exact, run_size, spill_dir)
+
+    def add(self, output, target, weight=None):
+        output, target = _to_tensor(output), _to_tensor(target)
+        if output.dim() == 1:
+            output = output.view(-1, 1)
+        if target.dim() == 1:
+            target = target.view(-1, 1)
+        self._add(output, target, None if weight is None else _to_tensor(weight))
+
+    def _bounds(self) -> Tuple[Tensor, Tensor]:
+        # bins in descending order of scores
+        negatives, positives = self.histogram.flip(-1)
+        tp_before = positives.cumsum(-1) - positives
+        fp_before = negatives.cumsum(-1) - negatives
+        worst = _sum_of_ratios(tp_before, tp_before + fp_before + negatives, positives)
+        best = _sum_of_ratios(tp_before, tp_before + fp_before, positives)
+        num_positives = positives.sum(-1).clamp(min=1)
+        return worst.sum(-1) / num_positives, best.sum(-1) / num_positives
+
+    def _exact_value(self) -> Tensor:
+        ap = torch.zeros(self._num_classes, dtype=torch.float64)
+        for k, runs in enumerate(self._runs):
+            tp, rank, precision_sum = 0, 0, 0.0
+            for positives, negatives in _tied_counts(runs.sorted_blocks()):
+                if len(positives) == 0:
+                    continue
+                # precision at the threshold of each distinct score, weighted by its recall increment
+                tp_cum = tp + np.cumsum(positives)
+                rank_cum = rank + np.cumsum(positives + negatives)
+                precision_sum += (positives * tp_cum / rank_cum).sum()
+                tp, rank = tp_cum[-1], rank_cum[-1]
+            ap[k] = precision_sum / max(tp, 1)
+        return ap
+
+    def value(self) -> Tensor:
+        """
+        average precision of each class, of shape (K,)
+        """
+        if self._exact:
+            return self._exact_value()
+        worst, best = self._bounds()
+        return (worst + best) / 2
+
+    def error_bound(self) -> Tensor:
+        """
+        maximum difference between `value` and the exact average precision of each class, of shape (K,)
+        """
+        if self._exact:
+            return torch.zeros(self._num_classes, dtype=torch.float64)
+        worst, best = self._bounds()
+        return (best - worst) / 2
+
+    def summary(self) -> MeterResultDict:
+        ap = self.value()
+        return MeterResultDict(
+            {"mAP": ap.mean().item(), **{f"AP{k}": v.item() for k, v in enumerate(ap)}}
+        )
+
+    def detailed_summary(self) -> MeterResultDict:
+        error = self.error_bound()
+        return MeterResultDict(
+            {
+                **self.summary(),
+                **{f"AP_err{k}": v.item() for k, v in enumerate(error)},
+            }
+        )
+
+
+class StreamingAUCMeter(_StreamingRankingMeter):
+    """
+    Area under the ROC curve for binary classification, on scores and targets of shape (N,),
+    with the memory of a (2, num_bins) histogram.
+    """
+
+    def __init__(
+        self,
+        num_bins: int = 1000,
+        score_range: Tuple[float, float] = (0.0, 1.0),
+        exact: bool = False,
+        run_size: int = 1_000_000,
+        spill_dir: str = None,
+    ) -> None:
+        """
+        :param num_bins: number of bins of the histograms
+        :param score_range: range of the scores, scores out of it falling in the first or the last bin
+        :param exact: also spill the scores to disk to compute the exact AUC
+        :param run_size: number of scores sorted in memory in the exact mode
+        :param spill_dir: directory of the spilled scores, the system temporary directory by default
+        """
+        super().__init__(1, num_bins, score_range, exact, run_size, spill_dir)
+
+    def add(self, output, target, weight=None):
+        output, target = _to_tensor(output).reshape(-1, 1), _to_tensor(target)
+        self._add(
+            output,
+            target.reshape(-1, 1),
+            None if weight is None else _to_tensor(weight),
+        )
+
+    def _exact_area(self) -> float:
+        (runs,) = self._runs
+        negatives, positives = self.histogram[:, 0].sum(-1).tolist()
+        fp, pairs = 0, 0.0
+        for group_positives, group_negatives in _tied_counts(runs.sorted_blocks()):
+            if len(group_positives) == 0:
+                continue
+            fp_cum = fp + np.cumsum(group_negatives)
+            # negatives ranked after each positive, and half of the ones of equal score
+            pairs += (
+                group_positives * (negatives - fp_cum + group_negatives / 2)
+            ).sum()
+            fp = fp_cum[-1]
+        return pairs / max(negatives * positives, 1)
+
+    def value(self):
+        """
+        :return: (area, tpr, fpr), the roc curve being evaluated at the bin edges
+        """
+        negatives, positives = self.histogram[:, 0].flip(-1)
+        num_negatives = negatives.sum().clamp(min=1)
+        num_positives = positives.sum().clamp(min=1)
+        zero = negatives.new_zeros(1)
+        tpr = torch.cat([zero, positives.cumsum(0)]) / num_positives
+        fpr = torch.cat([zero, negatives.cumsum(0)]) / num_negatives
+        if self._exact:
+            area = self._exact_area()
+        else:
+            # trapezoids count the pairs within a bin as half concordant
+            area = (((tpr[1:] + tpr[:-1]) / 2) * (fpr[1:] - fpr[:-1])).sum().item()
+        return area, tpr.numpy(), fpr.numpy()
+
+    def error_bound(self) -> float:
+        """
+        maximum difference between the area given by `value` and the exact area under curve.
+        """
+        if self._exact:
+            return 0.0
+        negatives, positives = self.histogram[:, 0]
+        pairs = (negatives.sum() * positives.sum()).clamp(min=1)
+        return ((negatives * positives).sum() / pairs / 2).item()
+
+    def summary(self) -> MeterResultDict:
+        return MeterResultDict({"auc": self.value()[0]})
+
+    def detailed_summary(self) -> MeterResultDict:
+        return MeterResultDict({"auc": self.value()[0], "auc_err": self.error_bound()})
@@ -1,24 +1,70 @@
-from typing import List, Union
+from typing import List, Union, Dict
 
 import numpy as np
+import torch
 from deepclustering2.meters2.individual_meters._metric import _Metric, MeterResultDict
 from deepclustering2.utils import (
     simplex,
     one_hot,
-    class2one_hot,
-    probs2one_hot,
+    sset,
     to_float,
 )
 from torch import Tensor
 
+from ._growable_buffer import GrowableBuffer
+from ._memo import LastCallMemo
 from .surface_distance import (
     mod_hausdorff_distance,
     hausdorff_distance,
     average_surface_distance,
+    batch_surface_metrics,
+    close_pools,
 )
 
+_last_call = LastCallMemo()
+
+
+def _shared_surface_metrics(
+    pred: Tensor,
+    target: Tensor,
+    C: int,
+    classes: List[int],
+    voxelspacing,
+    num_workers: int,
+) -> Dict[str, np.ndarray]:
+    """
+    `batch_surface_metrics` memoized on the last call, so that the HD, MHD and ASD meters
+    registered on the same prediction compute the distance transforms only once.
+    """
+    spacing = (
+        None if voxelspacing is None else tuple(np.atleast_1d(voxelspacing).tolist())
+    )
+    key = (pred, target, C, tuple(classes), spacing)
+    metrics = _last_call.get(*key)
+    if metrics is not None:
+        return metrics
+    pred_label, target_label = _convert2label(pred, target, C)
+    metrics = batch_surface_metrics(
+        pred_label, target_label, classes, voxelspacing, num_workers=num_workers
+    )
+    _last_call.set(metrics, *key)
+    return metrics
+
+
+def _convert2label(pred: Tensor, target: Tensor, C: int):
+    # only two possibility: both onehot or both class-coded.
+    assert pred.shape == target.shape
+    # if they are onehot-coded:
+    if simplex(pred, 1, force=True) and one_hot(target, force=True):
+        return pred.argmax(1), target.argmax(1)
+    # here the pred and target are labeled long
+    assert sset(pred, range(C)) and sset(target, range(C))
+    return pred, target
+
 
 class SurfaceMeter(_Metric):
+    _reduce_sum = ("_n",)
+    _reduce_cat = ("_mhd",)
     meter_choices = {
         "mod_hausdorff": mod_hausdorff_distance,
         "hausdorff": hausdorff_distance,
@@ -26,7 +72,16 @@ class SurfaceMeter(_Metric):
     }
     abbr = {"mod_hausdorff": "MHD", "hausdorff": "HD", "average_surface": "ASD"}
 
-    def __init__(self, C=4, report_axises=None, metername: str = "hausdorff") -> None:
+    def __init__(
+        self,
+        C=4,
+        report_axises=None,
+        metername: str = "hausdorff",
+        num_workers: int = 0,
+    ) -> None:
+        """
+        :param num_workers: number of processes evaluating the (sample, class) pairs, 0 to evaluate in the main process
+        """
         super(SurfaceMeter, self).__init__()
         assert report_axises is None or isinstance(
             report_axises, (list, tuple)
@@ -44,11 +99,15 @@ class SurfaceMeter(_Metric):
         self._surface_name = metername
         self._abbr = self.abbr[metername]
         self._surface_function = self.meter_choices[metername]
+        self._num_workers = num_workers
         self.reset()
 
     def reset(self):
-        self._mhd = []
+        self._mhd = GrowableBuffer(dtype=torch.float64)
         self._n = 0
+        if self._num_workers > 0:
+            # the worker pool lives for an epoch
+            close_pools()
 
     def add(
         self,
@@ -69,9 +128,8 @@ class SurfaceMeter(_Metric):
         )
         assert not pred.requires_grad and not target.requires_grad
 
-        onehot_pred, onehot_target = self._convert2onehot(pred, target)
         B, C, *hw = pred.shape
-        mhd = self._evalue(onehot_pred, onehot_target, voxelspacing)
+        mhd = self._evalue(pred, target, voxelspacing)
         assert mhd.shape == (B, len(self._report_axis))
         self._mhd.append(mhd)
         self._n += 1
@@ -79,7 +137,7 @@ class SurfaceMeter(_Metric):
     def value(self, **kwargs):
         if self._n == 0:
             return ([np.nan] * self._C, [np.nan] * self._C)
-        mhd = np.concatenate(self._mhd, axis=0)
+        mhd = self._mhd.view().numpy()
         return (mhd.mean(0), mhd.std(0))
 
     def summary(self) -> dict:
@@ -109,35 +167,16 @@ class SurfaceMeter(_Metric):
     def _evalue(self, pred: Tensor, target: Tensor, voxelspacing):
         """
         return the B\times C list
-        :param pred: onehot pred
-        :param target: onehot target
+        :param pred: class- or onehot-coded pred
+        :param target: class- or onehot-coded target
         :return: tensor of size B x C of type np.array
         """
-        assert pred.shape == target.shape
-        assert one_hot(pred, axis=1) and one_hot(target, axis=1)
-        B, C, *hw = pred.shape
-        result = np.zeros([B, len(self._report_axis)])
-        for b, (one_batch_img, one_batch_gt) in enumerate(zip(pred, target)):
-            for c, (one_slice_img, one_slice_gt) in enumerate(
-                zip(one_batch_img[self._report_axis], one_batch_gt[self._report_axis])
-            ):
-                mhd = self._surface_function(
-                    one_slice_img, one_slice_gt, voxelspacing=voxelspacing
-                )
-                result[b, c] = mhd
-        return result
-
-    def _convert2onehot(self, pred: Tensor, target: Tensor):
-        # only two possibility: both onehot or both class-coded.
-        assert pred.shape == target.shape
-        # if they are onehot-coded:
-        if simplex(pred, 1) and one_hot(target):
-            return probs2one_hot(pred).long(), target.long()
-        # here the pred and target are labeled long
-        return (
-            class2one_hot(pred, self._C).long(),
-            class2one_hot(target, self._C).long(),
+        if isinstance(voxelspacing, list):
+            voxelspacing = tuple(voxelspacing)
+        metrics = _shared_surface_metrics(
+            pred, target, self._C, self._report_axis, voxelspacing, self._num_workers
         )
+        return metrics[self._surface_name]
 
     def get_plot_names(self) -> List[str]:
         return [f"{self._abbr}{i}" for num, i in enumerate(self._report_axis)]
@@ -0,0 +1,73 @@
+import numpy as np
+
+from ._metric import _Metric, MeterResultDict
+
+__all__ = ["ThroughputMeter"]
+
+
+class ThroughputMeter(_Metric):
+    """
+    samples per second and fraction of the time spent waiting for the data, over the steps of an epoch,
+    as fed by `tqdm.track`.
+    The ranks running in parallel, merged meters count the samples of all of them over the time of the slowest
+    one, whose steps give the data wait and the step time.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.num_samples = 0
+        self.data_time = 0.0
+        self.compute_time = 0.0
+
+    def add(self, num_samples: int, data_time: float, compute_time: float):
+        """
+        :param num_samples: number of samples of the step
+        :param data_time: seconds waiting for the batch
+        :param compute_time: seconds processing the batch
+        """
+        self.n += 1
+        self.num_samples += num_samples
+        self.data_time += data_time
+        self.compute_time += compute_time
+
+    def state(self):
+        return {
+            "n": self.n,
+            "num_samples": self.num_samples,
+            "data_time": self.data_time,
+            "compute_time": self.compute_time,
+        }
+
+    def _merge_states(self, *states):
+        slowest = max(states, key=lambda s: s["data_time"] + s["compute_time"])
+        return {**slowest, "num_samples": sum(s["num_samples"] for s in states)}
+
+    def value(self):
+        total_time = self.data_time + self.compute_time
+        if self.n == 0 or total_time == 0:
+            return np.nan, np.nan, np.nan
+        return (
+            self.num_samples / total_time,
+            self.data_time / total_time,
+            total_time / self.n,
+        )
+
+    def summary(self) -> MeterResultDict:
+        samples_per_second, data_wait, step_time = self.value()
+        return MeterResultDict(
+            {"samples/s": samples_per_second, "data_wait": data_wait}
+        )
+
+    def detailed_summary(self) -> MeterResultDict:
+        samples_per_second, data_wait, step_time = self.value()
+        return MeterResultDict(
+            {
+                "samples/s": samples_per_second,
+                "data_wait": data_wait,
+                "step_time": step_time,
+            }
+        )
@@ -0,0 +1,370 @@
+__all__ = ["VolumeSurfaceMeter"]
+
+import os
+from collections.abc import Iterable
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch.distributed as dist
+from deepclustering2.meters2.individual_meters._metric import _Metric, MeterResultDict
+from deepclustering2.type import to_float
+from torch import Tensor
+
+from .surface_distance import batch_surface_metrics, close_pools
+from .surface_meter import SurfaceMeter, _convert2label
+
+
+class _PatientBuffer:
+    """
+    label slices of one patient with their positions, kept in memory until spilled to disk.
+    """
+
+    def __init__(self, voxelspacing=None) -> None:
+        self.voxelspacing = voxelspacing
+        self.num_slices = 0
+        self.positions: List[int] = []
+        self.pred_slices: List[np.ndarray] = []
+        self.target_slices: List[np.ndarray] = []
+        self.spilled_files: List[str] = []
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            p.nbytes + t.nbytes for p, t in zip(self.pred_slices, self.target_slices)
+        )
+
+    def append(self, pred: np.ndarray, target: np.ndarray, position: int):
+        self.positions.append(position)
+        self.pred_slices.append(pred)
+        self.target_slices.append(target)
+        self.num_slices += 1
+
+    def spill(self, path: str):
+        if len(self.pred_slices) == 0:
+            return
+        np.savez(
+            path,
+            position=np.asarray(self.positions, dtype=np.int64),
+            pred=np.stack(self.pred_slices),
+            target=np.stack(self.target_slices),
+        )
+        self.spilled_files.append(path)
+        self.positions, self.pred_slices, self.target_slices = [], [], []
+
+    def slices(self, consume: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        positions, predictions and targets of the slices, in the order they were added.
+        :param consume: remove the spilled slices, once the patient is complete
+        """
+        positions, preds, targets = [], [], []
+        for path in self.spilled_files:
+            with np.load(path) as chunk:
+                positions.append(chunk["position"])
+                preds.append(chunk["pred"])
+                targets.append(chunk["target"])
+            if consume:
+                os.remove(path)
+        if len(self.pred_slices):
+            positions.append(np.asarray(self.positions, dtype=np.int64))
+            preds.append(np.stack(self.pred_slices))
+            targets.append(np.stack(self.target_slices))
+        return np.concatenate(positions), np.concatenate(preds), np.concatenate(targets)
+
+    def volumes(self, consume: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        volumes of the slices stacked by position.
+        """
+        positions, preds, targets = self.slices(consume=consume)
+        order = np.argsort(positions, kind="stable")
+        return preds[order], targets[order]
+
+    @classmethod
+    def from_slices(
+        cls, voxelspacing, positions: np.ndarray, preds: np.ndarray, targets: np.ndarray
+    ) -> "_PatientBuffer":
+        buffer = cls(voxelspacing)
+        buffer.positions = positions.tolist()
+        buffer.pred_slices, buffer.target_slices = list(preds), list(targets)
+        buffer.num_slices = len(positions)
+        return buffer
+
+
+class VolumeSurfaceMeter(_Metric):
+    """
+    3D surface distance per patient, assembled from streamed 2D slices.
+    Slices are stacked along the first axis by their position in the evaluation loader, i.e. in the order they
+    are added, and the surface metric of a patient is computed once its volume is complete, i.e. when it reaches
+    its number of slices given in `num_slices` or when `complete` is called.
+    With sharded evaluation (`shard_dataloader`, not shuffled), the n-th slice added on rank r of W is at position
+    n * W + r. The state holds the slices of the pending patients, so that the patients split over the ranks are
+    assembled when the meters are reduced.
+    The summaries include the pending patients, evaluated on their slices so far, which can still be added to.
+    Classes that are absent in the prediction or the target of a patient give `nan` and are ignored in the mean.
+    """
+
+    meter_choices = SurfaceMeter.meter_choices
+    abbr = SurfaceMeter.abbr
+
+    def __init__(
+        self,
+        C=4,
+        report_axises=None,
+        metername: str = "mod_hausdorff",
+        num_slices: Dict[str, int] = None,
+        max_buffer_size: int = None,
+        spill_dir: str = None,
+        num_workers: int = 0,
+    ) -> None:
+        """
+        :param num_slices: number of slices of each patient, so that their volume is evaluated as soon as complete
+        :param max_buffer_size: maximum size in bytes of the slices kept in memory, beyond which the buffered slices
+                are spilled to disk. None to keep everything in memory.
+        :param spill_dir: directory of the spilled slices, the system temporary directory by default
+        :param num_workers: number of processes evaluating the classes of a volume, 0 to evaluate in the main process
+        """
+        super(VolumeSurfaceMeter, self).__init__()
+        assert report_axises is None or isinstance(
+            report_axises, (list, tuple)
+        ), f"`report_axises` should be either None or an iterator, given {type(report_axises)}"
+        if report_axises is not None:
+            assert max(report_axises) <= C, (
+                "Incompatible parameter of `C`={} and "
+                "`report_axises`={}".format(C, report_axises)
+            )
+        self._C = C
+        self._report_axis = list(range(self._C))
+        if report_axises is not None:
+            self._report_axis = report_axises
+        assert metername in self.meter_choices.keys()
+        self._surface_name = metername
+        self._abbr = self.abbr[metername]
+        self._num_slices = num_slices or {}
+        assert max_buffer_size is None or max_buffer_size >= 0, max_buffer_size
+        self._max_buffer_size = max_buffer_size
+        self._spill_dir = spill_dir
+        self._num_workers = num_workers
+        self._label_dtype = np.uint8 if C <= 256 else np.int64
+        self._tmp_dir: Optional[TemporaryDirectory] = None
+        self.reset()
+
+    def reset(self):
+        self._buffers: Dict[str, _PatientBuffer] = {}
+        # group name -> metric of the report axises
+        self._results: Dict[str, np.ndarray] = {}
+        # pending patient -> (number of slices, metric) of its last evaluation in the summaries
+        self._pending_results: Dict[str, Tuple[int, np.ndarray]] = {}
+        self._buffer_size = 0
+        self._n_spills = 0
+        # number of slices added, giving their positions
+        self._n_added = 0
+        if self._tmp_dir is not None:
+            self._tmp_dir.cleanup()
+            self._tmp_dir = None
+        if self._num_workers > 0:
+            # the worker pool lives for an epoch
+            close_pools()
+
+    def add(
+        self,
+        pred: Tensor,
+        target: Tensor,
+        group_name: Union[str, List[str]],
+        voxelspacing: Union[List[float], Tuple[float, ...], float] = None,
+    ):
+        """
+        add slices of one or several patients
+        :param pred: class- or onehot-coded tensor of the same shape as the target
+        :param target: class- or onehot-coded tensor of the same shape as the pred
+        :param group_name: patient name of each slice, or a string of a name for the whole batch
+        :param voxelspacing: 3D voxel spacing (slice, height, width) of the patients, taken from their first slice
+        :return:
+        """
+        assert pred.shape == target.shape, (
+            f"incompatible shape of `pred` and `target`, given "
+            f"{pred.shape} and {target.shape}."
+        )
+        assert not pred.requires_grad and not target.requires_grad
+        B, *_ = pred.shape
+        if isinstance(group_name, str):
+            group_name = [group_name] * B
+        elif isinstance(group_name, Iterable):
+            group_name = list(group_name)
+            assert len(group_name) == B and isinstance(group_name[0], str)
+        else:
+            raise TypeError(f"type of `group_name` wrong {type(group_name)}")
+        if isinstance(voxelspacing, list):
+            voxelspacing = tuple(voxelspacing)
+
+        rank, world_size = 0, 1
+        if dist.is_available() and dist.is_initialized():
+            rank, world_size = dist.get_rank(), dist.get_world_size()
+        pred_label, target_label = _convert2label(pred, target, self._C)
+        pred_label = pred_label.cpu().numpy().astype(self._label_dtype)
+        target_label = target_label.cpu().numpy().astype(self._label_dtype)
+
+        for name, one_pred, one_target in zip(group_name, pred_label, target_label):
+            assert name not in self._results, f"patient {name} has been completed."
+            if name not in self._buffers:
+                self._buffers[name] = _PatientBuffer(voxelspacing)
+            buffer = self._buffers[name]
+            buffer.append(one_pred, one_target, self._n_added * world_size + rank)
+            self._n_added += 1
+            self._buffer_size += one_pred.nbytes + one_target.nbytes
+            if buffer.num_slices == self._num_slices.get(name):
+                self.complete(name)
+        if (
+            self._max_buffer_size is not None
+            and self._buffer_size > self._max_buffer_size
+        ):
+            self._spill()
+
+    def complete(self, group_name: str):
+        """
+        evaluate the volume of the patient `group_name`, after which no slice can be added to it.
+        """
+        buffer = self._buffers.pop(group_name)
+        self._pending_results.pop(group_name, None)
+        self._buffer_size -= buffer.nbytes
+        self._results[group_name] = self._evaluate(buffer)
+
+    def _evaluate(self, buffer: _PatientBuffer, consume: bool = True) -> np.ndarray:
+        pred_volume, target_volume = buffer.volumes(consume=consume)
+        metrics = batch_surface_metrics(
+            pred_volume[None],
+            target_volume[None],
+            self._report_axis,
+            voxelspacing=buffer.voxelspacing,
+            num_workers=self._num_workers,
+            empty_value=np.nan,
+        )
+        return metrics[self._surface_name][0]
+
+    def _pending_result(self, group_name: str) -> np.ndarray:
+        """
+        metric of the slices of a pending patient so far, which stays pending.
+        """
+        buffer = self._buffers[group_name]
+        num_slices, result = self._pending_results.get(group_name, (None, None))
+        if num_slices != buffer.num_slices:
+            result = self._evaluate(buffer, consume=False)
+            self._pending_results[group_name] = (buffer.num_slices, result)
+        return result
+
+    def _spill(self):
+        if self._tmp_dir is None:
+            self._tmp_dir = TemporaryDirectory(
+                prefix="volume_surface_", dir=self._spill_dir
+            )
+        for buffer in self._buffers.values():
+            buffer.spill(os.path.join(self._tmp_dir.name, f"{self._n_spills:06d}.npz"))
+            self._n_spills += 1
+        self._buffer_size = 0
+
+    def state(self):
+        """
+        metrics of the completed patients, and slices of the pending ones, which stay pending.
+        """
+        pending = {}
+        for name, buffer in self._buffers.items():
+            pending[name] = (buffer.voxelspacing, *buffer.slices(consume=False))
+        return {"results": dict(self._results), "pending": pending}
+
+    def load_state(self, state):
+        self.reset()
+        self._results = dict(state["results"])
+        for name, (voxelspacing, *slices) in state.get("pending", {}).items():
+            buffer = _PatientBuffer.from_slices(voxelspacing, *slices)
+            self._buffers[name] = buffer
+            self._buffer_size += buffer.nbytes
+            # the patients split over the ranks are complete once merged
+            if buffer.num_slices == self._num_slices.get(name):
+                self.complete(name)
+        self.mark_dirty()
+
+    def _merge_states(self, *states):
+        results, pending = {}, {}
+        for state in states:
+            assert not set(results.keys()) & set(state["results"].keys()), (
+                "completed patients can not be shared by the merged meters, given "
+                f"{sorted(set(results.keys()) & set(state['results'].keys()))}."
+            )
+            results.update(state["results"])
+            for name, (voxelspacing, *slices) in state.get("pending", {}).items():
+                if name not in pending:
+                    pending[name] = (voxelspacing, [], [], [])
+                for merged, added in zip(pending[name][1:], slices):
+                    merged.append(added)
+        assert not set(results.keys()) & set(pending.keys()), (
+            "patients completed by one of the merged meters can not be pending in another, given "
+            f"{sorted(set(results.keys()) & set(pending.keys()))}."
+        )
+        return {
+            "results": results,
+            "pending": {
+                name: (voxelspacing, *map(np.concatenate, slices))
+                for name, (voxelspacing, *slices) in pending.items()
+            },
+        }
+
+    @property
+    def group_names(self):
+        return sorted({*self._results.keys(), *self._buffers.keys()})
+
+    @property
+    def log(self):
+        """
+        metric of the patients, of shape (number of patients, report axises), the pending ones being evaluated
+        on their slices so far.
+        """
+        if len(self._results) + len(self._buffers) > 0:
+            return np.stack(
+                [
+                    self._results[name]
+                    if name in self._results
+                    else self._pending_result(name)
+                    for name in self.group_names
+                ]
+            )
+
+    def value(self, **kwargs):
+        log = self.log
+        if log is None:
+            return (
+                [np.nan] * len(self._report_axis),
+                [np.nan] * len(self._report_axis),
+            )
+        return (np.nanmean(log, 0), np.nanstd(log, 0))
+
+    def summary(self) -> dict:
+        means, stds = self.value()
+        return MeterResultDict(
+            {
+                f"{self._abbr}{i}": to_float(means[num])
+                for num, i in enumerate(self._report_axis)
+            }
+        )
+
+    def detailed_summary(self) -> dict:
+        means, stds = self.value()
+        return MeterResultDict(
+            {
+                **{
+                    f"{self._abbr}{i}": to_float(means[num])
+                    for num, i in enumerate(self._report_axis)
+                },
+                **{
+                    f"{self._abbr}_std{i}": to_float(stds[num])
+                    for num, i in enumerate(self._report_axis)
+                },
+            }
+        )
+
+    def get_plot_names(self) -> List[str]:
+        return [f"{self._abbr}{i}" for i in self._report_axis]
+
+    def __repr__(self):
+        string = f"C={self._C}, report_axis={self._report_axis}\n"
+        return (
+            string + "\t" + "\t".join([f"{k}:{v}" for k, v in self.summary().items()])
+        )
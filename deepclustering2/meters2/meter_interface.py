@@ -1,7 +1,8 @@
 from collections import OrderedDict
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 
 from deepclustering2.utils import nice_dict
+from ._async_meter import ASYNC_MODES, AsyncMeterProxy, create_worker
 from .individual_meters._metric import _Metric, MeterResultDict
 
 _Record_Type = Dict[str, float]
@@ -42,28 +43,59 @@ class MeterInterface:
     """
     meter interface only concerns about the situation in one epoch,
     without considering historical record and save/load state_dict function.
+
+    Meters registered with `async_mode` run their `add` in a background thread or process,
+    and are flushed before their results are read.
+
+    With sharded evaluation, each rank adds its shard of the data to its meters, and `all_reduce` combines
+    the meters of all ranks.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self, max_pending: int = 16, reduce_final: bool = False, process_group=None
+    ) -> None:
         """
-        :param meter_config: a dict of individual meter configurations
+        :param max_pending: maximum number of inputs waiting for an asynchronous meter before `add` blocks
+        :param reduce_final: all-reduce the meters across the ranks before the final `tracking_status`.
+                All the ranks should then call it.
+        :param process_group: process group of the all-reduce, the default group if None
         """
         self._ind_meter_dicts: Dict[str, _Metric] = OrderedDict()
         self._group_dicts: Dict[str, List[str]] = OrderedDict()
-
-    def __getitem__(self, meter_name: str) -> _Metric:
+        self._async_workers = OrderedDict()
+        self._max_pending = max_pending
+        self._reduce_final = reduce_final
+        self._process_group = process_group
+        self._reduced = False
+
+    def __getitem__(self, meter_name: str) -> Union[_Metric, AsyncMeterProxy]:
+        if meter_name in self._async_workers:
+            return AsyncMeterProxy(self._async_workers[meter_name])
         try:
-            return self.meters[meter_name]
+            return self._ind_meter_dicts[meter_name]
         except KeyError as e:
             raise KeyError(e)
 
-    def register_meter(self, name: str, meter: _Metric, group_name=None) -> None:
+    def register_meter(
+        self, name: str, meter: _Metric, group_name=None, async_mode: str = None
+    ) -> None:
+        """
+        :param async_mode: None to add synchronously, `thread` or `process` to add in a background worker.
+                `process` requires the meter and its inputs to be picklable.
+        """
         assert isinstance(name, str), name
         assert isinstance(
             meter, _Metric
         ), f"{meter.__class__.__name__} should be a subclass of {_Metric.__name__}, given {meter}."
+        assert async_mode is None or async_mode in ASYNC_MODES, async_mode
+        if name in self._async_workers:
+            self._async_workers.pop(name).close()
         # add meters
         self._ind_meter_dicts[name] = meter
+        if async_mode is not None:
+            self._async_workers[name] = create_worker(
+                name, meter, async_mode, self._max_pending
+            )
         if group_name is not None:
             if group_name not in self._group_dicts:
                 self._group_dicts[group_name] = []
@@ -73,7 +105,9 @@ class MeterInterface:
         assert (
             name in self.meter_names
         ), f"{name} should be in `meter_names`: {self.meter_names}, given {name}."
-        del self.meters[name]
+        if name in self._async_workers:
+            self._async_workers.pop(name).close()
+        del self._ind_meter_dicts[name]
         for group, meter_namelist in self._group_dicts.items():
             if name in meter_namelist:
                 meter_namelist.remove(name)
@@ -93,6 +127,7 @@ class MeterInterface:
     @property
     def meters(self) -> Optional[Dict[str, _Metric]]:
         if hasattr(self, "_ind_meter_dicts"):
+            self.flush()
             return self._ind_meter_dicts
         raise NotImplementedError("_ind_meter_dicts")
 
@@ -126,6 +161,8 @@ class MeterInterface:
 
     def tracking_status(self, group_name=None, final=False, cache_time=10):
         if final:
+            if self._reduce_final and not self._reduced:
+                self.all_reduce(self._process_group)
             return self._tracking_status(group_name=group_name)
         if not hasattr(self, "__n__"):
             self.__n__ = 0
@@ -139,12 +176,48 @@ class MeterInterface:
 
     def add(self, meter_name, *args, **kwargs):
         assert meter_name in self.meter_names
-        self.meters[meter_name].add(*args, **kwargs)
+        self._reduced = False
+        if meter_name in self._async_workers:
+            return self._async_workers[meter_name].submit(*args, **kwargs)
+        self._ind_meter_dicts[meter_name].add(*args, **kwargs)
+
+    def flush(self) -> None:
+        """
+        wait for the asynchronous meters to add all their pending inputs,
+        raising the error met by a worker if any.
+        """
+        for name, worker in self._async_workers.items():
+            # a process worker sends back an updated copy of its meter
+            self._ind_meter_dicts[name] = worker.flush()
+
+    def join(self) -> None:
+        """
+        flush and stop the workers of the asynchronous meters, which are then added synchronously.
+        """
+        self.flush()
+        while self._async_workers:
+            self._async_workers.popitem(last=False)[1].close()
+
+    def all_reduce(self, group=None) -> None:
+        """
+        combine the meters of all the ranks of `group`, in the order of registration, so that each rank holds
+        the result of the whole data. The asynchronous meters are joined first.
+        Meters without reduction state (e.g. `InstanceValue`) keep their local value.
+        """
+        self.join()
+        for meter in self._ind_meter_dicts.values():
+            if meter.reducible:
+                meter.all_reduce(group)
+        self._reduced = True
 
     def reset(self) -> None:
         """
         reset individual meters
         :return: None
         """
-        for v in self.meters.values():
-            v.reset()
+        self._reduced = False
+        for k, v in self.meters.items():
+            if k in self._async_workers:
+                self._async_workers[k].reset()
+            else:
+                v.reset()
@@ -1,14 +1,15 @@
 import functools
 from abc import ABCMeta
-from collections import defaultdict
-from typing import DefaultDict, Callable, List, Dict
+from collections import defaultdict, OrderedDict
+from typing import DefaultDict, Callable, List, Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from termcolor import colored
 
 from deepclustering2.meters2.meter_interface import EpochResultDict
 from deepclustering2.utils import path2Path
-from .historicalContainer import HistoricalContainer
+from .historicalContainer import HistoricalContainer, ColumnarContainer
 from .utils import rename_df_columns
 
 __all__ = ["Storage"]
@@ -29,28 +30,98 @@ class StorageIncomeDict:
 
 class _IOMixin:
     _storage: DefaultDict[str, HistoricalContainer]
+    _container_class: type
+    _csv_written: Dict[str, Tuple[List[str], int, int]]
+    _num_overwrites: int
     summary: Callable[[], pd.DataFrame]
+    _table: Callable[..., Optional[Tuple[np.ndarray, List[str], np.ndarray]]]
 
     def state_dict(self):
+        if self._container_class is ColumnarContainer:
+            # only the recorded rows of each container
+            return OrderedDict((k, v.state_dict()) for k, v in self._storage.items())
         return self._storage
 
     def load_state_dict(self, state_dict):
-        self._storage = state_dict
+        if self._container_class is ColumnarContainer:
+            self._storage = defaultdict(self._container_class)
+            for k, v in state_dict.items():
+                if isinstance(v, HistoricalContainer):
+                    # checkpoint saved with `HistoricalContainer`s
+                    for epoch, record in v.record_dict.items():
+                        self._storage[k].add(record, epoch)
+                    self._storage[k]._current_epoch = v.current_epoch
+                else:
+                    self._storage[k].load_state_dict(v)
+        else:
+            self._storage = state_dict
+        self._csv_written = {}
         print("loading from checkpoint:")
         print(colored(self.summary(), "green"))
 
     def to_csv(self, path, name="storage.csv"):
+        """
+        write the summary to `path/name`. With `ColumnarContainer`s, only the epochs after the last written one
+        are appended, unless the columns changed, a past epoch was put again or the file was written elsewhere.
+        """
+        path = path2Path(path)
+        path.mkdir(exist_ok=True, parents=True)
+        file = path / name
+        written = self._csv_written.get(str(file))
+        append = (
+            written is not None and file.exists() and written[1] == self._num_overwrites
+        )
+        table = self._table(after_epoch=written[2] if append else None)
+        if table is None:
+            self.summary().to_csv(file)
+            return
+        index, columns, values = table
+        if append and columns == written[0]:
+            pd.DataFrame(values, index=index, columns=columns).to_csv(
+                file, mode="a", header=False
+            )
+            last_epoch = int(index[-1]) if len(index) else written[2]
+        else:
+            if append:
+                index, columns, values = self._table()
+            pd.DataFrame(values, index=index, columns=columns).to_csv(file)
+            last_epoch = int(index[-1]) if len(index) else -1
+        self._csv_written[str(file)] = (columns, self._num_overwrites, last_epoch)
+
+    def to_parquet(self, path, name="storage.parquet"):
+        """
+        write the summary as a parquet file, which requires `pyarrow` or `fastparquet`.
+        """
         path = path2Path(path)
         path.mkdir(exist_ok=True, parents=True)
-        self.summary().to_csv(path / name)
+        summary = self.summary()
+        summary.columns = summary.columns.astype(str)
+        summary.to_parquet(path / name)
 
 
 class Storage(_IOMixin, metaclass=ABCMeta):
-    def __init__(self, csv_save_dir=None, csv_name="storage.csv") -> None:
+    def __init__(
+        self,
+        csv_save_dir=None,
+        csv_name="storage.csv",
+        container_class=ColumnarContainer,
+    ) -> None:
+        """
+        :param container_class: `ColumnarContainer` to store the epochs in preallocated arrays and append them to
+                the csv file, or `HistoricalContainer` for the dict-based records.
+        """
         super().__init__()
-        self._storage = defaultdict(HistoricalContainer)
+        assert container_class in (
+            ColumnarContainer,
+            HistoricalContainer,
+        ), container_class
+        self._container_class = container_class
+        self._storage = defaultdict(container_class)
         self._csv_save_dir = csv_save_dir
         self._csv_name = csv_name
+        # csv file -> (columns, number of overwrites, last epoch) when it was written
+        self._csv_written = {}
+        self._num_overwrites = 0
 
     def __enter__(self):
         return self
@@ -61,7 +132,15 @@ class Storage(_IOMixin, metaclass=ABCMeta):
     def put(
         self, name: str, value: Dict[str, float], epoch=None, prefix="", postfix=""
     ):
-        self._storage[prefix + name + postfix].add(value, epoch)
+        container = self._storage[prefix + name + postfix]
+        if isinstance(container, ColumnarContainer):
+            num_epochs = len(container)
+            container.add(value, epoch)
+            if len(container) == num_epochs:
+                # a recorded epoch has been replaced
+                self._num_overwrites += 1
+            return
+        container.add(value, epoch)
 
     def put_all(
         self, result_name: str, epoch_result: EpochResultDict = None, epoch=None
@@ -84,11 +163,39 @@ class Storage(_IOMixin, metaclass=ABCMeta):
             return self._storage[name]
         return self._storage[name][epoch]
 
+    def _table(
+        self, after_epoch: int = None
+    ) -> Optional[Tuple[np.ndarray, List[str], np.ndarray]]:
+        """
+        (epochs, columns, values) of the summary, concatenated from the `ColumnarContainer`s,
+        None for other containers.
+        :param after_epoch: only give the epochs after this one
+        """
+        containers = list(self._storage.values())
+        if not containers or not all(
+            isinstance(v, ColumnarContainer) for v in containers
+        ):
+            return None
+        # epochs of all the containers, as the inner merge of the summaries
+        if all(v.contiguous for v in containers):
+            index = np.arange(min(len(v.index) for v in containers))
+        else:
+            index = functools.reduce(np.intersect1d, [v.index for v in containers])
+        if after_epoch is not None:
+            index = index[index > after_epoch]
+        columns = [f"{k}_{c}" for k, v in self._storage.items() for c in v.columns]
+        values = np.concatenate([v.table(index) for v in containers], axis=1)
+        return index, columns, values
+
     def summary(self) -> pd.DataFrame:
         """
         summary on the list of sub summarys, merging them together.
         :return:
         """
+        table = self._table()
+        if table is not None:
+            index, columns, values = table
+            return pd.DataFrame(values, index=index, columns=columns)
         try:
             list_of_summary = [
                 rename_df_columns(v.summary(), k) for k, v in self._storage.items()
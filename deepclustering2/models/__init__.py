@@ -3,6 +3,7 @@ from torch import Tensor
 from .convert2apex import AMPGradientBackwardStep, to_Apex
 from .models import Model, NormalGradientBackwardStep, DPModel
 from .ema import EMA_Model, ema_updater
+from .accumulation import GradientAccumulator, split_batch, find_micro_batch_size
 
 
 def ZeroGradientBackwardStep(loss: Tensor, model: Model):
@@ -0,0 +1,201 @@
+import math
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Tuple, Union
+
+import torch
+from torch import Tensor
+
+from .models import Model
+
+__all__ = [
+    "GradientAccumulator",
+    "split_batch",
+    "find_micro_batch_size",
+]
+
+
+def _batch_size(batch) -> int:
+    if isinstance(batch, Tensor):
+        return batch.shape[0]
+    if isinstance(batch, dict):
+        batch = list(batch.values())
+    if isinstance(batch, (list, tuple)):
+        for item in batch:
+            size = _batch_size(item)
+            if size:
+                return size
+    return 0
+
+
+def _slice(batch, start: int, stop: int):
+    if isinstance(batch, Tensor) and batch.dim():
+        return batch[start:stop]
+    if isinstance(batch, dict):
+        return batch.__class__((k, _slice(v, start, stop)) for k, v in batch.items())
+    if isinstance(batch, (list, tuple)) and not hasattr(batch, "_fields"):
+        return batch.__class__(_slice(x, start, stop) for x in batch)
+    if isinstance(batch, (list, tuple)):
+        # namedtuple
+        return batch.__class__(*(_slice(x, start, stop) for x in batch))
+    return batch
+
+
+def split_batch(batch, micro_batch_size: int = None) -> List[Tuple[Any, float]]:
+    """
+    split the tensors of `batch` (possibly nested in lists, tuples and dicts) along their first dimension.
+    :return: the micro-batches with their share of the batch samples, by which their loss should be weighted.
+    The whole batch with weight 1 if `micro_batch_size` is None or not smaller than the batch.
+    """
+    batch_size = _batch_size(batch)
+    if micro_batch_size is None or micro_batch_size >= batch_size:
+        return [(batch, 1.0)]
+    assert micro_batch_size >= 1, micro_batch_size
+    return [
+        (
+            _slice(batch, start, start + micro_batch_size),
+            (min(start + micro_batch_size, batch_size) - start) / batch_size,
+        )
+        for start in range(0, batch_size, micro_batch_size)
+    ]
+
+
+def _is_out_of_memory(error: BaseException) -> bool:
+    return isinstance(error, RuntimeError) and "out of memory" in str(error)
+
+
+def find_micro_batch_size(
+    probe: Callable[[Any], None],
+    batch,
+    memory_budget: int = None,
+    device: Union[str, torch.device] = "cuda",
+) -> int:
+    """
+    largest micro-batch size of `batch` for which `probe(micro_batch)` (forward and backward) neither runs out of
+    memory nor exceeds `memory_budget` bytes of peak CUDA memory. The gradients left by `probe` should be zeroed.
+    :param memory_budget: bytes, only enforced on a CUDA device
+    """
+    device = torch.device(device)
+    measure = memory_budget is not None and device.type == "cuda"
+
+    def fits(size: int) -> bool:
+        micro_batch, _ = split_batch(batch, size)[0]
+        if measure:
+            torch.cuda.synchronize(device)
+            torch.cuda.reset_peak_memory_stats(device)
+            baseline = torch.cuda.memory_allocated(device)
+        try:
+            probe(micro_batch)
+        except RuntimeError as e:
+            if not _is_out_of_memory(e):
+                raise e
+            if device.type == "cuda":
+                torch.cuda.empty_cache()
+            return False
+        if measure:
+            torch.cuda.synchronize(device)
+            return torch.cuda.max_memory_allocated(device) - baseline <= memory_budget
+        return True
+
+    # halve until it fits, then bisect between the fitting size and the last failing one
+    high, size = _batch_size(batch) + 1, _batch_size(batch)
+    while not fits(size):
+        if size == 1:
+            raise RuntimeError("a micro-batch of one sample does not fit")
+        high, size = size, size // 2
+    low = size
+    while high - low > 1:
+        middle = (low + high) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+class GradientAccumulator:
+    """
+    Optimizer step every `accumulate_steps` batches, the gradients of the batches in between being accumulated:
+
+    >>> accumulator = GradientAccumulator(model, accumulate_steps=4)
+    >>> for batch in loader:
+    >>>     with accumulator.step():
+    >>>         for micro_batch, weight in split_batch(batch, micro_batch_size):
+    >>>             accumulator.backward(criterion(model(micro_batch)) * weight)
+    >>> accumulator.flush()
+    """
+
+    def __init__(
+        self,
+        model: Union[Model, torch.optim.Optimizer],
+        accumulate_steps: int = 1,
+        scheduler=None,
+    ) -> None:
+        """
+        :param model: `Model` or optimizer, with `zero_grad` and `step`
+        :param accumulate_steps: number of batches per optimizer step
+        :param scheduler: scheduler stepped after each optimizer step, for schedules counted in iterations
+        """
+        assert (
+            isinstance(accumulate_steps, int) and accumulate_steps >= 1
+        ), accumulate_steps
+        self._model = model
+        self._accumulate_steps = accumulate_steps
+        self._scheduler = scheduler
+        # number of batches accumulated since the last optimizer step
+        self._pending = 0
+        self.stepped = False
+
+    @property
+    def accumulate_steps(self) -> int:
+        return self._accumulate_steps
+
+    def optimizer_steps(self, num_batches: int) -> int:
+        """number of optimizer steps in an epoch of `num_batches` batches, the last one possibly partial"""
+        return math.ceil(num_batches / self._accumulate_steps)
+
+    @contextmanager
+    def step(self) -> Iterator["GradientAccumulator"]:
+        """
+        context of one batch: zero the gradients at the start of a cycle, step the optimizer at its end.
+        """
+        if self._pending == 0:
+            self._model.zero_grad()
+        self.stepped = False
+        yield self
+        self._pending += 1
+        if self._pending == self._accumulate_steps:
+            self._optimizer_step()
+
+    def backward(self, loss: Tensor):
+        """
+        backward of `loss` averaged over the accumulated batches, scaled for a float16 `Model`.
+        """
+        loss = loss / self._accumulate_steps
+        if hasattr(self._model, "scale_loss"):
+            loss = self._model.scale_loss(loss)
+        loss.backward()
+
+    def flush(self):
+        """
+        step the optimizer on the batches accumulated since the last step, e.g. at the end of an epoch,
+        their gradients rescaled as for a full cycle.
+        """
+        if self._pending == 0:
+            return
+        scale = self._accumulate_steps / self._pending
+        for param in self._parameters():
+            if param.grad is not None:
+                param.grad.mul_(scale)
+        self._optimizer_step()
+
+    def _parameters(self):
+        if hasattr(self._model, "param_groups"):
+            return [p for group in self._model.param_groups for p in group["params"]]
+        return self._model.parameters()
+
+    def _optimizer_step(self):
+        self._model.step()
+        if self._scheduler is not None:
+            self._scheduler.step()
+        self._pending = 0
+        self.stepped = True
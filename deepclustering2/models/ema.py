@@ -1,45 +1,121 @@
+from typing import List, Tuple
+
 import torch
-from torch import nn
+from torch import Tensor, nn
 
 from .models import Model
 
+# running statistics of the normalization layers, averaged with `update_bn`
+_BN_BUFFERS = ("running_mean", "running_var")
+
+
+def _ema_slots(
+    ema_model: nn.Module, student_model: nn.Module, update_bn: bool
+) -> List[Tuple[dict, dict, str]]:
+    """
+    (ema `_parameters` or `_buffers`, student ones, name) of the averaged tensors, matched in module order.
+    The tensors are looked up in these dicts at each update, as `.to()` replaces the buffers.
+    """
+    slots, seen = [], set()
+    for ema_module, s_module in zip(ema_model.modules(), student_model.modules()):
+        for name, param in ema_module._parameters.items():
+            # shared parameters are averaged once, as in `named_parameters`
+            if param is not None and id(param) not in seen:
+                seen.add(id(param))
+                slots.append((ema_module._parameters, s_module._parameters, name))
+        if update_bn:
+            for name, buffer in ema_module._buffers.items():
+                if buffer is not None and any(n in name for n in _BN_BUFFERS):
+                    slots.append((ema_module._buffers, s_module._buffers, name))
+    return slots
+
+
+def _update_weights(
+    alpha: float,
+    global_step: int,
+    steps: int = 1,
+    weight_decay: float = 0.0,
+    justify_alpha: bool = True,
+) -> Tuple[float, float]:
+    """
+    weights of the ema and of the student in an update standing for the `steps` student steps up to
+    `global_step`, exact if the student did not change in between.
+    :param justify_alpha: use the true average until the exponential one is more correct
+    """
+    ema_weight, student_weight = 1.0, 0.0
+    for step in range(global_step - steps + 1, global_step + 1):
+        step_alpha = min(1 - 1 / (step + 1), alpha) if justify_alpha else alpha
+        ema_weight *= step_alpha * (1 - weight_decay)
+        student_weight = (student_weight * step_alpha + (1 - step_alpha)) * (
+            1 - weight_decay
+        )
+    return ema_weight, student_weight
+
+
+@torch.no_grad()
+def _ema_update(
+    slots: List[Tuple[dict, dict, str]], ema_weight: float, student_weight: float
+):
+    """
+    ema = ema_weight * ema + student_weight * student, with multi-tensor kernels.
+    """
+    if not slots:
+        return
+    ema_tensors: List[Tensor] = [ema[name] for ema, _, name in slots]
+    s_tensors: List[Tensor] = [student[name] for _, student, name in slots]
+    torch._foreach_mul_(ema_tensors, ema_weight)
+    torch._foreach_add_(ema_tensors, s_tensors, alpha=student_weight)
+
 
 class EMA_Model:
     def __init__(
-        self, model: Model, alpha=0.999, weight_decay=0.0, update_bn=False
+        self,
+        model: Model,
+        alpha=0.999,
+        weight_decay=0.0,
+        update_bn=False,
+        update_every: int = 1,
     ) -> None:
+        """
+        :param update_every: update the average every `update_every` student steps, with the decay of all of
+        them, to save the update on the other steps. The average lags behind by the steps in between.
+        """
         super().__init__()
+        assert isinstance(update_every, int) and update_every >= 1, update_every
         # here we deepcopy a `Model`, including the torchmodel, optimizer and, scheduler
         # self._model = Model.initialize_from_state_dict(model.state_dict())
         self._model = model
         self._alpha = alpha
         self._weight_decay = weight_decay
         self._update_bn = update_bn
+        self._update_every = update_every
         self._global_step = 0
+        # averaged tensors of the last student
+        self._slots_key = None
+        self._slots = None
         # detach the param for the ema model
         for param in self._model._torchnet.parameters():
             param.detach_()
         self.train()
 
     def step(self, student_model: Model):
-        # Use the true average until the exponential average is more correct
-        alpha = min(1 - 1 / (self._global_step + 1), self._alpha)
-        for ema_param, s_param in zip(
-            self._model._torchnet.parameters(), student_model._torchnet.parameters()
-        ):
-            ema_param.data.mul_(alpha).add_(1 - alpha, s_param.data)
-            if self._weight_decay > 0:
-                ema_param.data.mul_(1 - self._weight_decay)
-        if self._update_bn:
-            # running mean and vars for bn
-            for (name, ema_buffer), (_, s_buffer) in zip(
-                self._model._torchnet.named_buffers(),
-                student_model._torchnet.named_buffers(),
-            ):
-                if "running_mean" in name or "running_var" in name:
-                    ema_buffer.data.mul_(alpha).add_(1 - alpha, s_buffer.data)
-                    if self._weight_decay > 0:
-                        ema_buffer.data.mul_(1 - self._weight_decay)
+        if (self._global_step + 1) % self._update_every == 0:
+            key = id(student_model._torchnet)
+            if self._slots_key != key:
+                self._slots = _ema_slots(
+                    self._model._torchnet, student_model._torchnet, self._update_bn
+                )
+                self._slots_key = key
+            # Use the true average until the exponential average is more correct
+            _ema_update(
+                self._slots,
+                *_update_weights(
+                    self._alpha,
+                    self._global_step,
+                    self._update_every,
+                    self._weight_decay,
+                ),
+            )
         self._global_step += 1
 
     def train(self):
@@ -65,6 +141,7 @@ class EMA_Model:
                 "global_step": self._global_step,
                 "update_bn": self._update_bn,
                 "weight_decay": self._weight_decay,
+                "update_every": self._update_every,
             },
         }
 
@@ -77,6 +154,8 @@ class EMA_Model:
         del state_dict["global_step"]
         del state_dict["update_bn"]
         del state_dict["weight_decay"]
+        self._update_every = state_dict.pop("update_every", self._update_every)
+        self._slots_key, self._slots = None, None
         self._model.load_state_dict(state_dict)
 
     @property
@@ -95,36 +174,42 @@ class EMA_Model:
 
 class ema_updater:
     def __init__(
-        self, alpha=0.999, justify_alpha=True, weight_decay=1e-5, update_bn=False
+        self,
+        alpha=0.999,
+        justify_alpha=True,
+        weight_decay=1e-5,
+        update_bn=False,
+        update_every: int = 1,
     ) -> None:
+        """
+        :param update_every: update the average every `update_every` calls, with the decay of all of them
+        """
+        assert isinstance(update_every, int) and update_every >= 1, update_every
         self._alpha = alpha
         self._weight_decay = weight_decay
         self._update_bn = update_bn
         self._justify_alpha = justify_alpha
+        self._update_every = update_every
         self.__global_step = 0
+        # averaged tensors of the last (ema_model, student_model) pair
+        self._slots_key = None
+        self._slots = None
 
     @torch.no_grad()
     def __call__(self, ema_model: nn.Module, student_model: nn.Module):
-
-        alpha = self._alpha
-        if self._justify_alpha:
-            alpha = min(1 - 1 / (self.__global_step + 1), self._alpha)
-
-        for ema_param, s_param in zip(
-            ema_model.parameters(), student_model.parameters()
-        ):
-            ema_param.data.mul_(alpha).add_(1 - alpha, s_param.data)
-            if self._weight_decay > 0:
-                ema_param.data.mul_(1 - self._weight_decay)
-
-        if self._update_bn:
-            # running mean and vars for bn
-            for (name, ema_buffer), (_, s_buffer) in zip(
-                ema_model.named_buffers(), student_model.named_buffers(),
-            ):
-                if "running_mean" in name or "running_var" in name:
-                    ema_buffer.data.mul_(alpha).add_(1 - alpha, s_buffer.data)
-                    if self._weight_decay > 0:
-                        ema_buffer.data.mul_(1 - self._weight_decay)
-
+        if (self.__global_step + 1) % self._update_every == 0:
+            key = (id(ema_model), id(student_model))
+            if self._slots_key != key:
+                self._slots = _ema_slots(ema_model, student_model, self._update_bn)
+                self._slots_key = key
+            _ema_update(
+                self._slots,
+                *_update_weights(
+                    self._alpha,
+                    self.__global_step,
+                    self._update_every,
+                    self._weight_decay,
+                    justify_alpha=self._justify_alpha,
+                ),
+            )
         self.__global_step += 1
@@ -10,6 +10,7 @@ from torch.nn import functional as F
 from torch.optim import lr_scheduler
 
 from deepclustering2 import ModelMode
+from deepclustering2.amp import MixedPrecision
 from deepclustering2.arch import get_arch
 from deepclustering2.utils import simplex
 
@@ -33,6 +34,9 @@ class NormalGradientBackwardStep(object):
         self.model.zero_grad()
 
     def __enter__(self):
+        # scaled by the `GradScaler` of a float16 model
+        if hasattr(self.model, "scale_loss"):
+            return self.model.scale_loss(self.loss)
         return self.loss
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -49,17 +53,20 @@ class Model(metaclass=ABCMeta):
         arch: Union[NetType, CType],
         optimizer: Union[OptimType, CType] = None,
         scheduler: Union[ScheType, CType] = None,
+        amp: Union[MixedPrecision, CType] = None,
     ):
         """
         create network from either configuration or module directly.
         :param arch: network configuration or network module
         :param optimizer:
         :param scheduler:
+        :param amp: `MixedPrecision` or its configuration (the `Amp` section of the config), None for float32
         :return:
         """
         self._set_arch(arch)
         self._set_optimizer(optimizer)
         self._set_scheduler(scheduler)
+        self._set_amp(amp)
 
     def _set_arch(self, arch: Union[NetType, CType]) -> None:
         self._torchnet: nn.Module
@@ -122,15 +129,36 @@ class Model(metaclass=ABCMeta):
         if scheduler is not None:
             assert issubclass(type(self._scheduler), ScheType)
 
+    def _set_amp(self, amp: Union[MixedPrecision, CType] = None) -> None:
+        self._amp: MixedPrecision
+        self._amp_dict: Optional[CType]
+        if isinstance(amp, MixedPrecision):
+            self._amp_dict = None
+            self._amp = amp
+        else:
+            self._amp_dict = amp
+            self._amp = MixedPrecision.from_config(deepcopy(amp))
+
     def parameters(self):
         return self._torchnet.parameters()
 
+    def _device_type(self) -> str:
+        param = next(self._torchnet.parameters(), None)
+        return param.device.type if param is not None else "cpu"
+
     def __call__(self, *args, **kwargs):
         force_simplex = kwargs.pop("force_simplex", False)
         assert isinstance(force_simplex, bool), force_simplex
-        torch_logits = self._torchnet(*args, **kwargs)
+        if self._amp.enabled:
+            with self._amp.autocast(self._device_type()):
+                torch_logits = self._torchnet(*args, **kwargs)
+            # losses are computed in float32, out of the autocast region
+            if isinstance(torch_logits, Tensor) and torch_logits.is_floating_point():
+                torch_logits = torch_logits.float()
+        else:
+            torch_logits = self._torchnet(*args, **kwargs)
         if force_simplex:
-            if not simplex(torch_logits, 1):
+            if not simplex(torch_logits, 1, force=True):
                 return F.softmax(torch_logits, 1)
         return torch_logits
 
@@ -140,7 +168,17 @@ class Model(metaclass=ABCMeta):
 
     def step(self):
         if self._optimizer is not None and hasattr(self._optimizer, "step"):
-            self._optimizer.step()
+            self._amp.step(self._optimizer)
+
+    def scale_loss(self, loss: Tensor) -> Tensor:
+        """
+        loss to call backward on, scaled when the model runs in float16.
+        """
+        return self._amp.scale(loss)
+
+    @property
+    def amp(self) -> MixedPrecision:
+        return self._amp
 
     def zero_grad(self) -> None:
         if self._optimizer is not None and hasattr(self._optimizer, "zero_grad"):
@@ -228,6 +266,8 @@ class Model(metaclass=ABCMeta):
             "scheduler_state_dict": self._scheduler.state_dict()
             if self._scheduler is not None
             else None,
+            "amp_dict": self._amp_dict,
+            "scaler_state_dict": self._amp.state_dict(),
         }
 
     def load_state_dict(self, state_dict: dict):
@@ -239,6 +279,7 @@ class Model(metaclass=ABCMeta):
             self._optimizer.load_state_dict(state_dict["optim_state_dict"])
         if hasattr(self._scheduler, "load_state_dict") and self._scheduler is not None:
             self._scheduler.load_state_dict(state_dict["scheduler_state_dict"])
+        self._amp.load_state_dict(state_dict.get("scaler_state_dict"))
 
     @classmethod
     def initialize_from_state_dict(cls, state_dict: Dict[str, dict]):
@@ -263,7 +304,12 @@ class Model(metaclass=ABCMeta):
                 f"scheduler is ignored as it is not initialized with config, use `load_state_dict` instead.",
                 RuntimeWarning,
             )
-        model = cls(arch=arch_dict, optimizer=optim_dict, scheduler=scheduler_dict)
+        model = cls(
+            arch=arch_dict,
+            optimizer=optim_dict,
+            scheduler=scheduler_dict,
+            amp=state_dict.get("amp_dict"),
+        )
         model.load_state_dict(state_dict=state_dict)
         model.to(torch.device("cpu"))
         return model
@@ -289,9 +335,10 @@ class DPModel(Model):
         arch: Union[NetType, CType],
         optimizer: Union[OptimType, CType] = None,
         scheduler: Union[ScheType, CType] = None,
+        amp: Union[MixedPrecision, CType] = None,
     ):
         self._USEDP = False
-        super().__init__(arch, optimizer, scheduler)
+        super().__init__(arch, optimizer, scheduler, amp)
         if torch.cuda.is_available():
             if torch.cuda.device_count() > 1:
                 self._torchnet = torch.nn.DataParallel(self._torchnet)
@@ -311,6 +358,8 @@ class DPModel(Model):
             "scheduler_state_dict": self._scheduler.state_dict()
             if self._scheduler is not None
             else None,
+            "amp_dict": self._amp_dict,
+            "scaler_state_dict": self._amp.state_dict(),
         }
 
     def load_state_dict(self, state_dict: dict):
@@ -325,3 +374,4 @@ class DPModel(Model):
             self._optimizer.load_state_dict(state_dict["optim_state_dict"])
         if hasattr(self._scheduler, "load_state_dict") and self._scheduler is not None:
             self._scheduler.load_state_dict(state_dict["scheduler_state_dict"])
+        self._amp.load_state_dict(state_dict.get("scaler_state_dict"))
@@ -2,11 +2,15 @@
 from __future__ import absolute_import, division
 
 import atexit
+import time
+import weakref
 from collections import Iterable
 
 # native libraries
 from numbers import Number
+from typing import Callable, Iterator, Optional, Union
 
+import torch
 from tqdm import tqdm as _tqdm
 
 # compatibility functions and utilities
@@ -17,6 +21,15 @@ from deepclustering2.meters2.meter_interface import EpochResultDict
 
 # For parallelism safety
 
+# the open indicators, closed by a single handler at exit
+_live_indicators = weakref.WeakSet()
+
+
+@atexit.register
+def _close_live_indicators():
+    for indicator in list(_live_indicators):
+        indicator.close()
+
 
 def is_float(v):
     """if v is a scalar"""
@@ -76,6 +89,28 @@ def item2str(item):
     return _iter2str(item)
 
 
+def _num_samples(batch) -> Optional[int]:
+    """batch size of the first tensor found in `batch`, None if there is none"""
+    if isinstance(batch, torch.Tensor):
+        return batch.shape[0] if batch.dim() else 1
+    if isinstance(batch, dict):
+        batch = list(batch.values())
+    if isinstance(batch, (list, tuple)):
+        for item in batch:
+            num = _num_samples(item)
+            if num is not None:
+                return num
+    return None
+
+
+def _seconds2str(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
 class tqdm(_tqdm):
     def __init__(
         self,
@@ -101,8 +136,16 @@ class tqdm(_tqdm):
         unit_divisor=1000,
         write_bytes=None,
         gui=False,
+        postfix_interval=200,
         **kwargs,
     ):
+        """
+        :param postfix_interval: minimum interval in ms between two refreshes of the postfix by `set_postfix_dict`
+
+        The indicator can be reused for several epochs with `restart`. Iterating a loader with `track`
+        additionally displays the samples per second, the fraction of the time spent waiting for the data
+        and the ETA from the smoothed step time.
+        """
         super().__init__(
             iterable,
             desc,
@@ -128,19 +171,131 @@ class tqdm(_tqdm):
             gui,
             **kwargs,
         )
+        self._postfix_interval = postfix_interval / 1000
+        self._reset_stats()
+        _live_indicators.add(self)
+
+    def _reset_stats(self):
         self._post_dict_cache = None
-        atexit.register(self.close)
+        self._last_postfix_time = None
+        self._pending_post_dict = None
+        self._timing_str = ""
+        self._num_samples = 0
+        self._data_time = 0.0
+        self._compute_time = 0.0
+        self._step_time = None
+
+    def restart(self, iterable=None, total=None):
+        """
+        reset the indicator for a new epoch, on `iterable` if given.
+        """
+        if iterable is not None:
+            self.iterable = iterable
+            if total is None and hasattr(iterable, "__len__"):
+                total = len(iterable)
+        self._reset_stats()
+        self.postfix = None
+        self.reset(total=total)
+        return self
+
+    def track(self, iterable, batch_size: int = None, meter=None) -> Iterator:
+        """
+        yield the batches of `iterable` (e.g. a DataLoader), at most `total` of them, advancing the indicator.
+        The time spent in `next(iterable)` is counted as data wait, and the time until the next batch is
+        requested as computation.
+        :param batch_size: number of samples per batch, inferred from the first tensor of the batch if None
+        :param meter: `ThroughputMeter` to feed with the timing of each step
+        """
+        iterator = iter(iterable)
+        step = 0
+        while self.total is None or step < self.total:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            loaded = time.perf_counter()
+            yield batch
+            data_time, compute_time = loaded - start, time.perf_counter() - loaded
+            num_samples = batch_size or _num_samples(batch) or 1
+            if meter is not None:
+                meter.add(num_samples, data_time, compute_time)
+            self._record_step(num_samples, data_time, compute_time)
+            step += 1
+
+    def _record_step(self, num_samples: int, data_time: float, compute_time: float):
+        self._num_samples += num_samples
+        self._data_time += data_time
+        self._compute_time += compute_time
+        step_time = data_time + compute_time
+        if self._step_time is None:
+            self._step_time = step_time
+        else:
+            self._step_time = (
+                self.smoothing * step_time + (1 - self.smoothing) * self._step_time
+            )
+        total_time = self._data_time + self._compute_time
+        timing = []
+        if total_time > 0:
+            timing.append(f"{self._num_samples / total_time:.1f} samples/s")
+            timing.append(f"data {100 * self._data_time / total_time:.0f}%")
+        if self.total is not None:
+            remaining = self._step_time * max(self.total - self.n - 1, 0)
+            timing.append(f"ETA {_seconds2str(remaining)}")
+        self._timing_str = ", ".join(timing)
+        self._set_postfix_str()
+        self.update(1)
+
+    def _set_postfix_str(self, refresh=False):
+        self.set_postfix_str(
+            ", ".join(str(s) for s in (self._timing_str, self._post_dict_cache) if s),
+            refresh=refresh,
+        )
 
     def set_postfix_dict(
-        self, ordered_dict: EpochResultDict = None, refresh=True, **kwargs
+        self,
+        ordered_dict: Union[EpochResultDict, Callable[[], EpochResultDict]] = None,
+        refresh=True,
+        force=False,
+        **kwargs,
     ):
+        """
+        display `ordered_dict` as postfix, at most once every `postfix_interval` ms.
+        :param ordered_dict: dict to display, or a function returning it, e.g. `meters.tracking_status`,
+                which is only called when the postfix is refreshed.
+        :param force: refresh regardless of the interval
+        """
+        if not ordered_dict:
+            return
+        now = time.time()
+        if (
+            not force
+            and self._last_postfix_time is not None
+            and now - self._last_postfix_time < self._postfix_interval
+        ):
+            self._pending_post_dict = ordered_dict
+            return
+        self._last_postfix_time = now
+        self._pending_post_dict = None
+        display = self._format_post_dict(ordered_dict)
+        if display:
+            self._set_postfix_str(refresh=refresh)
+
+    def _format_post_dict(self, ordered_dict) -> Optional[str]:
+        if callable(ordered_dict):
+            ordered_dict = ordered_dict()
         if ordered_dict:
-            display = str(item2str(ordered_dict))
-            self.set_postfix_str(display)
-            self._post_dict_cache = display
+            self._post_dict_cache = str(item2str(ordered_dict))
+        return self._post_dict_cache
 
     def _print_description(self):
+        if self._pending_post_dict is not None:
+            self._format_post_dict(self._pending_post_dict)
+            self._pending_post_dict = None
         if self._post_dict_cache:
+            if not self.disable:
+                # the bar stays open when the indicator is reused
+                self.clear()
             print(f"{self.desc}: {self._post_dict_cache}")
 
     def set_description(self, desc=None, refresh=True):
@@ -4,9 +4,9 @@ from pathlib import Path
 from typing import TypeVar
 
 import numpy as np
-import torch
 from deepclustering2 import PROJECT_PATH
 from deepclustering2.models.models import Model
+from deepclustering2.utils.checkpoint import atomic_save, load_checkpoint
 from deepclustering2.utils.io import path2Path, path2str, write_yaml
 from torch import Tensor
 
@@ -21,6 +21,10 @@ class TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
 
     RUN_PATH = str(Path(PROJECT_PATH) / "runs")
     ARCHIVE_PATH = str(Path(PROJECT_PATH) / "archives")
+    # save the checkpoints with `torch.save`, which `load_checkpoint` memory-maps (torch >= 2.1).
+    # Set it to True for the indexed format of `save_indexed`, whose modules are also unpickled separately,
+    # but which only `deepclustering2.utils.load_checkpoint` can read.
+    _indexed_checkpoint = False
 
     def __init__(
         self,
@@ -59,10 +63,11 @@ class TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
         destination = {**local_state_dict, **{"_buffers": buffer_state_dict}}
         return destination
 
-    def load_state_dict(self, state_dict: dict, strict=True) -> None:
+    def load_state_dict(self, state_dict: dict, strict=True, modules=None) -> None:
         """
         Load state_dict for submodules having "load_state_dict" method.
         :param state_dict:
+        :param modules: names of the modules to load, e.g. ["_model"], all of them if None
         :return:
         """
         missing_keys = []
@@ -70,6 +75,8 @@ class TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
         er_msgs = []
 
         for module_name, module in self.__dict__.items():
+            if modules is not None and module_name not in modules:
+                continue
             if module_name == "_buffers":
                 self._load_buffer_state_dict(state_dict["_buffers"])
             if hasattr(module, "load_state_dict") and callable(
@@ -104,7 +111,10 @@ class TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
         if self._cur_epoch > self._start_epoch:
             self._start_epoch = self._cur_epoch + 1
 
-    def load_state_dict_from_path(self, path, *args, **kwargs) -> None:
+    def load_state_dict_from_path(self, path, *args, modules=None, **kwargs) -> None:
+        """
+        :param modules: names of the modules to load, e.g. ["_model"], only these being read from the checkpoint
+        """
         path = path2Path(path)
         assert path.exists(), path
         if path.is_file() and path.suffix in (".pth", ".pt"):
@@ -113,8 +123,8 @@ class TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
             path = path / "last.pth"
         else:
             raise FileNotFoundError(path)
-        state_dict = torch.load(path2str(path), map_location="cpu")
-        self.load_state_dict(state_dict, *args, **kwargs)
+        state_dict = load_checkpoint(path2str(path), keys=modules)
+        self.load_state_dict(state_dict, *args, modules=modules, **kwargs)
 
     def _save_to(self, save_name, path=None):
         assert path2Path(save_name).suffix in (".pth", ".pt"), path2Path(
@@ -125,7 +135,7 @@ class TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
         path = path2Path(path)
         path.mkdir(parents=True, exist_ok=True)
         state_dict = self.state_dict()
-        torch.save(state_dict, path2str(path / save_name))
+        atomic_save(state_dict, path / save_name, indexed=self._indexed_checkpoint)
 
     def clean_up(self, wait_time=15):
         """
@@ -2,14 +2,14 @@ import warnings
 from abc import ABCMeta
 from copy import deepcopy
 from pathlib import Path
-from typing import TypeVar
+from typing import Sequence, TypeVar
 
 import numpy as np
-import torch
 from torch import Tensor
 
 from deepclustering2 import PROJECT_PATH
 from deepclustering2.models.models import Model
+from deepclustering2.utils.checkpoint import AsyncCheckpointWriter, load_checkpoint
 from deepclustering2.utils.io import path2Path, path2str, write_yaml
 from ._buffer import _BufferMixin
 
@@ -22,6 +22,12 @@ class _TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
 
     RUN_PATH = str(Path(PROJECT_PATH) / "runs")
     ARCHIVE_PATH = str(Path(PROJECT_PATH) / "archives")
+    # serialize the checkpoints in a background thread, the training resuming once they are copied to CPU
+    _async_checkpoint = True
+    # save the checkpoints with `torch.save`, which `load_checkpoint` memory-maps (torch >= 2.1).
+    # Set it to True for the indexed format of `save_indexed`, whose modules are also unpickled separately,
+    # but which only `deepclustering2.utils.load_checkpoint` can read.
+    _indexed_checkpoint = False
 
     def __init__(
         self,
@@ -41,6 +47,9 @@ class _TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
         self._save_dir = save_dir
         Path(self._save_dir).mkdir(exist_ok=True, parents=True)
 
+        self._checkpoint_writer = AsyncCheckpointWriter(
+            blocking=not self._async_checkpoint
+        )
         self._max_epoch = max_epoch
         self._num_batches = num_batches  # it can be changed when debugging
         self._register_buffer("_config", deepcopy(config))
@@ -63,17 +72,20 @@ class _TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
         destination = {**local_state_dict, **{"_buffers": buffer_state_dict}}
         return destination
 
-    def load_state_dict(self, state_dict: dict, strict=True) -> None:
+    def load_state_dict(self, state_dict: dict, strict=True, modules=None) -> None:
         """
         Load state_dict for submodules having "load_state_dict" method.
         :param state_dict:
         :param strict: if raise error
+        :param modules: names of the modules to load, e.g. ["_model"], all of them if None
         :return:
         """
         missing_keys = []
         er_msgs = []
 
         for module_name, module in self.__dict__.items():
+            if modules is not None and module_name not in modules:
+                continue
             if module_name == "_buffers":
                 super(_TrainerIOMixin, self).load_state_dict(state_dict["_buffers"])
                 continue
@@ -108,7 +120,12 @@ class _TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
         if self._cur_epoch > self._start_epoch:
             self._start_epoch = self._cur_epoch + 1
 
-    def load_state_dict_from_path(self, path, name="last.pth", *args, **kwargs) -> None:
+    def load_state_dict_from_path(
+        self, path, name="last.pth", *args, modules=None, **kwargs
+    ) -> None:
+        """
+        :param modules: names of the modules to load, e.g. ["_model"], only these being read from the checkpoint
+        """
         path = path2Path(path)
         assert path.exists(), path
         if path.is_file() and path.suffix in (".pth", ".pt"):
@@ -117,40 +134,74 @@ class _TrainerIOMixin(_BufferMixin, metaclass=ABCMeta):
             path = path / name
         else:
             raise FileNotFoundError(path)
-        state_dict = torch.load(path2str(path), map_location="cpu")
-        self.load_state_dict(state_dict, *args, **kwargs)
+        # the checkpoint may still be being written
+        self._checkpoint_writer.wait()
+        state_dict = load_checkpoint(path2str(path), keys=modules)
+        self.load_state_dict(state_dict, *args, modules=modules, **kwargs)
 
-    def _save_to(self, save_dir=None, save_name=None):
-        assert path2Path(save_name).suffix in (".pth", ".pt"), path2Path(
-            save_name
-        ).suffix
+    def _save_to(
+        self,
+        save_dir=None,
+        save_name=None,
+        also_as: Sequence[str] = (),
+        state_dict=None,
+    ):
+        """
+        :param also_as: other names of the same checkpoint, linked to `save_name` instead of serialized again
+        :param state_dict: state to save instead of the current one, e.g. a snapshot of a previous epoch
+        """
+        for name in (save_name, *also_as):
+            assert path2Path(name).suffix in (".pth", ".pt"), path2Path(name).suffix
         if save_dir is None:
             save_dir = self._save_dir
         save_dir = path2Path(save_dir)
         save_dir.mkdir(parents=True, exist_ok=True)
-        state_dict = self.state_dict()
-        torch.save(state_dict, path2str(save_dir / save_name))
+        if state_dict is None:
+            state_dict = self.state_dict()
+        self._checkpoint_writer.save(
+            state_dict,
+            save_dir / save_name,
+            *[save_dir / n for n in also_as],
+            indexed=self._indexed_checkpoint,
+        )
 
     def resume_from_checkpoint(self, checkpoint, **kwargs):
         self.load_state_dict_from_path(checkpoint, **kwargs)
 
-    def save_on_score(self, current_score: float, save_dir=None, high_is_better=True):
-        self._save_to(save_name="last.pth", save_dir=save_dir)
-
+    def save_on_score(
+        self, current_score: float, save_dir=None, high_is_better=True, state_dict=None
+    ):
+        """
+        :param state_dict: snapshot of the trainer state which `current_score` evaluates, saved with the updated
+        best score instead of the current state
+        """
         # initialize best_score, instead of None
         if self._best_score is None:
-            self._best_score = current_score
-            self._save_to(save_name="best.pth", save_dir=save_dir)
-            return
-
-        if high_is_better:
-            if self._best_score < current_score:
-                self._best_score = current_score
-                self._save_to(save_name="best.pth", save_dir=save_dir)
+            is_best = True
+        elif high_is_better:
+            is_best = self._best_score < current_score
         else:
-            if self._best_score > current_score:
-                self._best_score = current_score
-                self._save_to(save_name="best.pth", save_dir=save_dir)
+            is_best = self._best_score > current_score
+        if is_best:
+            self._best_score = current_score
+        if state_dict is not None:
+            state_dict = {
+                **state_dict,
+                "_buffers": {**state_dict["_buffers"], "_best_score": self._best_score},
+            }
+        # best.pth is the same checkpoint as last.pth when the score improves
+        self._save_to(
+            save_name="last.pth",
+            save_dir=save_dir,
+            also_as=("best.pth",) if is_best else (),
+            state_dict=state_dict,
+        )
+
+    def wait_for_checkpoints(self):
+        """
+        wait until the checkpoints being written are on disk.
+        """
+        self._checkpoint_writer.wait()
 
     def periodic_save(self, cur_epoch: int, save_dir: str = None):
         self._save_to(save_name=f"epoch_{cur_epoch}.pth", save_dir=save_dir)
@@ -0,0 +1,114 @@
+"""
+Evaluation of a snapshot of the trainer in a worker process, while the next epoch trains.
+
+The worker is forked from the trainer when the training starts, so that it holds its own copy of the trainer with
+its evaluation loaders and epochers. After each epoch, the state of the evaluated modules (e.g. `_model` and an EMA
+teacher) is sent to the worker, loaded into its copy, and evaluated with `eval_epoch`.
+"""
+import os
+import queue
+import sys
+import traceback
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import torch
+from torch import multiprocessing
+
+from ..epoch._epocher import _Epocher
+
+__all__ = ["EvalWorker"]
+
+
+def _eval_loop(trainer, num_threads: int, requests, results):
+    torch.set_num_threads(num_threads)
+    # the progress bars (on stderr) and the summaries (on stdout) would interleave with the ones of the training
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    # indicators inherited from the trainer still write to its stderr
+    _Epocher._indicators.clear()
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        epoch, module_states = request
+        try:
+            for name, state in module_states.items():
+                getattr(trainer, name).load_state_dict(state)
+            trainer._cur_epoch = epoch
+            with torch.no_grad():
+                eval_result, cur_score = trainer.eval_epoch()
+            results.put((epoch, (eval_result, cur_score), None))
+        except BaseException:
+            results.put((epoch, None, traceback.format_exc()))
+
+
+class EvalWorker:
+    def __init__(
+        self, trainer, modules: Sequence[str] = ("_model",), num_threads: int = 1
+    ) -> None:
+        """
+        fork the worker process evaluating `trainer`.
+        :param modules: trainer modules whose state is sent to the worker for each evaluation
+        :param num_threads: torch intra-op threads of the worker
+        """
+        assert "fork" in multiprocessing.get_all_start_methods(), (
+            "the overlapped evaluation forks the trainer, "
+            "which is not supported on this platform"
+        )
+        assert not (
+            torch.cuda.is_available() and torch.cuda.is_initialized()
+        ), "the overlapped evaluation forks the trainer, CUDA should not be initialized"
+        self._modules = tuple(modules)
+        context = multiprocessing.get_context("fork")
+        # the tensors of the requests are moved to shared memory instead of being pickled
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        # not a daemon, so that its loaders can have workers
+        self._process = context.Process(
+            target=_eval_loop,
+            args=(trainer, num_threads, self._requests, self._results),
+            name="eval_worker",
+        )
+        self._process.start()
+        self._pending: Optional[int] = None
+
+    @property
+    def pending(self) -> Optional[int]:
+        """epoch being evaluated, if any"""
+        return self._pending
+
+    def submit(self, epoch: int, state_dict: Dict[str, Any]):
+        """
+        evaluate the modules of `state_dict` (a snapshot of the trainer state) as of `epoch`.
+        """
+        assert self._pending is None, f"epoch {self._pending} is still being evaluated"
+        self._requests.put((epoch, {name: state_dict[name] for name in self._modules}))
+        self._pending = epoch
+
+    def collect(self) -> Tuple[int, Tuple[Any, float]]:
+        """
+        wait for the evaluation submitted last.
+        :return: its epoch, and the `eval_epoch` result
+        """
+        assert self._pending is not None, "no evaluation submitted"
+        while True:
+            try:
+                epoch, result, error = self._results.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not self._process.is_alive():
+                    raise RuntimeError(
+                        f"the evaluation worker died with exit code {self._process.exitcode} "
+                        f"while evaluating epoch {self._pending}"
+                    )
+        self._pending = None
+        if error is not None:
+            raise RuntimeError(f"evaluation of epoch {epoch} failed:\n{error}")
+        return epoch, result
+
+    def close(self):
+        """
+        stop the worker, after the evaluation in progress.
+        """
+        if self._process.is_alive():
+            self._requests.put(None)
+        self._process.join()
@@ -1,14 +1,16 @@
 from abc import ABCMeta, abstractmethod
-from typing import Callable, Union
+from typing import Callable, Optional, Sequence, Tuple, Union
 
 import torch
 from deepclustering2.meters2.meter_interface import EpochResultDict
 from deepclustering2.meters2.storage_interface import Storage, StorageIncomeDict
 from deepclustering2.models import Model
+from deepclustering2.utils.checkpoint import AsyncCheckpointWriter, snapshot_state_dict
 from deepclustering2.writer import SummaryWriter
 from torch import nn
 
-from ..ddp.ddp import _DDPMixin
+from ._overlap import EvalWorker
+from ..ddp.ddp import _DDPMixin, shard_dataloader
 
 
 class _TrainerLoop(_DDPMixin, metaclass=ABCMeta):
@@ -23,47 +25,143 @@ class _TrainerLoop(_DDPMixin, metaclass=ABCMeta):
     _cur_epoch: int
     _save_dir: str
     _device: Union[str, torch.device]
+    _checkpoint_writer: AsyncCheckpointWriter
     save_on_score: Callable
     to: Callable[[torch.device], None]
+    wait_for_checkpoints: Callable[[], None]
+    # evaluate on all the ranks, each on its shard of the data, see `enable_sharded_eval`
+    _sharded_eval: bool = False
+    # evaluate a snapshot of each epoch in a forked worker process while the next epoch trains,
+    # see `enable_overlapped_eval`
+    _overlapped_eval: bool = False
+    _eval_modules: Tuple[str, ...] = ("_model",)
+    _eval_threads: Optional[int] = None
+    _train_threads: Optional[int] = None
 
     def __init__(self, *args, **kwargs):
         super(_TrainerLoop, self).__init__(*args, **kwargs)
         self._storage = Storage()
 
+    def enable_overlapped_eval(
+        self,
+        modules: Sequence[str] = ("_model",),
+        eval_threads: int = None,
+        train_threads: int = None,
+    ):
+        """
+        evaluate epoch N on a snapshot, in a worker process forked from the trainer, while epoch N+1 trains.
+        Its results are put into the storage, and its checkpoint saved on score, once epoch N+1 is trained.
+        The worker runs `eval_epoch` on its own copy of the trainer, which should evaluate on CPU.
+        :param modules: modules evaluated by `eval_epoch`, e.g. ("_model", "_teacher_model") for an EMA teacher
+        :param eval_threads: torch threads of the evaluation, a third of the current ones by default
+        :param train_threads: torch threads of the training, the ones left by the evaluation by default
+        """
+        assert not self._sharded_eval, "the sharded evaluation can not be overlapped"
+        self._overlapped_eval = True
+        self._eval_modules = tuple(modules)
+        self._eval_threads = eval_threads
+        self._train_threads = train_threads
+
+    def disable_overlapped_eval(self):
+        self._overlapped_eval = False
+
+    def enable_sharded_eval(self, loaders: Sequence[str] = ("_val_loader",)):
+        """
+        evaluate on all the ranks, each on its shard of the evaluation loaders (see `shard_dataloader`),
+        the eval epochers reducing their meters across the ranks before reporting the epoch result.
+        :param loaders: trainer attributes holding the evaluation loaders, replaced by their shards
+        """
+        assert not self._overlapped_eval, "the overlapped evaluation can not be sharded"
+        assert not self._sharded_eval, "the evaluation is already sharded"
+        for name in loaders:
+            setattr(self, name, shard_dataloader(getattr(self, name)))
+        self._sharded_eval = True
+
     def start_training(self, *args, **kwargs):
         self.to(self._device)
-        if self.on_master():
-            with SummaryWriter(str(self._save_dir)) as self._writer:
-                return self._start_training(*args, **kwargs)
-        return self._start_training(*args, **kwargs)
+        try:
+            if self.on_master():
+                with SummaryWriter(str(self._save_dir)) as self._writer:
+                    return self._start_training(*args, **kwargs)
+            return self._start_training(*args, **kwargs)
+        finally:
+            self.wait_for_checkpoints()
 
     def _start_training(self, *args, **kwargs):
+        if self._overlapped_eval and self.on_master():
+            return self._start_training_overlapped(*args, **kwargs)
         for self._cur_epoch in range(self._start_epoch, self._max_epoch):
             train_result: EpochResultDict
             eval_result: EpochResultDict
             cur_score: float
             train_result = self.run_epoch()
-            if self.on_master():
+            if self.on_master() or self._sharded_eval:
                 with torch.no_grad():
                     eval_result, cur_score = self.eval_epoch()
             if self.on_master():
-                storage_per_epoch = StorageIncomeDict(tra=train_result, val=eval_result)
-                self._storage.put_from_dict(storage_per_epoch, self._cur_epoch)
-                self._writer.add_scalar_with_StorageDict(
-                    storage_per_epoch, epoch=self._cur_epoch
+                self._record_epoch(
+                    self._cur_epoch, train_result, eval_result, cur_score
                 )
-                # save_checkpoint
-                self.save_on_score(
-                    current_score=cur_score,
-                    save_dir=self._save_dir,
-                    high_is_better=True,
-                )
-                # save storage result on csv file.
-                self._storage.to_csv(self._save_dir)
+
+    def _start_training_overlapped(self, *args, **kwargs):
+        total_threads = torch.get_num_threads()
+        eval_threads = self._eval_threads or max(1, total_threads // 3)
+        train_threads = self._train_threads or max(1, total_threads - eval_threads)
+        # forked before the training changes the threads, the epochers or the modules
+        worker = EvalWorker(self, modules=self._eval_modules, num_threads=eval_threads)
+        torch.set_num_threads(train_threads)
+        # train result and trainer snapshot of the epoch being evaluated
+        pending = None
+        try:
+            for self._cur_epoch in range(self._start_epoch, self._max_epoch):
+                train_result = self.run_epoch()
+                if pending is not None:
+                    self._record_evaluated(worker, *pending)
+                snapshot = snapshot_state_dict(self.state_dict())
+                worker.submit(self._cur_epoch, snapshot)
+                pending = (train_result, snapshot)
+            if pending is not None:
+                self._record_evaluated(worker, *pending)
+        finally:
+            worker.close()
+            torch.set_num_threads(total_threads)
+
+    def _record_evaluated(self, worker: EvalWorker, train_result, snapshot):
+        epoch, (eval_result, cur_score) = worker.collect()
+        self._record_epoch(epoch, train_result, eval_result, cur_score, snapshot)
+
+    def _record_epoch(
+        self,
+        epoch: int,
+        train_result: EpochResultDict,
+        eval_result: EpochResultDict,
+        cur_score: float,
+        snapshot: dict = None,
+    ):
+        """
+        :param snapshot: trainer state evaluated by `cur_score`, the current one being saved if None
+        """
+        storage_per_epoch = StorageIncomeDict(tra=train_result, val=eval_result)
+        self._storage.put_from_dict(storage_per_epoch, epoch)
+        self._writer.add_scalar_with_StorageDict(storage_per_epoch, epoch=epoch)
+        if snapshot is not None:
+            # with the records up to its epoch, as the checkpoints saved without overlap
+            snapshot = {**snapshot, "_storage": self._storage.state_dict()}
+        # save_checkpoint
+        self.save_on_score(
+            current_score=cur_score,
+            save_dir=self._save_dir,
+            high_is_better=True,
+            state_dict=snapshot,
+        )
+        # save storage result on csv file.
+        self._storage.to_csv(self._save_dir)
 
     def run_epoch(self, *args, **kwargs):
         epoch_result = self._run_epoch(*args, **kwargs)
-        torch.save(self._model.state_dict(), f"{self._save_dir}/model_last.pth")
+        self._checkpoint_writer.save(
+            self._model.state_dict(), f"{self._save_dir}/model_last.pth"
+        )
         return epoch_result
 
     @abstractmethod
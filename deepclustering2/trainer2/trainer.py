@@ -1,4 +1,5 @@
 from abc import ABCMeta
+from pathlib import Path
 from typing import Tuple
 
 import torch
@@ -9,6 +10,7 @@ from ._functional import _TrainerFuncMixin
 from ._io import _TrainerIOMixin
 from ._trainerloop import _TrainerLoop
 from ..epoch._epocher import _Epocher  # noqa
+from ..epoch._profiler import EpochProfiler
 
 
 class Trainer(_TrainerLoop, _TrainerFuncMixin, _TrainerIOMixin, metaclass=ABCMeta):
@@ -20,7 +22,18 @@ class Trainer(_TrainerLoop, _TrainerFuncMixin, _TrainerIOMixin, metaclass=ABCMet
         num_batches: int = 100,
         device: str = "cpu",
         config=None,
+        accumulate_steps: int = 1,
+        micro_batch_size=None,
+        memory_budget: int = None,
+        step_scheduler: bool = False,
     ):
+        """
+        :param accumulate_steps: number of batches per optimizer step of the training epochs
+        :param micro_batch_size: micro-batch size of the training epochs, None for the whole batch or "auto"
+        :param memory_budget: bytes of CUDA memory for the "auto" micro-batch size
+        :param step_scheduler: step the scheduler of the model after each optimizer step of the training epochs,
+                for schedules counted in iterations
+        """
         super(Trainer, self).__init__(
             save_dir=save_dir,
             max_epoch=max_epoch,
@@ -29,13 +42,42 @@ class Trainer(_TrainerLoop, _TrainerFuncMixin, _TrainerIOMixin, metaclass=ABCMet
         )
         self._model = model
         self._device = torch.device(device)
+        self._profiler = None
+        self._accumulate_steps = accumulate_steps
+        self._micro_batch_size = micro_batch_size
+        self._memory_budget = memory_budget
+        self._step_scheduler = step_scheduler
+
+    def enable_profiling(self, **kwargs):
+        """
+        profile the epochs with an `EpochProfiler` exporting to `save_dir/profiler`,
+        given the `EpochProfiler` arguments (`wait`, `warmup`, `active`, `epochs`...).
+        """
+        kwargs.setdefault("save_dir", Path(self._save_dir) / "profiler")
+        self._profiler = EpochProfiler(**kwargs)
+
+    def disable_profiling(self):
+        self._profiler = None
 
     def _run_epoch(self, epocher: _Epocher, *args, **kwargs) -> EpochResultDict:
         trainer_epocher = epocher.create_from_trainer(trainer=self)
-        return trainer_epocher.run()
+        trainer_epocher.set_profiler(self._profiler)
+        trainer_epocher.set_gradient_accumulation(
+            self._accumulate_steps,
+            self._micro_batch_size,
+            self._memory_budget,
+            self._step_scheduler,
+        )
+        epoch_result = trainer_epocher.run()
+        # searched once, on the first batch of the training
+        self._micro_batch_size = trainer_epocher.micro_batch_size
+        return epoch_result
 
     def _eval_epoch(
         self, epocher: _Epocher, *args, **kwargs
     ) -> Tuple[EpochResultDict, float]:
         eval_epocher = epocher.create_from_trainer(trainer=self,)
+        eval_epocher.set_profiler(self._profiler)
+        if self._sharded_eval:
+            eval_epocher.set_reduce_meters(True)
         return eval_epocher.run()
@@ -1,6 +1,8 @@
 from .general import *
 from .warnings import _warnings
 from .io import *
+from .checkpoint import *
 from .assertion import *
 from .githash import gethash
 from .warnings import *
+from .validation import *
@@ -52,7 +52,7 @@ class FSGMGenerator(object):
             img.grad.zero_()
         current_net.zero_grad()
         pred = current_net(img)
-        if not simplex(pred):
+        if not simplex(pred, force=True):
             pred = pred.softmax(1)
 
         if gt is not None:
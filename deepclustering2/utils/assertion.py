@@ -16,6 +16,8 @@ from torch import Tensor
 from torch import nn
 from tqdm import tqdm
 
+from .validation import should_validate
+
 A = TypeVar("A")
 B = TypeVar("B")
 T = TypeVar("T", Tensor, np.ndarray)
@@ -33,13 +35,16 @@ def uniq(a: Tensor) -> Set:
     return set([x.item() for x in a.unique()])
 
 
-def sset(a: Tensor, sub: Iterable) -> bool:
+def sset(a: Tensor, sub: Iterable, force: bool = False) -> bool:
     """
     if a tensor is the subset of the other
     :param a:
     :param sub:
+    :param force: run the check regardless of the validation level
     :return:
     """
+    if not (force or should_validate("sset")):
+        return True
     return uniq(a).issubset(sub)
 
 
@@ -53,27 +58,33 @@ def eq(a: Tensor, b: Tensor) -> bool:
     return torch.eq(a, b).all()
 
 
-def simplex(t: Tensor, axis=1) -> bool:
+def simplex(t: Tensor, axis=1, force: bool = False) -> bool:
     """
     check if the matrix is the probability distribution
     :param t:
     :param axis:
+    :param force: run the check regardless of the validation level
     :return:
     """
+    if not (force or should_validate("simplex")):
+        return True
     _sum = t.sum(axis).type(torch.float32)
     _ones = torch.ones_like(_sum, dtype=torch.float32)
     return torch.allclose(_sum, _ones, rtol=1e-4, atol=1e-4)
 
 
-def one_hot(t: Tensor, axis=1) -> bool:
+def one_hot(t: Tensor, axis=1, force: bool = False) -> bool:
     """
     check if the Tensor is one hot.
     The tensor shape can be float or int or others.
     :param t:
     :param axis: default = 1
+    :param force: run the check regardless of the validation level
     :return: bool
     """
-    return simplex(t, axis) and sset(t, [0, 1])
+    if not (force or should_validate("one_hot")):
+        return True
+    return simplex(t, axis, force=True) and sset(t, [0, 1], force=True)
 
 
 def intersection(a: Tensor, b: Tensor) -> Tensor:
@@ -108,9 +119,12 @@ def class2one_hot(seg: Tensor, C: int, class_dim: int = 1) -> Tensor:
 
     b, *wh = seg.shape  # type:  Tuple[int, int, int]
 
-    res: Tensor = torch.stack([seg == c for c in range(C)], dim=class_dim).type(
-        torch.long
-    )
+    index = seg.long().unsqueeze(class_dim)
+    res: Tensor = torch.zeros(
+        (*index.shape[:class_dim], C, *index.shape[class_dim + 1 :]),
+        dtype=torch.long,
+        device=seg.device,
+    ).scatter_(class_dim, index, 1)
     assert one_hot(res, axis=class_dim)
     return res
 
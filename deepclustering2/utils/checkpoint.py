@@ -0,0 +1,278 @@
+"""
+Checkpoint writing off the training loop.
+
+`AsyncCheckpointWriter.save` snapshots the state dict to CPU memory, then serializes it in a background thread to a
+temporary file which is atomically renamed to its destination. A checkpoint saved under several names (e.g. `last.pth`
+and `best.pth`) is serialized once and hard-linked to the other names.
+
+The indexed format (`save_indexed`) stores each top-level entry of a state dict (the trainer modules) separately,
+its tensors as raw bytes and the rest pickled, with an index of their offsets at the end of the file.
+`load_checkpoint` then unpickles only the requested entries, their tensors being memory-mapped from the file instead
+of read. It reads the `torch.save` checkpoints as well.
+The trainers save their checkpoints with `torch.save`, or in the indexed format if their `_indexed_checkpoint` is
+True. The indexed files can not be read by `torch.load`.
+"""
+
+import io
+import json
+import os
+import pickle
+import shutil
+import struct
+import threading
+from copy import copy, deepcopy
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+import numpy as np
+import torch
+
+__all__ = [
+    "AsyncCheckpointWriter",
+    "snapshot_state_dict",
+    "atomic_save",
+    "save_indexed",
+    "is_indexed",
+    "load_checkpoint",
+]
+
+_MAGIC = b"DCCKPT01"
+# magic, offset of the index
+_HEADER = struct.Struct("<8sQ")
+# alignment of the tensor bytes, so that they can be viewed as any dtype
+_ALIGNMENT = 64
+
+
+def snapshot_state_dict(state: Any) -> Any:
+    """
+    copy of `state` which the training can no longer modify, with the tensors on CPU.
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, np.ndarray):
+        return state.copy()
+    if isinstance(state, dict):
+        # shallow copy first, keeping the type, `default_factory` or `_metadata` of the dict
+        snapshot = copy(state)
+        for k, v in state.items():
+            snapshot[k] = snapshot_state_dict(v)
+        return snapshot
+    if isinstance(state, (list, tuple)) and not hasattr(state, "_fields"):
+        return state.__class__(snapshot_state_dict(v) for v in state)
+    return deepcopy(state)
+
+
+def _pad(f, alignment=_ALIGNMENT) -> int:
+    offset = f.tell()
+    padding = -offset % alignment
+    f.write(b"\0" * padding)
+    return offset + padding
+
+
+class _TensorPickler(pickle.Pickler):
+    """
+    pickle keeping the tensors aside, to be written as raw bytes.
+    """
+
+    def __init__(self, file, tensors: list):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._tensors = tensors
+
+    def persistent_id(self, obj):
+        # subclasses (e.g. `nn.Parameter`) and sparse or quantized tensors are pickled as usual
+        if (
+            type(obj) is torch.Tensor
+            and obj.layout == torch.strided
+            and not obj.is_quantized
+        ):
+            self._tensors.append(obj)
+            return len(self._tensors) - 1
+        return None
+
+
+class _TensorUnpickler(pickle.Unpickler):
+    def __init__(self, file, tensors: list):
+        super().__init__(file)
+        self._tensors = tensors
+
+    def persistent_load(self, pid):
+        return self._tensors[pid]
+
+
+def save_indexed(state_dict: Dict[str, Any], f):
+    """
+    write `state_dict` to the binary file `f` in the indexed format.
+    """
+    assert isinstance(state_dict, dict), type(state_dict)
+    f.write(_HEADER.pack(_MAGIC, 0))
+    index = {}
+    for key, value in state_dict.items():
+        buffer, tensors = io.BytesIO(), []
+        _TensorPickler(buffer, tensors).dump(value)
+        tensor_index = []
+        for tensor in tensors:
+            data = tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8)
+            offset = _pad(f)
+            f.write(memoryview(data.numpy()))
+            tensor_index.append(
+                [offset, data.numel(), str(tensor.dtype)[6:], list(tensor.shape)]
+            )
+        offset = _pad(f)
+        f.write(buffer.getbuffer())
+        index[key] = {"pickle": [offset, buffer.tell()], "tensors": tensor_index}
+    index_offset = f.tell()
+    f.write(json.dumps(index).encode())
+    f.seek(0)
+    f.write(_HEADER.pack(_MAGIC, index_offset))
+    f.seek(0, io.SEEK_END)
+
+
+def is_indexed(path: Union[str, Path]) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(_MAGIC)) == _MAGIC
+
+
+def _load_indexed(path, keys: Optional[Iterable[str]]) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        _, index_offset = _HEADER.unpack(f.read(_HEADER.size))
+        f.seek(index_offset)
+        index = json.loads(f.read().decode())
+    # copy-on-write mapping: the tensors are writable without ever touching the file
+    mapped = np.memmap(path, dtype=np.uint8, mode="c")
+    state_dict = {}
+    for key in index if keys is None else keys:
+        if key not in index:
+            continue
+        tensors = [
+            torch.from_numpy(mapped[offset : offset + nbytes])
+            .view(getattr(torch, dtype))
+            .reshape(shape)
+            for offset, nbytes, dtype, shape in index[key]["tensors"]
+        ]
+        offset, nbytes = index[key]["pickle"]
+        data = io.BytesIO(mapped[offset : offset + nbytes])
+        state_dict[key] = _TensorUnpickler(data, tensors).load()
+    return state_dict
+
+
+def _torch_load(path):
+    try:
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=False)
+    except TypeError:
+        # torch < 2.1, no memory mapping
+        return torch.load(path, map_location="cpu")
+    except RuntimeError:
+        # legacy (non zip) serialization, which cannot be memory-mapped
+        return torch.load(path, map_location="cpu", weights_only=False)
+
+
+def load_checkpoint(
+    path: Union[str, Path], keys: Iterable[str] = None
+) -> Dict[str, Any]:
+    """
+    load a checkpoint saved with `save_indexed` or `torch.save`, on CPU.
+    :param keys: top-level entries to load, e.g. ["_model"], all of them if None. Only these are read from an
+            indexed checkpoint.
+    """
+    path = str(path)
+    if is_indexed(path):
+        return _load_indexed(path, keys)
+    state_dict = _torch_load(path)
+    if keys is None:
+        return state_dict
+    return {k: state_dict[k] for k in keys if k in state_dict}
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def _link_or_copy(src: Path, dst: Path):
+    tmp = _tmp_path(dst)
+    if tmp.exists():
+        tmp.unlink()
+    try:
+        os.link(src, tmp)
+    except OSError:
+        # no hard link on this file system
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def atomic_save(
+    state_dict: Any,
+    path: Union[str, Path],
+    *other_paths: Union[str, Path],
+    indexed=False,
+):
+    """
+    `torch.save` to a temporary file renamed to `path`, so that `path` is never left half-written.
+    `other_paths` receive the same bytes, through hard links when possible.
+    :param indexed: write with `save_indexed` instead of `torch.save`
+    """
+    path = Path(path)
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, "wb") as f:
+            if indexed:
+                save_indexed(state_dict, f)
+            else:
+                torch.save(state_dict, f)
+            f.flush()
+            os.fsync(f.fileno())
+        for other in other_paths:
+            # linked before the rename, `path` being possibly replaced meanwhile by another writer
+            _link_or_copy(tmp, Path(other))
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+class AsyncCheckpointWriter:
+    def __init__(self, blocking=False) -> None:
+        """
+        :param blocking: write in the calling thread, as `torch.save` would
+        """
+        self._blocking = blocking
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+    def save(
+        self, state_dict: Any, path: Union[str, Path], *other_paths, indexed=False
+    ):
+        """
+        write `state_dict` to `path` and `other_paths`, with `atomic_save`.
+        Waits for the previous write, only one being in flight at a time, then returns as soon as the state is
+        copied to CPU memory.
+        """
+        self.wait()
+        state_dict = snapshot_state_dict(state_dict)
+        if self._blocking:
+            atomic_save(state_dict, path, *other_paths, indexed=indexed)
+            return
+        # not a daemon thread, the interpreter waits for the last checkpoint before exiting
+        self._thread = threading.Thread(
+            target=self._write,
+            args=(state_dict, path, *other_paths),
+            kwargs={"indexed": indexed},
+            name="checkpoint_writer",
+        )
+        self._thread.start()
+
+    def _write(self, state_dict, path, *other_paths, indexed=False):
+        try:
+            atomic_save(state_dict, path, *other_paths, indexed=indexed)
+        except BaseException as e:
+            self._error = e
+
+    def wait(self):
+        """
+        wait for the write in flight, raising its error if it failed.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -9,7 +9,18 @@ from functools import reduce
 from math import isnan
 from multiprocessing import Pool
 from operator import and_
-from typing import Iterable, Set, Tuple, TypeVar, Callable, List, Dict, Any, Union
+from typing import (
+    Iterable,
+    Set,
+    Tuple,
+    TypeVar,
+    Callable,
+    List,
+    Dict,
+    Any,
+    Union,
+    Optional,
+)
 
 import numpy as np
 import torch
@@ -19,6 +30,21 @@ from torch import Tensor
 from torch import nn
 from tqdm import tqdm
 
+# Assert utils
+from .assertion import (
+    uniq,
+    sset,
+    eq,
+    simplex,
+    one_hot,
+    intersection,
+    union,
+    probs2class,
+    class2one_hot,
+    probs2one_hot,
+    logit2one_hot,
+)
+
 A = TypeVar("A")
 B = TypeVar("B")
 T = TypeVar("T", Tensor, np.ndarray)
@@ -181,114 +207,6 @@ class _tqdm(tqdm_):
     pass
 
 
-# Assert utils
-def uniq(a: Tensor) -> Set:
-    """
-    return unique element of Tensor
-    Use python Optimized mode to skip assert statement.
-    :rtype set
-    :param a: input tensor
-    :return: Set(a_npized)
-    """
-    return set([x.item() for x in a.unique()])
-
-
-def sset(a: Tensor, sub: Iterable) -> bool:
-    """
-    if a tensor is the subset of the other
-    :param a:
-    :param sub:
-    :return:
-    """
-    return uniq(a).issubset(sub)
-
-
-def eq(a: Tensor, b: Tensor) -> bool:
-    """
-    if a and b are equal for torch.Tensor
-    :param a:
-    :param b:
-    :return:
-    """
-    return torch.eq(a, b).all()
-
-
-def simplex(t: Tensor, axis=1) -> bool:
-    """
-    check if the matrix is the probability distribution
-    :param t:
-    :param axis:
-    :return:
-    """
-    _sum = t.sum(axis).type(torch.float32)
-    _ones = torch.ones_like(_sum, dtype=torch.float32)
-    return torch.allclose(_sum, _ones, rtol=1e-4, atol=1e-4)
-
-
-def one_hot(t: Tensor, axis=1) -> bool:
-    """
-    check if the Tensor is one hot.
-    The tensor shape can be float or int or others.
-    :param t:
-    :param axis: default = 1
-    :return: bool
-    """
-    return simplex(t, axis) and sset(t, [0, 1])
-
-
-def intersection(a: Tensor, b: Tensor) -> Tensor:
-    assert a.shape == b.shape
-    assert a.dtype == torch.int, a.dtype
-    assert b.dtype == torch.int, b.dtype
-    assert sset(a, [0, 1])
-    assert sset(b, [0, 1])
-    return a & b
-
-
-def union(a: Tensor, b: Tensor) -> Tensor:
-    assert a.shape == b.shape
-    assert sset(a, [0, 1])
-    assert sset(b, [0, 1])
-    return a | b
-
-
-def probs2class(probs: Tensor, class_dim: int = 1) -> Tensor:
-    assert simplex(probs, axis=class_dim)
-    res = probs.argmax(dim=class_dim)
-    return res
-
-
-def class2one_hot(seg: Tensor, C: int, class_dim: int = 1) -> Tensor:
-    """
-    make segmentaton mask to be onehot
-    """
-    if len(seg.shape) == 2:  # Only w, h, used by the dataloader
-        seg = seg.unsqueeze(dim=0)
-    assert sset(seg, list(range(C)))
-
-    b, *wh = seg.shape  # type:  Tuple[int, int, int]
-
-    res: Tensor = torch.stack([seg == c for c in range(C)], dim=class_dim).type(
-        torch.long
-    )
-    assert one_hot(res, axis=class_dim)
-    return res
-
-
-def probs2one_hot(probs: Tensor, class_dim: int = 1) -> Tensor:
-    C = probs.shape[class_dim]
-    assert simplex(probs, axis=class_dim)
-    res = class2one_hot(probs2class(probs, class_dim=class_dim), C, class_dim=class_dim)
-    assert res.shape == probs.shape
-    assert one_hot(res, class_dim)
-    return res
-
-
-def logit2one_hot(logit: Tensor, class_dim: int = 1) -> Tensor:
-    probs = F.softmax(logit, class_dim)
-    return probs2one_hot(probs, class_dim)
-
-
 # functions
 def map_(fn: Callable[[A], B], iter: Iterable[A]) -> List[B]:
     return list(map(fn, iter))
@@ -403,21 +321,111 @@ filter_dict = dict_filter
 
 class Vectorize:
     r"""
-    this class calls the np.vectorize with a mapping dict, in order to solve local memory share issue.
+    this class remaps labels with a mapping dict, using a lookup table indexed by the label values.
+    It works on both np.ndarray and torch.Tensor, and can be pickled to the dataloader workers.
+    :param mapping_dict: mapping from non-negative integer labels to integer labels
+    :param default: value given to the labels absent from `mapping_dict`. If None, unmapped labels raise an error.
     """
 
-    def __init__(self, mapping_dict: Dict[int, int]) -> None:
+    def __init__(
+        self, mapping_dict: Dict[int, int], default: Optional[int] = 0
+    ) -> None:
         super().__init__()
+        assert isinstance(
+            mapping_dict, collections.abc.Mapping
+        ), f"mapping_dict should be a dict, given {type(mapping_dict)}."
+        assert len(mapping_dict) > 0, "mapping_dict should not be empty."
+        for k, v in mapping_dict.items():
+            assert (
+                _is_integral(k) and k >= 0
+            ), f"keys of mapping_dict should be non-negative integers, given {k}."
+            assert _is_integral(
+                v
+            ), f"values of mapping_dict should be integers, given {v}."
+        assert default is None or _is_integral(
+            default
+        ), f"default should be an integer or None, given {default}."
         self._mapping_dict = mapping_dict
-        self._mapping_module = np.vectorize(lambda x: self._mapping_dict.get(x, 0))
+        self._default = default
 
-    def __call__(self, np_tensor: np.ndarray):
-        return self._mapping_module(np_tensor)
+        keys = np.asarray([int(k) for k in mapping_dict.keys()], dtype=np.int64)
+        values = np.asarray([int(v) for v in mapping_dict.values()], dtype=np.int64)
+        all_values = values if default is None else np.append(values, int(default))
+        dtype = (
+            np.uint8 if all_values.min() >= 0 and all_values.max() <= 255 else np.int64
+        )
+        self._lut = np.full(int(keys.max()) + 1, default or 0, dtype=dtype)
+        self._lut[keys] = values
+        self._mapped = np.zeros(len(self._lut), dtype=np.bool_)
+        self._mapped[keys] = True
+        self._torch_luts: Dict[torch.device, Tuple[Tensor, Tensor]] = {}
+
+    def __call__(self, tensor: T) -> T:
+        if isinstance(tensor, Tensor):
+            return self._call_torch(tensor)
+        return self._call_numpy(np.asarray(tensor))
+
+    def _call_numpy(self, np_tensor: np.ndarray) -> np.ndarray:
+        indices = np_tensor.astype(np.int64, copy=False)
+        if indices.size == 0:
+            return np.empty(indices.shape, dtype=self._lut.dtype)
+        in_range = (indices.min() >= 0) and (indices.max() < len(self._lut))
+        if self._default is None:
+            assert in_range and self._mapped[indices].all(), (
+                f"labels {sorted(set(np.unique(indices).tolist()) - set(self._keys))} "
+                f"are not in the mapping_dict."
+            )
+        if in_range:
+            return self._lut[indices]
+        valid = (indices >= 0) & (indices < len(self._lut))
+        result = np.full(indices.shape, self._default, dtype=self._lut.dtype)
+        result[valid] = self._lut[indices[valid]]
+        return result
+
+    def _call_torch(self, tensor: Tensor) -> Tensor:
+        if tensor.device not in self._torch_luts:
+            self._torch_luts[tensor.device] = (
+                torch.from_numpy(self._lut).to(tensor.device),
+                torch.from_numpy(self._mapped).to(tensor.device),
+            )
+        lut, mapped = self._torch_luts[tensor.device]
+        indices = tensor.long()
+        if indices.numel() == 0:
+            return torch.empty_like(indices, dtype=lut.dtype)
+        in_range = (indices.min() >= 0).item() and (indices.max() < len(lut)).item()
+        if self._default is None:
+            assert in_range and mapped[indices].all().item(), (
+                f"labels {sorted(set(indices.unique().tolist()) - set(self._keys))} "
+                f"are not in the mapping_dict."
+            )
+        if in_range:
+            return lut[indices]
+        valid = (indices >= 0) & (indices < len(lut))
+        result = torch.full_like(indices, self._default, dtype=lut.dtype)
+        result[valid] = lut[indices[valid]]
+        return result
+
+    @property
+    def _keys(self) -> List[int]:
+        return [int(k) for k in self._mapping_dict.keys()]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_torch_luts"] = {}
+        return state
 
     def __repr__(self):
         return f"mapping_dict = {self._mapping_dict}"
 
 
+def _is_integral(x: Any) -> bool:
+    if isinstance(x, (bool, np.bool_)):
+        return False
+    if isinstance(x, (int, np.integer)):
+        return True
+    return isinstance(x, (float, np.floating)) and float(x).is_integer()
+
+
 def extract_from_big_dict(big_dict, keys) -> dict:
     """ Get a small dictionary with key in `keys` and value
         in big dict. If the key doesn't exist, give None.
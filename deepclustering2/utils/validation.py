@@ -0,0 +1,90 @@
+"""
+Process-wide level of the tensor validations (`simplex`, `one_hot`, `sset`, ...) run in the hot paths.
+
+- full: every check is run (default)
+- sampled: each check is run once every `interval` calls
+- off: checks are skipped and considered passed
+
+The level is read from the `DEEPCLUSTERING_VALIDATION` environment variable (and the interval from
+`DEEPCLUSTERING_VALIDATION_INTERVAL`), and can be changed with `set_validation_level` or locally with
+>>> with validation_level("off"):
+>>>     meter.add(pred, target)
+"""
+__all__ = [
+    "ValidationLevel",
+    "get_validation_level",
+    "set_validation_level",
+    "validation_level",
+    "should_validate",
+]
+
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from enum import Enum
+from typing import Union, Dict
+
+
+class ValidationLevel(Enum):
+    OFF = "off"
+    SAMPLED = "sampled"
+    FULL = "full"
+
+    @staticmethod
+    def from_str(level: Union[str, "ValidationLevel"]) -> "ValidationLevel":
+        if isinstance(level, ValidationLevel):
+            return level
+        try:
+            return ValidationLevel(str(level).lower())
+        except ValueError:
+            raise ValueError(
+                f"validation level should be in {[l.value for l in ValidationLevel]}, given {level}."
+            )
+
+
+_level: ValidationLevel = ValidationLevel.from_str(
+    os.environ.get("DEEPCLUSTERING_VALIDATION", "full")
+)
+_interval: int = int(os.environ.get("DEEPCLUSTERING_VALIDATION_INTERVAL", 100))
+_counters: Dict[str, int] = defaultdict(int)
+
+
+def get_validation_level() -> ValidationLevel:
+    return _level
+
+
+def set_validation_level(
+    level: Union[str, ValidationLevel], interval: int = None
+) -> None:
+    """
+    :param level: one of `off`, `sampled` and `full`
+    :param interval: with `sampled`, run each check once every `interval` calls
+    """
+    global _level, _interval
+    _level = ValidationLevel.from_str(level)
+    if interval is not None:
+        assert interval >= 1, interval
+        _interval = int(interval)
+
+
+@contextmanager
+def validation_level(level: Union[str, ValidationLevel], interval: int = None):
+    previous_level, previous_interval = _level, _interval
+    set_validation_level(level, interval)
+    try:
+        yield
+    finally:
+        set_validation_level(previous_level, previous_interval)
+
+
+def should_validate(check_name: str) -> bool:
+    """
+    if the check named `check_name` should run for this call.
+    """
+    if _level is ValidationLevel.FULL:
+        return True
+    if _level is ValidationLevel.OFF:
+        return False
+    count = _counters[check_name]
+    _counters[check_name] = count + 1
+    return count % _interval == 0
@@ -188,8 +188,7 @@ class Volume(object):
             elif len(mapping) == 1 and len(mask_folder_list) > 1:
                 print(f"Found an unique mapping: {mapping}, applying to all gt_masks")
                 self.mapping_modules: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
-                    f"{str(m)}": np.vectorize(lambda x: mapping[0].get(x))
-                    for m in self.mask_folder_list
+                    f"{str(m)}": Vectorize(mapping[0]) for m in self.mask_folder_list
                 }
             elif len(mapping) == len(mask_folder_list) and len(mask_folder_list) >= 2:
                 print(
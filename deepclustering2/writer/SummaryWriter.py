@@ -1,11 +1,13 @@
 import atexit
 from pathlib import Path
+from typing import Dict
 
 from tensorboard.plugins.image import metadata as image_metadata
 from tensorboardX import SummaryWriter as _SummaryWriter
 
 from deepclustering2.meters2 import StorageIncomeDict
 from deepclustering2.utils import flatten_dict
+from ._buffered import BackgroundLogger
 
 image_metadata.PLUGIN_NAME = 1000
 _TensorBoard__STACK = []
@@ -17,16 +19,102 @@ def path2Path(path) -> Path:
 
 
 class SummaryWriter(_SummaryWriter):
-    def __init__(self, log_dir=None, comment="", flush_secs=5, **kwargs):
+    """
+    With `buffered=True`, the scalars, histograms and images are queued and written by a background thread
+    (see `_buffered.py`), which is flushed by `flush` and `close`.
+    """
+
+    def __init__(
+        self,
+        log_dir=None,
+        comment="",
+        flush_secs=5,
+        buffered: bool = False,
+        max_pending: int = 1024,
+        rate_limits: Dict[str, float] = None,
+        max_image_size: int = None,
+        **kwargs,
+    ):
+        """
+        :param buffered: log in a background thread
+        :param max_pending: maximum number of records waiting for the background thread
+        :param rate_limits: minimum number of seconds between two records of the tags matching a pattern,
+                as {"tra/*": 1.0}, the main tag being matched for `add_scalar_with_tag`. Only in buffered mode.
+        :param max_image_size: maximum height and width of the images, downsampled before being queued.
+                Only in buffered mode.
+        """
         log_dir = path2Path(log_dir)
         log_dir.mkdir(exist_ok=True, parents=True)
         assert log_dir.exists() and log_dir.is_dir(), log_dir
         super().__init__(
             str(log_dir / "tensorboard"), comment, flush_secs=flush_secs, **kwargs
         )
+        self._logger = None
+        if buffered:
+            self._logger = BackgroundLogger(
+                self._write_record,
+                max_pending=max_pending,
+                rate_limits=rate_limits,
+                max_image_size=max_image_size,
+            )
         atexit.register(self.close)
         _TensorBoard__STACK.append(self)
 
+    def _write_record(self, method: str, args: tuple, kwargs: dict):
+        if method == "add_scalar_with_tag":
+            return self._add_scalar_with_tag(*args, **kwargs)
+        return getattr(super(SummaryWriter, self), method)(*args, **kwargs)
+
+    def add_scalar(self, tag, scalar_value, global_step=None, walltime=None, **kwargs):
+        if self._logger is None:
+            return super().add_scalar(
+                tag, scalar_value, global_step=global_step, walltime=walltime, **kwargs
+            )
+        self._logger.submit(
+            "add_scalar",
+            tag,
+            scalar_value,
+            global_step=global_step,
+            walltime=walltime,
+            **kwargs,
+        )
+
+    def add_histogram(
+        self,
+        tag,
+        values,
+        global_step=None,
+        bins="tensorflow",
+        walltime=None,
+        max_bins=None,
+    ):
+        kwargs = dict(
+            global_step=global_step, bins=bins, walltime=walltime, max_bins=max_bins
+        )
+        if self._logger is None:
+            return super().add_histogram(tag, values, **kwargs)
+        self._logger.submit("add_histogram", tag, values, **kwargs)
+
+    def add_image(
+        self, tag, img_tensor, global_step=None, walltime=None, dataformats="CHW"
+    ):
+        kwargs = dict(
+            global_step=global_step, walltime=walltime, dataformats=dataformats
+        )
+        if self._logger is None:
+            return super().add_image(tag, img_tensor, **kwargs)
+        self._logger.submit("add_image", tag, img_tensor, **kwargs)
+
+    def add_images(
+        self, tag, img_tensor, global_step=None, walltime=None, dataformats="NCHW"
+    ):
+        kwargs = dict(
+            global_step=global_step, walltime=walltime, dataformats=dataformats
+        )
+        if self._logger is None:
+            return super().add_images(tag, img_tensor, **kwargs)
+        self._logger.submit("add_images", tag, img_tensor, **kwargs)
+
     def add_scalar_with_tag(
         self, tag, tag_scalar_dict, global_step=None, walltime=None
     ):
@@ -39,11 +127,23 @@ class SummaryWriter(_SummaryWriter):
         :return:
         """
         assert global_step is not None
+        if self._logger is not None:
+            # flattened and written in the background thread
+            return self._logger.submit(
+                "add_scalar_with_tag",
+                tag,
+                tag_scalar_dict,
+                global_step=global_step,
+                walltime=walltime,
+            )
+        self._add_scalar_with_tag(tag, tag_scalar_dict, global_step, walltime)
+
+    def _add_scalar_with_tag(self, tag, tag_scalar_dict, global_step, walltime=None):
         tag_scalar_dict = flatten_dict(tag_scalar_dict)
 
         for k, v in tag_scalar_dict.items():
             # self.add_scalars(main_tag=tag, tag_scalar_dict={k: v})
-            self.add_scalar(
+            super(SummaryWriter, self).add_scalar(
                 tag=f"{tag}/{k}",
                 scalar_value=v,
                 global_step=global_step,
@@ -60,7 +160,16 @@ class SummaryWriter(_SummaryWriter):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+    def flush(self):
+        if self._logger is not None:
+            self._logger.flush()
+        super(SummaryWriter, self).flush()
+
     def close(self):
+        if self._logger is not None:
+            # write the pending records before closing the file
+            logger, self._logger = self._logger, None
+            logger.close()
         try:
             _self = _TensorBoard__STACK.pop()
             assert id(_self) == id(self)
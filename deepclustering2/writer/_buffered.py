@@ -0,0 +1,159 @@
+"""
+Background logging of the buffered `SummaryWriter`.
+
+The logging calls of the training thread only snapshot their values (detached copies, on their device) and queue
+them, and a background thread converts them (`.item()`, PNG encoding of the images, histograms) and writes them
+by batches of the same step. Per-tag rate limits drop the records coming too soon after the last one of the tag,
+before anything is copied.
+"""
+
+import math
+import queue
+import threading
+import time
+from fnmatch import fnmatch
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+__all__ = ["BackgroundLogger", "downsample_image"]
+
+_Record = Tuple[str, tuple, dict]
+
+
+def _snapshot(value: Any) -> Any:
+    if isinstance(value, torch.Tensor):
+        return value.detach().clone()
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: _snapshot(v) for k, v in value.items()}
+    return value
+
+
+def downsample_image(image: Any, max_size: Optional[int], dataformats="CHW") -> Any:
+    """
+    stride the spatial dimensions of an image, or a batch of images, so that they are at most `max_size`.
+    """
+    if max_size is None or not isinstance(image, (torch.Tensor, np.ndarray)):
+        return image
+    h_axis, w_axis = dataformats.index("H"), dataformats.index("W")
+    stride = math.ceil(max(image.shape[h_axis], image.shape[w_axis]) / max_size)
+    if stride <= 1:
+        return image
+    index = [slice(None)] * image.ndim
+    index[h_axis] = index[w_axis] = slice(None, None, stride)
+    return image[tuple(index)]
+
+
+class BackgroundLogger:
+    def __init__(
+        self,
+        write: Callable[[str, tuple, dict], None],
+        max_pending: int = 1024,
+        rate_limits: Dict[str, float] = None,
+        max_image_size: int = None,
+    ) -> None:
+        """
+        :param write: function applying a record, `write(method name, args, kwargs)`, called in the thread
+        :param max_pending: maximum number of queued records before the logging calls block
+        :param rate_limits: minimum number of seconds between two records of the tags matching a pattern,
+                as {"val/*": 1.0}. The first matching pattern applies.
+        :param max_image_size: maximum height and width of the logged images, downsampled by striding
+        """
+        assert max_pending >= 1, max_pending
+        self._write = write
+        self._rate_limits = dict(rate_limits or {})
+        self._max_image_size = max_image_size
+        # tag -> time of its last record
+        self._last_records: Dict[str, float] = {}
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._loop, name="tb_writer", daemon=True
+        )
+        self._thread.start()
+
+    def _allowed(self, tag: str) -> bool:
+        for pattern, interval in self._rate_limits.items():
+            if fnmatch(tag, pattern):
+                now = time.monotonic()
+                if now - self._last_records.get(tag, -math.inf) < interval:
+                    return False
+                self._last_records[tag] = now
+                return True
+        return True
+
+    def submit(self, method: str, tag: str, *args, **kwargs):
+        """
+        queue a call of `method` for `tag`, unless rate-limited.
+        """
+        self._raise_error()
+        if not self._allowed(tag):
+            return
+        if method in ("add_image", "add_images") and self._max_image_size:
+            dataformats = kwargs.get(
+                "dataformats", "CHW" if method == "add_image" else "NCHW"
+            )
+            args = (
+                downsample_image(args[0], self._max_image_size, dataformats),
+                *args[1:],
+            )
+        args = (tag, *(_snapshot(a) for a in args))
+        self._queue.put((method, args, _snapshot(kwargs)))
+
+    def _loop(self):
+        while True:
+            records: List[_Record] = [self._queue.get()]
+            # everything queued meanwhile is written in the same batch
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for record in self._sorted_by_step(records):
+                try:
+                    if record is None:
+                        stop = True
+                    elif self._error is None:
+                        self._write(*record)
+                except BaseException as e:
+                    self._error = e
+                finally:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    @staticmethod
+    def _sorted_by_step(records: List[Optional[_Record]]) -> List[Optional[_Record]]:
+        """
+        group the records of the same step, keeping their order within a step and the stop signal last.
+        """
+        steps: Dict[Any, List[_Record]] = {}
+        stops = []
+        for record in records:
+            if record is None:
+                stops.append(record)
+                continue
+            steps.setdefault(record[2].get("global_step"), []).append(record)
+        return [r for step_records in steps.values() for r in step_records] + stops
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def flush(self):
+        """
+        wait until all queued records are written.
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
@@ -47,6 +47,8 @@ setup(
             "clip_screencapture=deepclustering2.postprocessing.clip_images:call_from_cmd",
             "report=deepclustering2.postprocessing.report2:call_from_cmd",
             "file_extractor=deepclustering2.postprocessing.folder_processing:main",
+            "augment_benchmark=deepclustering2.augment.benchmark:call_from_cmd",
+            "amp_benchmark=deepclustering2.amp.benchmark:call_from_cmd",
         ]
     },
 )